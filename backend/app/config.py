@@ -1,23 +1,220 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
+# Route groups a replica can serve (see `enabled_features`)
+FEATURES = ("graduates", "invitations", "chatbot", "files")
+
+# Optional subsystems used by each feature; they are configured and their
+# SDKs imported only when first used
+FEATURE_SUBSYSTEMS = {
+    "graduates": ("storage",),
+    "chatbot": ("chatbot",),
+    "files": ("storage",),
+}
+
+
+class SubsystemNotConfiguredError(ValueError):
+    """Raised when an optional subsystem is used without its settings"""
+
+
 class Settings(BaseSettings):
     """Application settings from environment variables"""
     
     mongodb_connection_string: str
+    mongodb_database_name: str = "graduation_invitations"
+    
+    # MongoDB connection pool
+    mongodb_max_pool_size: int = 100
+    mongodb_min_pool_size: int = 0
+    mongodb_wait_queue_timeout_ms: int = 5000
+    mongodb_server_selection_timeout_ms: int = 5000
+    
+    # Comma-separated routers this replica serves (graduates, invitations,
+    # chatbot, files); disabled features are not imported
+    enabled_features: str = ",".join(FEATURES)
     
-    # Azure OpenAI Configuration
-    azure_openai_api_key: str
-    azure_openai_endpoint: str
+    # Azure OpenAI Configuration (Optional - only needed for the chatbot)
+    azure_openai_api_key: Optional[str] = None
+    azure_openai_endpoint: Optional[str] = None
     azure_openai_api_version: str = "2024-02-15-preview"
-    azure_openai_deployment_name: str
+    azure_openai_deployment_name: Optional[str] = None
+    # Cheaper deployment used once a daily token budget is exceeded
+    azure_openai_economy_deployment_name: Optional[str] = None
+    
+    # LLM client: connection pool, admission control and retry policy
+    llm_max_connections: int = 50
+    llm_max_concurrency: int = 20
+    llm_max_concurrency_per_graduate: int = 4
+    llm_max_queue: int = 100
+    llm_queue_timeout_seconds: float = 2.0
+    llm_request_timeout_seconds: float = 30.0
+    llm_max_retries: int = 3
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 8.0
+    
+    # Answer time/venue/parking/contact questions from the graduate document
+    chatbot_local_answers: bool = True
+    
+    # Chatbot answer cache and the per-1K-token prices used to report savings
+    chatbot_cache_max_entries: int = 5000
+    chatbot_cache_ttl_seconds: float = 3600.0
+    chatbot_cache_fuzzy_match: bool = False
+    chatbot_cache_fuzzy_threshold: float = 0.9
+    chatbot_cost_per_1k_prompt_tokens: float = 0.0025
+    chatbot_cost_per_1k_completion_tokens: float = 0.01
+    
+    # Compiled system prompts, keyed by graduate id and version
+    chatbot_prompt_cache_max_entries: int = 5000
+    chatbot_prompt_cache_ttl_seconds: float = 3600.0
+    
+    # Daily (UTC) token budgets, prompt + completion; 0 = unlimited. Over a
+    # budget completions go to the economy deployment until usage reaches
+    # the hard limit factor times the budget, then questions are answered
+    # locally. Persisted usage is kept in token_usage for the retention days.
+    chatbot_daily_token_budget_per_graduate: int = 0
+    chatbot_daily_token_budget_global: int = 0
+    chatbot_budget_hard_limit_factor: float = 2.0
+    token_usage_persist: bool = False
+    token_usage_retention_days: int = 90
+    
+    # Multi-turn chat sessions keyed by invitation code. History beyond the
+    # token budget (estimated at ~4 characters per token) is folded into a
+    # list of earlier questions. Persisted sessions expire through a TTL
+    # index on chat_sessions (recreate it after changing the TTL).
+    chat_sessions_enabled: bool = True
+    chat_sessions_persist: bool = False
+    chat_session_max_entries: int = 10000
+    chat_session_ttl_seconds: int = 3600
+    chat_history_max_turns: int = 10
+    chat_history_token_budget: int = 1000
+    chat_summary_token_budget: int = 150
+    
+    # Photo storage engine: "azure" (Blob Storage) or "local" (files on disk
+    # served by /files). Set the accel-redirect prefix when nginx fronts the
+    # API so it sends local files itself.
+    storage_backend: str = "azure"
+    local_storage_path: str = "storage"
+    local_storage_base_url: str = "http://localhost:8000/files"
+    local_storage_accel_redirect: Optional[str] = None
     
     # Azure Storage Configuration (Optional - only needed for photo uploads)
     azure_storage_connection_string: Optional[str] = None
     azure_storage_container_name: str = "graduation-photos"
+    # Uploads are streamed to blob storage in blocks of this many bytes
+    azure_storage_block_size: int = 1024 * 1024
+    # Name photo blobs by content hash and store identical photos once. The
+    # hash is only known after the last chunk, so deduplicated uploads are
+    # spooled to a temporary file first; turn it off to stream uploads
+    # straight to storage instead
+    azure_storage_deduplicate: bool = True
+    
+    # Batch photo uploads: files per request and parallel uploads per request
+    photo_upload_max_files: int = 20
+    photo_upload_concurrency: int = 4
+    
+    # Graduate delete/purge jobs: graduates cleaned up in parallel and
+    # concurrent blob delete batches per graduate
+    cleanup_concurrency: int = 4
+    cleanup_blob_concurrency: int = 8
+    
+    # Background thumbnail/WebP derivative generation for uploaded photos
+    image_pipeline_enabled: bool = True
+    image_pipeline_workers: int = 2
+    image_pipeline_queue_size: int = 100
+    # Jobs queued or processing this long without an update belong to a
+    # process that died and are requeued at startup; finished job records
+    # expire after the TTL (recreate the index after changing it)
+    image_pipeline_stale_job_seconds: int = 3600
+    image_pipeline_job_ttl_seconds: int = 7 * 86400
+    
+    # HTTP caching of graduate/verify reads: seconds a client may reuse a
+    # response before revalidating with If-None-Match (0 = always revalidate)
+    http_cache_max_age_seconds: int = 0
+    # Responses at least this large are compressed (brotli if installed, else gzip)
+    compression_min_size: int = 1024
+    
+    # Prometheus metrics at /metrics (HTTP routes and MongoDB commands)
+    metrics_enabled: bool = True
     
     secret_key: str = "your-secret-key"
     
+    # Invitation code format. The secret keys the code permutation and the
+    # check characters and must not change once codes have been issued
+    # (defaults to secret_key). Legacy codes are the old 6-digit format.
+    invitation_code_length: int = 6
+    invitation_code_alphabet: str = "0123456789"
+    invitation_code_mac_length: int = 2
+    invitation_code_secret: Optional[str] = None
+    invitation_code_accept_legacy: bool = True
+    
+    # Read-through cache for /api/invitations/verify
+    verify_cache_max_entries: int = 10000
+    verify_cache_ttl_seconds: float = 60.0
+    # Well-formed codes that missed in the database are remembered so repeats
+    # skip the lookup; codes created here evict their entry immediately
+    verify_negative_cache_max_entries: int = 100000
+    verify_negative_cache_ttl_seconds: float = 300.0
+    # Bloom filter of issued codes, refreshed from the database; rejects
+    # never-issued codes without a lookup
+    verify_bloom_enabled: bool = True
+    verify_bloom_false_positive_rate: float = 0.01
+    verify_bloom_min_capacity: int = 100000
+    verify_bloom_refresh_seconds: float = 30.0
+    
+    # Token-bucket admission control (per client address and per route group).
+    # Only trust X-Forwarded-For behind a proxy that sets it; the client is
+    # the entry appended by the outermost of the trusted proxy hops
+    rate_limit_enabled: bool = True
+    rate_limit_trust_forwarded_for: bool = False
+    rate_limit_trusted_proxy_hops: int = 1
+    rate_limit_max_clients: int = 100000
+    verify_rate_per_client: float = 1.0
+    verify_burst_per_client: int = 10
+    verify_rate_global: float = 200.0
+    verify_burst_global: int = 400
+    chat_rate_per_client: float = 0.5
+    chat_burst_per_client: int = 5
+    chat_rate_global: float = 50.0
+    chat_burst_global: int = 100
+    
+    @field_validator("enabled_features")
+    @classmethod
+    def _check_features(cls, value: str) -> str:
+        unknown = {name.strip() for name in value.split(",") if name.strip()} - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown features: {', '.join(sorted(unknown))}")
+        return value
+    
+    @property
+    def features(self) -> set:
+        """Enabled features"""
+        return {name.strip() for name in self.enabled_features.split(",") if name.strip()}
+    
+    def missing_settings(self, subsystem: str) -> list:
+        """Names of required settings of a subsystem that are not set"""
+        if subsystem == "chatbot":
+            required = ["azure_openai_api_key", "azure_openai_endpoint", "azure_openai_deployment_name"]
+        elif subsystem == "storage" and self.storage_backend == "azure":
+            required = ["azure_storage_connection_string"]
+        else:
+            required = []
+        return [name for name in required if not getattr(self, name)]
+    
+    def require(self, subsystem: str) -> None:
+        """
+        Check a subsystem's settings before it is first used
+        
+        Raises:
+            SubsystemNotConfiguredError: If required settings are missing
+        """
+        missing = self.missing_settings(subsystem)
+        if missing:
+            raise SubsystemNotConfiguredError(
+                f"{subsystem.capitalize()} not configured. "
+                f"Please set {', '.join(name.upper() for name in missing)} in .env"
+            )
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,23 +1,111 @@
-from pymongo import MongoClient
-from pymongo.collection import Collection
-from pymongo.database import Database
+from motor.motor_asyncio import (
+    AsyncIOMotorClient,
+    AsyncIOMotorCollection,
+    AsyncIOMotorDatabase,
+)
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
 from app.config import settings
+from app.metrics import MongoCommandListener
 from typing import Optional
 
+# Indexes behind every service query, by collection. scripts/check_query_plans.py
+# fails if a query added later is not covered by one of them.
+INDEXES = {
+    "invitations": [
+        # Code lookups, verify, and the duplicate-key retry in bulk creation
+        IndexModel([("invitation_code", ASCENDING)], name="invitation_code_unique", unique=True),
+        # Per-graduate listing in _id order (keyset pages), delete and archive
+        IndexModel([("graduate_id", ASCENDING), ("_id", ASCENDING)], name="graduate_id_id"),
+    ],
+    "graduates": [
+        # Season purge
+        IndexModel([("graduation_datetime", ASCENDING)], name="graduation_datetime"),
+    ],
+    "blob_refs": [
+        # Deduplication report
+        IndexModel([("ref_count", ASCENDING)], name="ref_count"),
+    ],
+    "cleanup_jobs": [
+        # Resuming interrupted jobs at startup
+        IndexModel([("status", ASCENDING)], name="status"),
+    ],
+    "photo_jobs": [
+        # Requeueing interrupted and abandoned jobs at startup
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)], name="status_updated_at"),
+        # Finished jobs expire (only they have finished_at)
+        IndexModel(
+            [("finished_at", ASCENDING)],
+            name="finished_at_ttl",
+            expireAfterSeconds=settings.image_pipeline_job_ttl_seconds,
+        ),
+    ],
+    "chat_sessions": [
+        # Idle sessions expire (sessions are looked up by _id)
+        IndexModel(
+            [("updated_at", ASCENDING)],
+            name="updated_at_ttl",
+            expireAfterSeconds=settings.chat_session_ttl_seconds,
+        ),
+    ],
+    "token_usage": [
+        # Old days expire (usage is updated by _id)
+        IndexModel(
+            [("day", ASCENDING)],
+            name="day_ttl",
+            expireAfterSeconds=settings.token_usage_retention_days * 86400,
+        ),
+    ],
+}
+
 class MongoDB:
-    """MongoDB connection handler"""
+    """Async MongoDB connection handler backed by a pooled Motor client"""
+    
+    _client: Optional[AsyncIOMotorClient] = None
+    _db: Optional[AsyncIOMotorDatabase] = None
     
-    _client: Optional[MongoClient] = None
-    _db: Optional[Database] = None
+    @classmethod
+    async def connect(cls) -> None:
+        """Connect to MongoDB and make sure the declared indexes exist"""
+        cls._open()
+        await cls.ensure_indexes()
     
     @classmethod
-    def connect(cls) -> None:
-        """Connect to MongoDB"""
+    def _open(cls) -> None:
+        """Create the client; connections are opened lazily by the pool"""
         if cls._client is None:
-            cls._client = MongoClient(settings.mongodb_connection_string)
-            cls._db = cls._client["graduation_invitations"]
+            cls._client = AsyncIOMotorClient(
+                settings.mongodb_connection_string,
+                maxPoolSize=settings.mongodb_max_pool_size,
+                minPoolSize=settings.mongodb_min_pool_size,
+                waitQueueTimeoutMS=settings.mongodb_wait_queue_timeout_ms,
+                serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms,
+                event_listeners=[MongoCommandListener()] if settings.metrics_enabled else [],
+            )
+            cls._db = cls._client[settings.mongodb_database_name]
             print("Connected to MongoDB")
     
+    @classmethod
+    async def ensure_indexes(cls) -> dict:
+        """
+        Create the indexes in INDEXES
+        
+        Idempotent: MongoDB skips indexes that already exist with the same
+        keys and options. A conflict (e.g. duplicate invitation codes
+        blocking the unique index) is reported without stopping startup.
+        
+        Returns:
+            {collection: [index names]} for the collections that succeeded
+        """
+        db = cls.get_database()
+        created = {}
+        for collection_name, indexes in INDEXES.items():
+            try:
+                created[collection_name] = await db[collection_name].create_indexes(indexes)
+            except OperationFailure as e:
+                print(f"Error creating indexes on {collection_name}: {e}")
+        return created
+    
     @classmethod
     def disconnect(cls) -> None:
         """Disconnect from MongoDB"""
@@ -28,23 +116,71 @@ class MongoDB:
             print("Disconnected from MongoDB")
     
     @classmethod
-    def get_database(cls) -> Database:
+    def get_database(cls) -> AsyncIOMotorDatabase:
         """Get database instance"""
         if cls._db is None:
-            cls.connect()
+            cls._open()
         return cls._db
     
     @classmethod
-    def get_graduates_collection(cls) -> Collection:
+    def get_graduates_collection(cls) -> AsyncIOMotorCollection:
         """Get graduates collection"""
         db = cls.get_database()
         return db["graduates"]
     
     @classmethod
-    def get_invitations_collection(cls) -> Collection:
+    def get_invitations_collection(cls) -> AsyncIOMotorCollection:
         """Get invitations collection"""
         db = cls.get_database()
         return db["invitations"]
+    
+    @classmethod
+    def get_counters_collection(cls) -> AsyncIOMotorCollection:
+        """Get counters collection used for code allocation"""
+        db = cls.get_database()
+        return db["counters"]
+    
+    @classmethod
+    def get_blob_refs_collection(cls) -> AsyncIOMotorCollection:
+        """Get reference counts for content-addressed blobs"""
+        db = cls.get_database()
+        return db["blob_refs"]
+    
+    @classmethod
+    def get_cleanup_jobs_collection(cls) -> AsyncIOMotorCollection:
+        """Get graduate delete/purge job state"""
+        db = cls.get_database()
+        return db["cleanup_jobs"]
+    
+    @classmethod
+    def get_photo_jobs_collection(cls) -> AsyncIOMotorCollection:
+        """Get photo derivative job state"""
+        db = cls.get_database()
+        return db["photo_jobs"]
+    
+    @classmethod
+    def get_graduates_archive_collection(cls) -> AsyncIOMotorCollection:
+        """Get archived graduates"""
+        db = cls.get_database()
+        return db["graduates_archive"]
+    
+    @classmethod
+    def get_chat_sessions_collection(cls) -> AsyncIOMotorCollection:
+        """Get persisted chat sessions"""
+        db = cls.get_database()
+        return db["chat_sessions"]
+    
+    @classmethod
+    def get_token_usage_collection(cls) -> AsyncIOMotorCollection:
+        """Get daily token usage per graduate"""
+        db = cls.get_database()
+        return db["token_usage"]
+    
+    @classmethod
+    def get_invitations_archive_collection(cls) -> AsyncIOMotorCollection:
+        """Get archived invitations"""
+        db = cls.get_database()
+        return db["invitations_archive"]
 
 # Initialize MongoDB
 mongo_db = MongoDB()
@@ -0,0 +1,83 @@
+"""
+Conditional request helpers (ETag, Last-Modified, 304 Not Modified)
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response, status
+from app.config import settings
+
+
+def graduate_etag(graduate_id: str, version: int) -> str:
+    """Strong ETag of a graduate document; changes whenever version is bumped"""
+    return f'"g-{graduate_id}-{version}"'
+
+
+def invitation_etag(invitation_code: str, graduate_version: int) -> str:
+    """Strong ETag of a verify response (the guest name never changes)"""
+    return f'"i-{invitation_code}-{graduate_version}"'
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    """Format a datetime for Last-Modified; naive values are UTC as stored by Mongo"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def cache_control(private: bool = False) -> str:
+    """Cache-Control for versioned JSON: reusable for the configured age, then revalidated"""
+    scope = "private" if private else "public"
+    max_age = settings.http_cache_max_age_seconds
+    if max_age <= 0:
+        return f"{scope}, no-cache"
+    return f"{scope}, max-age={max_age}, must-revalidate"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluate If-None-Match, falling back to If-Modified-Since
+
+    If-Modified-Since is only consulted when the request has no
+    If-None-Match, and compares at one-second precision.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None, private: bool = False) -> dict:
+    """ETag, Last-Modified and Cache-Control for a versioned response"""
+    headers = {"ETag": etag, "Cache-Control": cache_control(private)}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified(headers: dict) -> Response:
+    """Empty 304 carrying the validators, so caches can refresh their copy"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -1,15 +1,29 @@
-from fastapi import FastAPI
+import importlib
+from fastapi import FastAPI, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from app.config import FEATURE_SUBSYSTEMS, FEATURES, settings
 from app.database import mongo_db
-from app.routes import graduates, invitations, chatbot
+from app.metrics import render_metrics
+from app.middleware import CompressionMiddleware, MetricsMiddleware
+from app.services.cleanup_service import close_cleanup_service, get_cleanup_service
+from app.services.image_pipeline import close_image_pipeline, get_image_pipeline
+from app.services.issued_codes import issued_code_filter
+from app.services.llm_client import close_llm_client
+from app.services.query import NEXT_CURSOR_HEADER
+from app.services.storage_service import close_storage_service
 
 # Create FastAPI app
 app = FastAPI(
     title="Graduation Invitation API",
     description="API for managing graduation invitations and chatbot",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Compress large JSON responses
+app.add_middleware(CompressionMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -17,23 +31,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
-# Include routers
-app.include_router(graduates.router)
-app.include_router(invitations.router)
-app.include_router(chatbot.router)
+# Outermost, so latency includes compression and CORS
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Include the routers of enabled features; the others are never imported
+for feature in FEATURES:
+    if feature in settings.features:
+        app.include_router(importlib.import_module(f"app.routes.{feature}").router)
+
+def unconfigured_subsystems() -> dict:
+    """Missing settings of the subsystems the enabled features use"""
+    missing = {}
+    for feature in settings.features:
+        for subsystem in FEATURE_SUBSYSTEMS.get(feature, ()):
+            names = settings.missing_settings(subsystem)
+            if names:
+                missing[subsystem] = names
+    return missing
 
 @app.on_event("startup")
 async def startup():
     """Initialize database connection on startup"""
-    mongo_db.connect()
-    print("Application startup - MongoDB connected")
+    try:
+        await mongo_db.connect()
+        print("Application startup - MongoDB connected")
+    except Exception as e:
+        print(f"Error connecting to MongoDB: {e}")
+    print(f"Serving features: {', '.join(sorted(settings.features))}")
+    for subsystem, names in unconfigured_subsystems().items():
+        print(f"Running without {subsystem}: {', '.join(name.upper() for name in names)} not set")
+    if "invitations" in settings.features:
+        # Built in the background; verify falls back to the database until ready
+        issued_code_filter.start()
+    if "graduates" in settings.features:
+        try:
+            resumed = await get_cleanup_service().resume_pending()
+            if resumed:
+                print(f"Resumed {resumed} interrupted cleanup jobs")
+        except Exception as e:
+            print(f"Error resuming cleanup jobs: {e}")
+        if settings.image_pipeline_enabled:
+            try:
+                requeued = await get_image_pipeline().resume_pending()
+                if requeued:
+                    print(f"Requeued {requeued} interrupted photo derivative jobs")
+            except Exception as e:
+                print(f"Error requeueing photo derivative jobs: {e}")
 
 @app.on_event("shutdown")
 async def shutdown():
     """Close database connection on shutdown"""
+    await close_cleanup_service()
+    await issued_code_filter.close()
     mongo_db.disconnect()
+    await close_llm_client()
+    await close_image_pipeline()
+    await close_storage_service()
     print("Application shutdown - MongoDB disconnected")
 
 @app.get("/")
@@ -47,8 +104,25 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
+    """
+    Health check endpoint
+    
+    `unconfigured` lists subsystems of enabled features that are missing
+    settings; their routes answer 503 (photos) or locally (chatbot).
+    """
+    return {
+        "status": "healthy",
+        "features": sorted(settings.features),
+        "unconfigured": unconfigured_subsystems(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
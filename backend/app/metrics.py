@@ -0,0 +1,174 @@
+"""
+Prometheus metrics for the API, MongoDB, Azure OpenAI and photo storage
+
+Metrics live in the default prometheus_client registry and are rendered by
+`/metrics`. When the app runs with several worker processes, set
+PROMETHEUS_MULTIPROC_DIR so every worker writes to a shared directory and
+the endpoint aggregates them.
+
+Label values are bounded: HTTP routes use the path template (never the
+raw path), Mongo metrics use collection and command names.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from pymongo import monitoring
+
+# Seconds; Mongo commands are mostly sub-millisecond index lookups
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0)
+STORAGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command round trip as reported by the driver",
+    ["collection", "command", "outcome"],
+    buckets=MONGO_BUCKETS,
+)
+MONGO_DOCUMENTS_RETURNED = Counter(
+    "mongodb_documents_returned_total",
+    "Documents returned in cursor batches (find, aggregate, getMore)",
+    ["collection", "command"],
+)
+
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "Azure OpenAI completion time including retries, excluding queueing",
+    ["operation", "outcome"],
+    buckets=LLM_BUCKETS,
+)
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "Time spent waiting for an LLM concurrency slot",
+    buckets=LLM_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from opening a streamed completion to its first text delta",
+    buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens used by completions (kind prompt, completion or cached_prompt); streamed completions are estimated",
+    ["kind", "source"],
+)
+
+STORAGE_UPLOAD_DURATION = Histogram(
+    "storage_upload_duration_seconds",
+    "Time to write one blob to the storage backend",
+    ["backend", "outcome"],
+    buckets=STORAGE_BUCKETS,
+)
+STORAGE_UPLOAD_BYTES = Counter(
+    "storage_upload_bytes_total",
+    "Bytes written to the storage backend",
+    ["backend"],
+)
+STORAGE_DEDUPLICATED_BYTES = Counter(
+    "storage_deduplicated_bytes_total",
+    "Bytes of uploads that were already stored and not written again",
+    ["backend"],
+)
+
+
+@contextmanager
+def observe_duration(histogram: Histogram, **labels) -> Iterator[dict]:
+    """
+    Time a block into a histogram labelled with `outcome`
+
+    The yielded dict may be updated to change labels; outcome is "error"
+    if the block raises, "cancelled" if it is cancelled or closed early,
+    otherwise "ok" unless set explicitly.
+    """
+    labels = dict(labels)
+    started = time.perf_counter()
+    try:
+        yield labels
+    except (asyncio.CancelledError, GeneratorExit):
+        labels["outcome"] = "cancelled"
+        raise
+    except BaseException:
+        labels["outcome"] = "error"
+        raise
+    finally:
+        labels.setdefault("outcome", "ok")
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Record per-collection, per-command latency and returned documents
+
+    Called on the driver's I/O threads, so it only does dict operations and
+    metric updates. The collection of a command is remembered between its
+    started and succeeded/failed events.
+    """
+
+    def __init__(self):
+        self._collections: dict = {}
+
+    def started(self, event) -> None:
+        command = event.command
+        collection = command.get(event.command_name) if command else None
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def succeeded(self, event) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+        reply = event.reply
+        cursor = reply.get("cursor") if reply else None
+        if isinstance(cursor, dict):
+            batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+            if batch:
+                MONGO_DOCUMENTS_RETURNED.labels(collection, event.command_name).inc(len(batch))
+
+    def failed(self, event) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name, "error").observe(event.duration_micros / 1e6)
+
+
+def render_metrics() -> tuple:
+    """
+    Render all metrics in the Prometheus text format
+
+    Returns:
+        (body, content type)
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
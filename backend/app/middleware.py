@@ -0,0 +1,98 @@
+"""
+ASGI middleware shared by the API
+"""
+
+import time
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.routing import Match
+from app.config import settings
+from app.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+
+# Streams must reach the client as they are produced, and photos are
+# already compressed (and served with byte ranges)
+UNCOMPRESSED_PATH_PREFIXES = ("/files/",)
+UNCOMPRESSED_PATH_SUFFIXES = ("/chat/stream",)
+
+
+class CompressionMiddleware:
+    """
+    Compress large responses with brotli when brotli-asgi is installed,
+    falling back to gzip
+
+    Responses smaller than `settings.compression_min_size`, SSE chat streams
+    and /files are sent as-is.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        try:
+            from brotli_asgi import BrotliMiddleware
+        except ImportError:
+            self.compressed = GZipMiddleware(app, minimum_size=settings.compression_min_size)
+        else:
+            self.compressed = BrotliMiddleware(
+                app,
+                minimum_size=settings.compression_min_size,
+                gzip_fallback=True,
+            )
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or self._excluded(scope["path"]):
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
+
+    @staticmethod
+    def _excluded(path: str) -> bool:
+        return path.startswith(UNCOMPRESSED_PATH_PREFIXES) or path.endswith(UNCOMPRESSED_PATH_SUFFIXES)
+
+
+class MetricsMiddleware:
+    """
+    Record per-route latency histograms and in-flight gauges
+
+    Requests are labelled with the route's path template (e.g.
+    `/api/graduates/{graduate_id}`), so label values stay bounded; paths
+    that match no route share the `unmatched` label. Latency runs until the
+    last body chunk is sent, so streamed responses count their full length.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status_code = 500
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method, route)
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _route_template(scope) -> str:
+        router = getattr(scope.get("app"), "router", None)
+        partial = None
+        for route in getattr(router, "routes", ()):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                # Path matched with another method (405)
+                partial = route.path
+        return partial or "unmatched"
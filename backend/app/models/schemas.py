@@ -1,6 +1,11 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
+from pydantic import BaseModel, BeforeValidator, EmailStr, Field
+from typing import Annotated, Optional
 from datetime import datetime
+from bson import ObjectId
+
+# Services hand raw Mongo documents to the response models, which turn
+# ObjectIds into strings while validating
+ObjectIdStr = Annotated[str, BeforeValidator(lambda value: str(value) if isinstance(value, ObjectId) else value)]
 
 # ==================== Request/Response Models ====================
 
@@ -26,21 +31,40 @@ class CreateGraduateRequest(BaseModel):
     contact: ContactInfo
     photo_urls: Optional[list[str]] = None  # List of photo URLs - optional
 
+class VenueResponse(BaseModel):
+    """Stored venue information; any field may be projected out or missing"""
+    name: Optional[str] = None
+    address: Optional[str] = None
+    parking: Optional[str] = None
+
+class ContactResponse(BaseModel):
+    """Stored contact information; any field may be projected out or missing"""
+    email: Optional[str] = None
+    phone: Optional[str] = None
+
 class GraduateResponse(BaseModel):
-    """Response for graduate info"""
-    graduate_id: str = Field(alias="_id")
-    name: str
-    degree: str
-    department: str
-    graduation_datetime: datetime
-    venue: VenueInfo
-    invitation_template: Optional[str]
+    """Response for graduate info; fields left out by a `fields=` projection are omitted"""
+    graduate_id: ObjectIdStr = Field(alias="_id")
+    name: Optional[str] = None
+    degree: Optional[str] = None
+    department: Optional[str] = None
+    graduation_datetime: Optional[datetime] = None
+    venue: Optional[VenueResponse] = None
+    invitation_template: Optional[str] = None
     photo_urls: Optional[list[str]] = None
-    contact: ContactInfo
+    photo_derivatives: Optional[list[dict]] = None
+    contact: Optional[ContactResponse] = None
+    version: Optional[int] = None  # Bumped on every update; drives the ETag
+    updated_at: Optional[datetime] = None
     
     class Config:
         populate_by_name = True
 
+class PurgeGraduatesRequest(BaseModel):
+    """Request to remove every graduate of past seasons"""
+    before: datetime  # Graduates with an earlier graduation_datetime are removed
+    archive: bool = True  # Copy graduates and invitations to the archive collections first
+
 class InvitationItem(BaseModel):
     """Single invitation item"""
     guest_name: str  # Name of invited person
@@ -52,10 +76,14 @@ class CreateInvitationRequest(BaseModel):
     guest_names: list[str]  # List of guest names for each invitation
 
 class InvitationResponse(BaseModel):
-    """Response for invitation"""
-    invitation_code: str
-    graduate_id: str
-    guest_name: str
+    """Response for invitation; fields left out by a `fields=` projection are omitted"""
+    invitation_id: Optional[ObjectIdStr] = Field(default=None, alias="_id")
+    invitation_code: Optional[str] = None
+    graduate_id: Optional[str] = None
+    guest_name: Optional[str] = None
+    
+    class Config:
+        populate_by_name = True
 
 class VerifyInvitationRequest(BaseModel):
     """Request to verify invitation code"""
@@ -69,8 +97,18 @@ class VerifyInvitationResponse(BaseModel):
 
 class ChatRequest(BaseModel):
     """Request to chat with graduate info chatbot"""
-    message: str
+    message: str = Field(..., max_length=2000)
+    invitation_code: Optional[str] = None  # Continues the guest's conversation
+
+class ChatUsage(BaseModel):
+    """Token accounting of a chat session"""
+    requests: int
+    llm_requests: int
+    prompt_tokens: int
+    completion_tokens: int
+    history_turns: int
 
 class ChatResponse(BaseModel):
     """Response from chatbot"""
     response: str
+    usage: Optional[ChatUsage] = None  # Only for requests with an invitation code
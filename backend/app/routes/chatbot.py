@@ -1,7 +1,20 @@
-from fastapi import APIRouter, HTTPException, status
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from app.config import settings
 from app.models.schemas import ChatRequest, ChatResponse
-from app.services.chatbot_service import ChatbotService
+from app.services.answer_cache import answer_cache
+from app.services.chat_sessions import ChatSession, chat_sessions
+from app.services.chatbot_service import ChatbotService, ERROR_MESSAGE
+from app.services.intent_answerer import intent_answerer
+from app.services.llm_client import get_llm_client
+from app.services.prompt_cache import prompt_cache
 from app.services.graduate_service import GraduateService
+from app.services.invitation_service import InvitationService
+from app.services.rate_limiter import chat_limiter, rate_limit
+from app.services.token_budget import token_budget
 
 router = APIRouter(prefix="/api/graduates", tags=["chatbot"])
 
@@ -14,13 +27,72 @@ def get_chatbot_service():
         _chatbot_service = ChatbotService()
     return _chatbot_service
 
-@router.post("/{graduate_id}/chat", response_model=ChatResponse)
+async def get_chat_session(graduate_id: str, graduate: dict, invitation_code: Optional[str]) -> Optional[ChatSession]:
+    """
+    Get the guest's chat session, or None for a stateless question
+    
+    The invitation code must belong to the graduate being asked about, so a
+    guest can only continue their own conversation.
+    """
+    if not invitation_code or not settings.chat_sessions_enabled:
+        return None
+    
+    verified = await InvitationService.verify_with_graduate(invitation_code)
+    if not verified or verified["graduate_id"] != graduate_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invitation code does not belong to this graduate"
+        )
+    return await chat_sessions.get(invitation_code, graduate_id, get_chatbot_service().event_hash(graduate))
+
+@router.get("/chat/stats", response_model=dict)
+async def get_chat_stats():
+    """
+    Get chatbot counters since process start
+    
+    - **local**: questions answered from the graduate document vs. sent on
+    - **cache**: answer cache hits; `dollars_saved` is the cost of the
+      completions that cache hits avoided, at the configured token prices
+    - **llm**: in-flight and queued completions, retries and saturation
+      (`configured: false` when Azure OpenAI is not set up and every
+      question is answered locally)
+    - **admission**: requests admitted or throttled by the chat rate limiter
+    - **sessions**: in-memory chat sessions, loads from MongoDB and history
+      resets after the event details changed
+    - **prompts**: compiled system prompts (one per graduate version)
+    - **budget**: today's tokens against the global daily budget, including
+      prompt tokens served from the provider's prompt cache, and how many
+      questions went to the primary or economy deployment or were answered
+      locally
+    """
+    return {
+        "local": intent_answerer.stats(),
+        "cache": answer_cache.stats(),
+        "llm": get_llm_client().stats() if not settings.missing_settings("chatbot") else {"configured": False},
+        "admission": chat_limiter.stats(),
+        "sessions": chat_sessions.stats(),
+        "prompts": prompt_cache.stats(),
+        "budget": token_budget.stats(),
+    }
+
+@router.get("/{graduate_id}/chat/usage", response_model=dict)
+async def get_chat_usage(graduate_id: str):
+    """
+    Get a graduate's chatbot token usage today (UTC)
+    
+    - **budget**: the per-graduate daily token budget (0 = unlimited)
+    """
+    return token_budget.usage(graduate_id)
+
+@router.post("/{graduate_id}/chat", response_model=ChatResponse, dependencies=[Depends(rate_limit(chat_limiter))])
 async def chat(graduate_id: str, request: ChatRequest):
     """
     Chat with graduate information chatbot
     
     - **graduate_id**: MongoDB ObjectId of the graduate
     - **message**: User's question about the graduation event
+    - **invitation_code**: Optional; continues the guest's conversation, so
+      follow-up questions can rely on earlier answers
     
     The chatbot can answer questions about:
     - Time and date of graduation
@@ -30,19 +102,80 @@ async def chat(graduate_id: str, request: ChatRequest):
     - Other details about the event
     """
     # Verify that graduate exists
-    graduate = GraduateService.get_graduate(graduate_id)
+    graduate = await GraduateService.get_graduate(graduate_id)
     if not graduate:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Graduate not found"
         )
     
+    session = await get_chat_session(graduate_id, graduate, request.invitation_code)
+    
     try:
         chatbot_service = get_chatbot_service()
-        response = chatbot_service.generate_response(graduate, request.message)
-        return ChatResponse(response=response)
+        response = await chatbot_service.generate_response(graduate, request.message, session)
+        if session is None:
+            return ChatResponse(response=response)
+        await chat_sessions.save(session)
+        return ChatResponse(response=response, usage=session.usage())
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Chatbot error: {str(e)}"
         )
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """Format one Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/{graduate_id}/chat/stream", dependencies=[Depends(rate_limit(chat_limiter))])
+async def chat_stream(graduate_id: str, request: ChatRequest, http_request: Request):
+    """
+    Chat with graduate information chatbot, streaming the answer over Server-Sent Events
+    
+    - **graduate_id**: MongoDB ObjectId of the graduate
+    - **message**: User's question about the graduation event
+    - **invitation_code**: Optional; continues the guest's conversation
+    
+    Emits `data: {"delta": "..."}` messages as tokens arrive, then an
+    `event: done` message (carrying the session's `usage` when there is
+    one). Failures are reported as an `event: error`
+    message. If the client disconnects, the upstream completion is cancelled.
+    """
+    graduate = await GraduateService.get_graduate(graduate_id)
+    if not graduate:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Graduate not found"
+        )
+    
+    session = await get_chat_session(graduate_id, graduate, request.invitation_code)
+    chatbot_service = get_chatbot_service()
+    
+    async def events():
+        deltas = chatbot_service.stream_response(graduate, request.message, session)
+        try:
+            async for delta in deltas:
+                if await http_request.is_disconnected():
+                    break
+                yield _sse_event({"delta": delta})
+            else:
+                if session is None:
+                    yield _sse_event({}, event="done")
+                else:
+                    await chat_sessions.save(session)
+                    yield _sse_event({"usage": session.usage()}, event="done")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error streaming OpenAI response: {e}")
+            yield _sse_event({"detail": ERROR_MESSAGE}, event="error")
+        finally:
+            await deltas.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,201 @@
+import asyncio
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+from app.config import settings
+from app.http_cache import etag_matches
+from app.services.storage_backends.local import LocalStorageBackend
+from app.services.storage_service import CONTENT_PREFIX, get_storage_service
+
+router = APIRouter(prefix="/files", tags=["files"])
+
+# Content-addressed blobs never change, so browsers and CDNs may keep them
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into an inclusive (start, end) pair
+
+    Returns None for multi-range or malformed headers, which are served as a
+    full 200 response.
+
+    Raises:
+        ValueError: If the range cannot be satisfied for a file of this size
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        if first.isdigit() or last.isdigit():
+            raise
+        return None
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class FileRangeResponse(Response):
+    """
+    Serve a local file with conditional and single-range support
+
+    When the ASGI server offers the `http.response.zerocopy` extension the
+    file descriptor is handed to it (sendfile); otherwise the file is read in
+    a worker thread and sent in chunks, so the event loop never blocks on
+    disk I/O.
+    """
+
+    chunk_size = 256 * 1024
+
+    def __init__(self, path: str, name: str, request: Request):
+        self.path = path
+        self.send_body = request.method != "HEAD"
+        self.background = None
+        self.body = b""
+        self.media_type = None
+        self.start = 0
+        self.length = 0
+
+        stat_result = os.stat(path)
+        size = stat_result.st_size
+        etag = f'"{stat_result.st_mtime_ns:x}-{size:x}"'
+        headers = {
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": IMMUTABLE_CACHE_CONTROL if name.startswith(CONTENT_PREFIX) else DEFAULT_CACHE_CONTROL,
+            "accept-ranges": "bytes",
+        }
+
+        if self._not_modified(request, etag, stat_result.st_mtime):
+            self.status_code = status.HTTP_304_NOT_MODIFIED
+            self.init_headers(headers)
+            return
+
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                self.status_code = status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+                headers["content-range"] = f"bytes */{size}"
+                headers["content-length"] = "0"
+                self.init_headers(headers)
+                return
+
+        content_type, _ = mimetypes.guess_type(name)
+        headers["content-type"] = content_type or "application/octet-stream"
+        if byte_range is None:
+            self.status_code = status.HTTP_200_OK
+            self.length = size
+        else:
+            self.status_code = status.HTTP_206_PARTIAL_CONTENT
+            self.start, end = byte_range
+            self.length = end - self.start + 1
+            headers["content-range"] = f"bytes {self.start}-{end}/{size}"
+        headers["content-length"] = str(self.length)
+        self.init_headers(headers)
+
+    @staticmethod
+    def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            offset = self.start
+            remaining = self.length
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, fd, min(self.chunk_size, remaining), offset)
+                if not chunk:
+                    # File shrank after the headers were sent
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+
+@router.api_route("/{name:path}", methods=["GET", "HEAD"])
+async def serve_file(name: str, request: Request):
+    """
+    Serve a photo stored by the local storage backend
+
+    Supports ETag/Last-Modified revalidation and byte ranges. Returns 404
+    when photos are stored in Azure, which serves its own URLs.
+    """
+    if settings.storage_backend != "local":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    backend = get_storage_service().backend
+    if not isinstance(backend, LocalStorageBackend):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    try:
+        path = backend.path_for(name)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    if not path.is_file() or path.name.endswith(".tmp"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    if settings.local_storage_accel_redirect:
+        # nginx serves the file (ranges, sendfile, caching) from its own
+        # internal location mapped to local_storage_path
+        prefix = settings.local_storage_accel_redirect.rstrip("/")
+        content_type, _ = mimetypes.guess_type(name)
+        return Response(
+            headers={"X-Accel-Redirect": f"{prefix}/{quote(name)}"},
+            media_type=content_type or "application/octet-stream",
+        )
+
+    return FileRangeResponse(str(path), name, request)
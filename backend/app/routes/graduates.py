@@ -1,13 +1,37 @@
-from fastapi import APIRouter, HTTPException, status, UploadFile, File
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, UploadFile, File, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from pymongo.errors import OperationFailure
+from app.config import SubsystemNotConfiguredError, settings
+from app.http_cache import graduate_etag, is_not_modified, not_modified, validator_headers
 from app.models.schemas import (
     CreateGraduateRequest, 
     GraduateResponse,
+    PurgeGraduatesRequest,
 )
+from app.services.cleanup_service import JobRunningError, get_cleanup_service
 from app.services.graduate_service import GraduateService
-from app.services.storage_service import get_storage_service
+from app.services.image_pipeline import PipelineBusyError, get_image_pipeline
+from app.services.storage_service import (
+    FileTooLargeError,
+    get_storage_service,
+    iter_upload_file,
+)
+from app.services.query import (
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    model_response,
+    parse_fields,
+    to_ndjson,
+)
 
 router = APIRouter(prefix="/api/graduates", tags=["graduates"])
 
+_graduate = TypeAdapter(GraduateResponse)
+_graduate_list = TypeAdapter(list[GraduateResponse])
+
 @router.post("", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def create_graduate(request: CreateGraduateRequest):
     """
@@ -46,7 +70,7 @@ async def create_graduate(request: CreateGraduateRequest):
     ```
     """
     try:
-        graduate_id = GraduateService.create_graduate(request)
+        graduate_id = await GraduateService.create_graduate(request)
         return {
             "message": "Graduate created successfully",
             "graduate_id": graduate_id
@@ -57,14 +81,26 @@ async def create_graduate(request: CreateGraduateRequest):
             detail=str(e)
         )
 
-@router.get("/{graduate_id}", response_model=dict)
-async def get_graduate(graduate_id: str):
+@router.get("/{graduate_id}", response_model=GraduateResponse, response_model_exclude_unset=True)
+async def get_graduate(graduate_id: str, request: Request):
     """
     Get graduate information by ID
     
     - **graduate_id**: MongoDB ObjectId of the graduate
+    
+    Responses carry an `ETag` that changes whenever the graduate is updated;
+    send it back in `If-None-Match` to get `304 Not Modified` instead of
+    the document.
     """
-    graduate = GraduateService.get_graduate(graduate_id)
+    if request.headers.get("if-none-match") or request.headers.get("if-modified-since"):
+        # Validators only: a matching client never costs a full document read
+        validators = await GraduateService.get_graduate_version(graduate_id)
+        if validators is not None:
+            etag = graduate_etag(graduate_id, validators["version"])
+            if is_not_modified(request, etag, validators["updated_at"]):
+                return not_modified(validator_headers(etag, validators["updated_at"]))
+    
+    graduate = await GraduateService.get_graduate(graduate_id)
     
     if not graduate:
         raise HTTPException(
@@ -72,7 +108,8 @@ async def get_graduate(graduate_id: str):
             detail="Graduate not found"
         )
     
-    return graduate
+    etag = graduate_etag(graduate_id, graduate.get("version", 0))
+    return model_response(_graduate, graduate, validator_headers(etag, graduate.get("updated_at")))
 
 @router.put("/{graduate_id}", response_model=dict)
 async def update_graduate(graduate_id: str, request: dict):
@@ -83,7 +120,7 @@ async def update_graduate(graduate_id: str, request: dict):
     - **request**: Fields to update (e.g., {"photo_urls": [...]})
     """
     try:
-        updated = GraduateService.update_graduate(graduate_id, request)
+        updated = await GraduateService.update_graduate(graduate_id, request)
         if not updated:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -96,16 +133,181 @@ async def update_graduate(graduate_id: str, request: dict):
             detail=str(e)
         )
 
-@router.get("", response_model=list)
-async def get_all_graduates():
-    """Get all graduates"""
-    graduates = GraduateService.get_all_graduates()
-    return graduates
+@router.delete("/{graduate_id}", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def delete_graduate(graduate_id: str, archive: bool = Query(False)):
+    """
+    Delete a graduate with its invitations and photos in the background
+    
+    - **graduate_id**: MongoDB ObjectId of the graduate
+    - **archive**: Copy the graduate and its invitations to the archive
+      collections before deleting. Only the documents are kept: photos and
+      derivatives are deleted, and the archived graduate gets
+      `media_purged_at`
+    
+    Poll `GET /api/graduates/cleanup/jobs/{job_id}` for progress.
+    """
+    graduate = await GraduateService.get_graduate(graduate_id)
+    if not graduate:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Graduate not found"
+        )
+    return await get_cleanup_service().start_graduate_delete(graduate_id, archive)
+
+@router.post("/purge", response_model=dict, status_code=status.HTTP_202_ACCEPTED)
+async def purge_graduates(request: PurgeGraduatesRequest):
+    """
+    Remove every graduate of past seasons in the background
+    
+    - **before**: Graduates with an earlier `graduation_datetime` are removed
+    - **archive**: Copy them to the archive collections first (default true).
+      Only the documents are kept: photos and derivatives are deleted, and
+      each archived graduate gets `media_purged_at`
+    
+    `progress.graduates_total` in the returned job is the number of
+    graduates matched.
+    """
+    return await get_cleanup_service().start_season_purge(request.before, request.archive)
+
+@router.get("/cleanup/jobs/{job_id}", response_model=dict)
+async def get_cleanup_job(job_id: str):
+    """
+    Get the status of a delete or purge job
+    
+    `status` is one of queued, running, interrupted, done or failed;
+    `progress` counts graduates, released photos, deleted blobs and deleted
+    invitations.
+    """
+    job = await get_cleanup_service().get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.post("/cleanup/jobs/{job_id}/resume", response_model=dict)
+async def resume_cleanup_job(job_id: str):
+    """
+    Resume a failed or interrupted delete/purge job
+    
+    Graduates already removed are skipped. Jobs left running by a crashed
+    server can be resumed too.
+    """
+    try:
+        job = await get_cleanup_service().resume(job_id)
+    except JobRunningError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+@router.get("", response_model=list[GraduateResponse], response_model_exclude_unset=True)
+async def get_all_graduates(
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None),
+    stream: bool = Query(False),
+):
+    """
+    Get all graduates
+    
+    - **after** (optional): `_id` of the last graduate of the previous page
+    - **limit** (optional): Page size; when the page is full the next cursor
+      is returned in the `X-Next-Cursor` header
+    - **fields** (optional): Comma-separated fields to return, e.g.
+      `name,department,photo_urls` (`_id` is always included)
+    - **stream** (optional): Stream the result as NDJSON, one graduate per line
+    
+    Examples:
+    - GET /api/graduates?limit=50
+    - GET /api/graduates?limit=50&after=65a1b2c3d4e5f6g7h8i9j0k1
+    - GET /api/graduates?fields=name,department&stream=true
+    """
+    try:
+        field_list = parse_fields(fields)
+        if stream:
+            documents = GraduateService.iter_graduates(after, limit, field_list)
+            return StreamingResponse(to_ndjson(documents), media_type="application/x-ndjson")
+        
+        graduates = await GraduateService.get_all_graduates(after, limit, field_list)
+    except (ValueError, OperationFailure) as e:
+        # Bad cursor or field names, or a projection Mongo rejects (path collision)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    headers = None
+    if limit and len(graduates) == limit:
+        headers = {NEXT_CURSOR_HEADER: str(graduates[-1]["_id"])}
+    return model_response(_graduate_list, graduates, headers)
+
+ALLOWED_PHOTO_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+MAX_PHOTO_SIZE = 5 * 1024 * 1024
+
+def _storage():
+    """Storage service, or 503 when photo storage is not configured"""
+    try:
+        return get_storage_service()
+    except SubsystemNotConfiguredError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+async def _store_photo(graduate_id: str, file: UploadFile) -> str:
+    """
+    Validate a photo and stream it to storage
+    
+    Raises:
+        HTTPException: 400 for a disallowed type, 413 when over 5MB, 503
+            when photo storage is not configured
+    """
+    if file.content_type not in ALLOWED_PHOTO_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File type not allowed. Accept: JPG, PNG, GIF, WebP"
+        )
+    
+    # Upload to storage in chunks, enforcing the 5MB limit as bytes arrive
+    try:
+        return await _storage().upload_stream(
+            iter_upload_file(file, settings.azure_storage_block_size),
+            file_name=file.filename,
+            graduate_id=graduate_id,
+            max_size=MAX_PHOTO_SIZE,
+            content_type=file.content_type
+        )
+    except FileTooLargeError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File size too large (max 5MB)"
+        )
+
+async def _submit_derivatives(graduate_id: str, photo_url: str) -> Optional[str]:
+    """Queue thumbnails and WebP/JPEG variants; returns the job id if queued"""
+    if not settings.image_pipeline_enabled:
+        return None
+    try:
+        return await get_image_pipeline().submit(graduate_id, photo_url)
+    except PipelineBusyError as e:
+        print(f"Skipping derivatives for {photo_url}: {e}")
+        return None
+    except Exception as e:
+        print(f"Error queueing derivatives for {photo_url}: {e}")
+        return None
 
 @router.post("/{graduate_id}/photos", response_model=dict)
 async def upload_photo(graduate_id: str, file: UploadFile = File(...)):
     """
-    Upload a photo for a graduate to Azure Storage
+    Upload a photo for a graduate to photo storage
     
     - **graduate_id**: MongoDB ObjectId of the graduate
     - **file**: Image file (jpg, png, etc.)
@@ -114,47 +316,30 @@ async def upload_photo(graduate_id: str, file: UploadFile = File(...)):
     ```json
     {
       "photo_url": "https://storage.azure.com/...",
-      "file_name": "photo.jpg"
+      "file_name": "photo.jpg",
+      "derivative_job_id": "9f1c..."
     }
     ```
+    
+    Resized WebP/JPEG variants are generated in the background and stored
+    in the graduate's `photo_derivatives`; poll
+    `GET /api/graduates/photos/jobs/{derivative_job_id}` for progress.
     """
     try:
         # Validate graduate exists
-        graduate = GraduateService.get_graduate(graduate_id)
+        graduate = await GraduateService.get_graduate(graduate_id)
         if not graduate:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Graduate not found"
             )
         
-        # Validate file type
-        allowed_types = {"image/jpeg", "image/png", "image/gif", "image/webp"}
-        if file.content_type not in allowed_types:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="File type not allowed. Accept: JPG, PNG, GIF, WebP"
-            )
-        
-        # Validate file size (max 5MB)
-        max_size = 5 * 1024 * 1024
-        file_content = await file.read()
-        if len(file_content) > max_size:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="File size too large (max 5MB)"
-            )
-        
-        # Upload to Azure Storage
-        storage_service = get_storage_service()
-        photo_url = storage_service.upload_file(
-            file_content=file_content,
-            file_name=file.filename,
-            graduate_id=graduate_id
-        )
+        photo_url = await _store_photo(graduate_id, file)
         
         return {
             "photo_url": photo_url,
-            "file_name": file.filename
+            "file_name": file.filename,
+            "derivative_job_id": await _submit_derivatives(graduate_id, photo_url)
         }
         
     except HTTPException:
@@ -164,3 +349,106 @@ async def upload_photo(graduate_id: str, file: UploadFile = File(...)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload photo: {str(e)}"
         )
+
+@router.post("/{graduate_id}/photos/batch", response_model=dict)
+async def upload_photos(graduate_id: str, files: List[UploadFile] = File(...)):
+    """
+    Upload several photos in one request and add them to the graduate
+    
+    - **graduate_id**: MongoDB ObjectId of the graduate
+    - **files**: Image files (jpg, png, etc.), repeated `files` form fields
+    
+    Files are uploaded concurrently (at most PHOTO_UPLOAD_CONCURRENCY at a
+    time) and the successful URLs are appended to `photo_urls` in a single
+    update, so no separate `PUT` is needed. `results` has one entry per
+    file, in request order, with `status` "uploaded" or "failed".
+    
+    Returns:
+    ```json
+    {
+      "photo_urls": ["https://storage.azure.com/..."],
+      "results": [
+        {"file_name": "a.jpg", "status": "uploaded", "photo_url": "https://...", "derivative_job_id": "9f1c..."},
+        {"file_name": "b.txt", "status": "failed", "error": "File type not allowed. Accept: JPG, PNG, GIF, WebP"}
+      ]
+    }
+    ```
+    """
+    if len(files) > settings.photo_upload_max_files:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files (max {settings.photo_upload_max_files})"
+        )
+    
+    graduate = await GraduateService.get_graduate(graduate_id)
+    if not graduate:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Graduate not found"
+        )
+    
+    storage_service = _storage()
+    semaphore = asyncio.Semaphore(settings.photo_upload_concurrency)
+    
+    async def upload(file: UploadFile) -> dict:
+        async with semaphore:
+            try:
+                photo_url = await _store_photo(graduate_id, file)
+            except HTTPException as e:
+                return {"file_name": file.filename, "status": "failed", "error": e.detail}
+            except Exception as e:
+                print(f"Error uploading {file.filename}: {e}")
+                return {"file_name": file.filename, "status": "failed", "error": "Failed to upload photo"}
+        return {"file_name": file.filename, "status": "uploaded", "photo_url": photo_url}
+    
+    results = await asyncio.gather(*(upload(file) for file in files))
+    photo_urls = [result["photo_url"] for result in results if result["status"] == "uploaded"]
+    
+    if photo_urls and not await GraduateService.add_photo_urls(graduate_id, photo_urls):
+        # Nothing references the uploads; release them rather than leak blobs
+        await asyncio.gather(*(storage_service.delete_file(url) for url in photo_urls))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to save photo URLs"
+        )
+    
+    for result in results:
+        if result["status"] == "uploaded":
+            result["derivative_job_id"] = await _submit_derivatives(graduate_id, result["photo_url"])
+    
+    return {"photo_urls": photo_urls, "results": results}
+
+@router.get("/photos/storage-report", response_model=dict)
+async def get_photo_storage_report():
+    """
+    Report photo storage deduplication
+    
+    `referenced_bytes` is what would be stored without deduplication;
+    `bytes_saved` is the difference to what is actually stored.
+    """
+    try:
+        return await get_storage_service().get_dedup_report()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+@router.get("/photos/jobs/{job_id}", response_model=dict)
+async def get_photo_job(job_id: str):
+    """
+    Get the status of a photo derivative job
+    
+    - **job_id**: `derivative_job_id` returned by the photo upload
+    
+    `status` is one of queued, processing, interrupted (requeued at the
+    next startup), done or failed; when done,
+    `derivatives` holds the thumbnail/medium/full URLs in WebP and JPEG.
+    """
+    job = await get_image_pipeline().get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
@@ -1,4 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from app.http_cache import invitation_etag, is_not_modified, not_modified, validator_headers
 from app.models.schemas import (
     CreateInvitationRequest,
     InvitationResponse,
@@ -6,10 +10,21 @@ from app.models.schemas import (
     VerifyInvitationResponse,
 )
 from app.services.invitation_service import InvitationService
+from app.services.rate_limiter import rate_limit, verify_limiter
 from app.services.graduate_service import GraduateService
+from app.services.query import (
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    model_response,
+    parse_fields,
+    to_ndjson,
+)
 
 router = APIRouter(prefix="/api/invitations", tags=["invitations"])
 
+_invitation_list = TypeAdapter(list[InvitationResponse])
+_verify_result = TypeAdapter(VerifyInvitationResponse)
+
 @router.post("", response_model=dict, status_code=status.HTTP_201_CREATED)
 async def create_invitations(request: CreateInvitationRequest):
     """
@@ -18,6 +33,9 @@ async def create_invitations(request: CreateInvitationRequest):
     - **graduate_id**: MongoDB ObjectId of the graduate
     - **guest_names**: List of names of people being invited
     
+    `invitations` lists the created invitations; `results` has one entry per
+    guest, in request order, with `status` "created" or "failed".
+    
     Example:
     {
         "graduate_id": "65a1b2c3d4e5f6g7h8i9j0k1",
@@ -25,7 +43,7 @@ async def create_invitations(request: CreateInvitationRequest):
     }
     """
     # Verify that graduate exists
-    graduate = GraduateService.get_graduate(request.graduate_id)
+    graduate = await GraduateService.get_graduate(request.graduate_id)
     if not graduate:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -39,13 +57,23 @@ async def create_invitations(request: CreateInvitationRequest):
         )
     
     try:
-        invitations = InvitationService.create_invitations(
+        results = await InvitationService.create_invitations(
             request.graduate_id,
             request.guest_names
         )
+        invitations = [
+            {
+                "invitation_code": item["invitation_code"],
+                "graduate_id": item["graduate_id"],
+                "guest_name": item["guest_name"],
+            }
+            for item in results
+            if item["status"] == "created"
+        ]
         return {
             "message": f"{len(invitations)} invitation(s) created successfully",
-            "invitations": invitations
+            "invitations": invitations,
+            "results": results
         }
     except Exception as e:
         raise HTTPException(
@@ -53,17 +81,30 @@ async def create_invitations(request: CreateInvitationRequest):
             detail=str(e)
         )
 
-@router.post("/verify", response_model=dict)
-async def verify_invitation(request: VerifyInvitationRequest):
+@router.post(
+    "/verify",
+    response_model=VerifyInvitationResponse,
+    response_model_exclude_unset=True,
+    dependencies=[Depends(rate_limit(verify_limiter))],
+)
+async def verify_invitation(request: VerifyInvitationRequest, http_request: Request):
     """
     Verify invitation code and get associated graduate information
     
-    - **invitation_code**: 6-digit invitation code
+    - **invitation_code**: Checksummed invitation code (legacy 6-digit codes are still accepted)
     
     Returns graduate information and guest name if valid code, otherwise returns error
+    
+    The response has an `ETag` that changes when the graduate is updated.
+    Verify is a read that uses POST only to keep the code out of URLs, so it
+    honours `If-None-Match` like a GET: a match returns `304 Not Modified`
+    without the body.
+    
+    Requests are rate limited per client address; over the limit the
+    response is `429 Too Many Requests` with `Retry-After`.
     """
-    # Verify invitation code
-    result = InvitationService.verify_invitation_code(request.invitation_code)
+    # Invitation and graduate come back together from one query (or the cache)
+    result = await InvitationService.verify_with_graduate(request.invitation_code)
     
     if not result:
         raise HTTPException(
@@ -71,45 +112,80 @@ async def verify_invitation(request: VerifyInvitationRequest):
             detail="Invalid invitation code"
         )
     
-    graduate_id = result["graduate_id"]
-    guest_name = result["guest_name"]
-    
-    # Get graduate information
-    graduate = GraduateService.get_graduate(graduate_id)
-    if not graduate:
+    if not result["graduate_info"]:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Graduate information not found"
         )
     
+    graduate_info = result["graduate_info"]
+    etag = invitation_etag(request.invitation_code, graduate_info.get("version", 0))
+    headers = validator_headers(etag, graduate_info.get("updated_at"), private=True)
+    if is_not_modified(http_request, etag):
+        return not_modified(headers)
+    
+    return model_response(_verify_result, result, headers)
+
+@router.get("/verify/stats", response_model=dict)
+async def get_verify_stats():
+    """
+    Get verify counters since process start
+    
+    `rejected_before_db` counts codes rejected without a database lookup
+    (malformed, forged, recently missed or never issued), broken down in
+    `short_circuited`; `cache` reports the verify cache hit ratio and
+    `admission` the rate limiter.
+    """
     return {
-        "graduate_id": graduate_id,
-        "guest_name": guest_name,
-        "graduate_info": graduate
+        **InvitationService.get_verify_stats(),
+        "admission": verify_limiter.stats(),
     }
 
-@router.get("", response_model=list)
-async def get_all_invitations(graduate_id: str = Query(None)):
+@router.get("", response_model=list[InvitationResponse], response_model_exclude_unset=True)
+async def get_all_invitations(
+    graduate_id: str = Query(None),
+    after: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None),
+    stream: bool = Query(False),
+):
     """
     Get all invitations
     
     - **graduate_id** (optional): Filter by graduate_id to get invitations for specific graduate
+    - **after** (optional): `_id` of the last invitation of the previous page
+    - **limit** (optional): Page size; when the page is full the next cursor
+      is returned in the `X-Next-Cursor` header
+    - **fields** (optional): Comma-separated fields to return (`_id` is always included)
+    - **stream** (optional): Stream the result as NDJSON, one invitation per line
     
     Examples:
     - GET /api/invitations - Get all invitations
     - GET /api/invitations?graduate_id=65a1b2c3d4e5f6g7h8i9j0k1 - Get invitations for specific graduate
+    - GET /api/invitations?limit=500&after=65a1b2c3d4e5f6g7h8i9j0k1 - Get the next page
+    - GET /api/invitations?stream=true - Stream all invitations as NDJSON
     """
     try:
+        field_list = parse_fields(fields)
+        if stream:
+            documents = InvitationService.iter_invitations(graduate_id, after, limit, field_list)
+            return StreamingResponse(to_ndjson(documents), media_type="application/x-ndjson")
+        
         if graduate_id:
             # Get invitations for specific graduate
-            invitations = InvitationService.get_invitations_by_graduate(graduate_id)
+            invitations = await InvitationService.get_invitations_by_graduate(
+                graduate_id, after, limit, field_list
+            )
         else:
             # Get all invitations
-            invitations = InvitationService.get_all_invitations()
-        
-        return invitations
+            invitations = await InvitationService.get_all_invitations(after, limit, field_list)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+    
+    headers = None
+    if limit and len(invitations) == limit:
+        headers = {NEXT_CURSOR_HEADER: str(invitations[-1]["_id"])}
+    return model_response(_invitation_list, invitations, headers)
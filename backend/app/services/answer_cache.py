@@ -0,0 +1,119 @@
+"""
+Per-graduate cache of chatbot answers
+
+Answers are keyed by graduate id, a hash of the event data the prompt was
+built from, and the normalized question. A graduate whose event data changes
+therefore never gets a stale answer, even before its entries are evicted.
+"""
+
+import difflib
+import hashlib
+import re
+import unicodedata
+from typing import Optional
+from app.config import settings
+from app.services.cache import LRUCache
+
+
+def normalize_question(text: str) -> str:
+    """Fold case, Vietnamese diacritics, punctuation and whitespace"""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def event_hash(event_data: str) -> str:
+    """Short stable hash of the event data a prompt is built from"""
+    return hashlib.sha1(event_data.encode()).hexdigest()[:16]
+
+
+def completion_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """Dollar cost of a completion at the configured per-1K-token prices"""
+    return (
+        prompt_tokens / 1000 * settings.chatbot_cost_per_1k_prompt_tokens
+        + completion_tokens / 1000 * settings.chatbot_cost_per_1k_completion_tokens
+    )
+
+
+class AnswerCache:
+    """Bounded TTL/LRU cache of chatbot answers with optional fuzzy lookup"""
+    
+    def __init__(
+        self,
+        max_entries: int = 5000,
+        ttl_seconds: float = 3600.0,
+        fuzzy_threshold: Optional[float] = None,
+    ):
+        self._cache = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.fuzzy_threshold = fuzzy_threshold
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.dollars_saved = 0.0
+    
+    def _find_similar(self, graduate_id: str, context_hash: str, question: str) -> Optional[tuple]:
+        best_key, best_ratio = None, self.fuzzy_threshold
+        for key in self._cache.keys_for_tag(graduate_id):
+            if key[1] != context_hash:
+                continue
+            matcher = difflib.SequenceMatcher(None, question, key[2])
+            if matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best_key, best_ratio = key, ratio
+        return best_key
+    
+    def get(self, graduate_id: str, context_hash: str, question: str) -> Optional[str]:
+        """Return a cached answer for the question, or None"""
+        normalized = normalize_question(question)
+        entry = self._cache.get((graduate_id, context_hash, normalized))
+        
+        if entry is None and self.fuzzy_threshold:
+            similar = self._find_similar(graduate_id, context_hash, normalized)
+            if similar is not None:
+                entry = self._cache.get(similar)
+                if entry is not None:
+                    self.fuzzy_hits += 1
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        answer, cost = entry
+        self.hits += 1
+        self.dollars_saved += cost
+        return answer
+    
+    def set(self, graduate_id: str, context_hash: str, question: str,
+            answer: str, cost: float = 0.0) -> None:
+        """Store an answer together with what it cost to generate"""
+        key = (graduate_id, context_hash, normalize_question(question))
+        self._cache.set(key, (answer, cost), tag=graduate_id)
+    
+    def invalidate_graduate(self, graduate_id: str) -> None:
+        """Drop every cached answer for a graduate"""
+        self._cache.invalidate_tag(graduate_id)
+    
+    def stats(self) -> dict:
+        """Get hit/miss counters and estimated savings"""
+        lookups = self.hits + self.misses
+        return {
+            "size": self._cache.stats()["size"],
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "dollars_saved": round(self.dollars_saved, 6),
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.chatbot_cache_max_entries,
+    ttl_seconds=settings.chatbot_cache_ttl_seconds,
+    fuzzy_threshold=(
+        settings.chatbot_cache_fuzzy_threshold if settings.chatbot_cache_fuzzy_match else None
+    ),
+)
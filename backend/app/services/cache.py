@@ -0,0 +1,101 @@
+"""
+Bounded in-process caches
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Size-bounded cache with per-entry TTL and least-recently-used eviction
+    
+    Entries can carry a tag (e.g. a graduate id) so every entry derived from
+    the same source document can be dropped at once when it changes. The
+    cache is per process; the TTL bounds how stale other workers can be.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._tags: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any, tag: Optional[Hashable] = None) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        if self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds, tag)
+        if tag is not None:
+            self._tags.setdefault(tag, set()).add(key)
+        
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def keys_for_tag(self, tag: Hashable) -> list:
+        """List the keys currently stored with the given tag"""
+        return list(self._tags.get(tag, ()))
+    
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single entry"""
+        if key in self._entries:
+            self._remove(key)
+    
+    def invalidate_tag(self, tag: Hashable) -> int:
+        """Drop every entry stored with the given tag"""
+        keys = self._tags.pop(tag, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        return len(keys)
+    
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
+        self._tags.clear()
+    
+    def _remove(self, key: Hashable) -> None:
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+    
+    def stats(self) -> dict:
+        """Get hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
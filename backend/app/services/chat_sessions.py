@@ -0,0 +1,202 @@
+"""
+Server-side chat sessions keyed by invitation code
+
+A session keeps a guest's recent question/answer turns so follow-up
+questions are sent with their context instead of being re-asked in full.
+History is bounded by a token budget: when a new turn pushes it over
+`chat_history_token_budget` or `chat_history_max_turns`, the oldest turns
+are folded into a short list of earlier questions, itself capped at
+`chat_summary_token_budget`. A prompt is therefore never larger than the
+system prompt, both budgets and the question.
+
+Sessions live in a per-process LRU that expires them after
+`chat_session_ttl_seconds` of inactivity. With `chat_sessions_persist` they
+are also written to the `chat_sessions` collection, whose TTL index expires
+them the same way, so other workers and restarts continue the conversation.
+"""
+
+from datetime import datetime, timezone
+from app.config import settings
+from app.database import mongo_db
+from app.services.cache import LRUCache
+
+# Earlier questions are kept only as a reminder of what was asked
+EARLIER_QUESTION_MAX_CHARS = 200
+EARLIER_QUESTIONS_PREFIX = "Các câu hỏi trước đó của khách: "
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class ChatSession:
+    """Compact conversation state and token accounting of one guest"""
+    
+    __slots__ = (
+        "invitation_code", "graduate_id", "context_hash", "turns", "earlier",
+        "requests", "llm_requests", "prompt_tokens", "completion_tokens",
+    )
+    
+    def __init__(self, invitation_code: str, graduate_id: str, context_hash: str):
+        self.invitation_code = invitation_code
+        self.graduate_id = graduate_id
+        self.context_hash = context_hash
+        # (question, answer) pairs, oldest first
+        self.turns: list = []
+        self.earlier: list = []
+        self.requests = 0
+        self.llm_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+    
+    @property
+    def has_history(self) -> bool:
+        return bool(self.turns or self.earlier)
+    
+    def history_messages(self) -> list:
+        """Chat messages carrying the conversation so far"""
+        messages = []
+        if self.earlier:
+            messages.append({"role": "system", "content": EARLIER_QUESTIONS_PREFIX + "; ".join(self.earlier)})
+        for question, answer in self.turns:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+    
+    def add_turn(self, question: str, answer: str) -> None:
+        """Append a turn and compact the history back into its budget"""
+        self.turns.append((question, answer))
+        self.requests += 1
+        self._compact()
+    
+    def record_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        """Count the tokens of one completion made for this session"""
+        self.llm_requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+    
+    def reset_history(self, context_hash: str) -> None:
+        """Forget the conversation (e.g. the event details changed); usage is kept"""
+        self.context_hash = context_hash
+        self.turns = []
+        self.earlier = []
+    
+    def _compact(self) -> None:
+        tokens = sum(estimate_tokens(question) + estimate_tokens(answer) for question, answer in self.turns)
+        while self.turns and (
+            len(self.turns) > settings.chat_history_max_turns
+            or tokens > settings.chat_history_token_budget
+        ):
+            question, answer = self.turns.pop(0)
+            tokens -= estimate_tokens(question) + estimate_tokens(answer)
+            self.earlier.append(question[:EARLIER_QUESTION_MAX_CHARS])
+        
+        earlier_tokens = sum(estimate_tokens(question) for question in self.earlier)
+        while self.earlier and earlier_tokens > settings.chat_summary_token_budget:
+            earlier_tokens -= estimate_tokens(self.earlier.pop(0))
+    
+    def usage(self) -> dict:
+        """Token accounting since the session started"""
+        return {
+            "requests": self.requests,
+            "llm_requests": self.llm_requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "history_turns": len(self.turns),
+        }
+    
+    def to_document(self) -> dict:
+        return {
+            "_id": self.invitation_code,
+            "graduate_id": self.graduate_id,
+            "context_hash": self.context_hash,
+            "turns": [list(turn) for turn in self.turns],
+            "earlier": self.earlier,
+            "requests": self.requests,
+            "llm_requests": self.llm_requests,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "updated_at": datetime.now(timezone.utc),
+        }
+    
+    @classmethod
+    def from_document(cls, document: dict) -> "ChatSession":
+        session = cls(document["_id"], document["graduate_id"], document.get("context_hash", ""))
+        session.turns = [tuple(turn) for turn in document.get("turns", [])]
+        session.earlier = list(document.get("earlier", []))
+        session.requests = document.get("requests", 0)
+        session.llm_requests = document.get("llm_requests", 0)
+        session.prompt_tokens = document.get("prompt_tokens", 0)
+        session.completion_tokens = document.get("completion_tokens", 0)
+        return session
+
+
+class ChatSessionStore:
+    """Per-process LRU of chat sessions, optionally backed by MongoDB"""
+    
+    def __init__(self):
+        self._sessions = LRUCache(
+            max_entries=settings.chat_session_max_entries,
+            ttl_seconds=settings.chat_session_ttl_seconds,
+        )
+        self.loaded = 0
+        self.resets = 0
+    
+    async def get(self, invitation_code: str, graduate_id: str, context_hash: str) -> ChatSession:
+        """
+        Get the guest's session, starting a new one if none is stored
+        
+        History built on other event details (context_hash) is dropped,
+        since its answers may no longer be true.
+        """
+        session = self._sessions.get(invitation_code)
+        if session is None and settings.chat_sessions_persist:
+            try:
+                document = await mongo_db.get_chat_sessions_collection().find_one({"_id": invitation_code})
+            except Exception as e:
+                print(f"Error loading chat session: {e}")
+                document = None
+            if document:
+                session = ChatSession.from_document(document)
+                self.loaded += 1
+        
+        if session is None or session.graduate_id != graduate_id:
+            session = ChatSession(invitation_code, graduate_id, context_hash)
+        elif session.context_hash != context_hash:
+            session.reset_history(context_hash)
+            self.resets += 1
+        
+        self._sessions.set(invitation_code, session, tag=graduate_id)
+        return session
+    
+    async def save(self, session: ChatSession) -> None:
+        """Keep the session alive and persist it when enabled"""
+        self._sessions.set(session.invitation_code, session, tag=session.graduate_id)
+        if not settings.chat_sessions_persist:
+            return
+        try:
+            await mongo_db.get_chat_sessions_collection().replace_one(
+                {"_id": session.invitation_code},
+                session.to_document(),
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Error saving chat session: {e}")
+    
+    def invalidate_graduate(self, graduate_id: str) -> int:
+        """Drop the in-memory sessions of a graduate's guests"""
+        return self._sessions.invalidate_tag(graduate_id)
+    
+    def stats(self) -> dict:
+        """Get session cache counters"""
+        return {
+            **self._sessions.stats(),
+            "loaded": self.loaded,
+            "resets": self.resets,
+            "persisted": settings.chat_sessions_persist,
+        }
+
+
+# Singleton instance
+chat_sessions = ChatSessionStore()
@@ -1,66 +1,185 @@
-from openai import AzureOpenAI
-from app.config import settings
-from typing import Optional
+from app.config import SubsystemNotConfiguredError, settings
+from app.metrics import LLM_TOKENS
+from app.services.answer_cache import answer_cache, completion_cost
+from app.services.chat_sessions import ChatSession
+from app.services.intent_answerer import intent_answerer
+from app.services.llm_client import LLMUnavailableError, get_llm_client
+from app.services.prompt_cache import prompt_cache
+from app.services.token_budget import TIER_ECONOMY, TIER_LOCAL, token_budget
+from typing import AsyncIterator, Optional
+
+ERROR_MESSAGE = "Xin lỗi, có lỗi xảy ra khi xử lý yêu cầu của bạn."
 
 class ChatbotService:
     """Service for chatbot interactions using Azure OpenAI GPT"""
     
-    def __init__(self):
-        self.client = AzureOpenAI(
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version,
-            azure_endpoint=settings.azure_openai_endpoint
-        )
-        self.model = settings.azure_openai_deployment_name
+    @property
+    def llm(self):
+        """Shared LLM client, created (and the openai SDK imported) on first use"""
+        return get_llm_client()
     
-    def generate_response(self, graduate_info: dict, user_message: str) -> str:
-        """Generate chatbot response based on graduate info and user message"""
+    def _build_messages(self, graduate_info: dict, user_message: str,
+                        session: Optional[ChatSession] = None) -> list:
+        """
+        Build the chat messages for a question, after the session's history
         
-        # Prepare graduate info context
-        graduate_context = self._prepare_graduate_context(graduate_info)
+        The graduate's compiled system prompt comes first and only the
+        question varies, so consecutive requests share their prefix.
+        """
+        system_prompt = prompt_cache.get(graduate_info).system_prompt
+        history = session.history_messages() if session else []
+        return [
+            {"role": "system", "content": system_prompt},
+            *history,
+            {"role": "user", "content": user_message}
+        ]
+    
+    def event_hash(self, graduate_info: dict) -> str:
+        """Hash of the event data the prompt is built from, for answer caching and sessions"""
+        return prompt_cache.get(graduate_info).context_hash
+    
+    def _answer_without_llm(self, graduate_info: dict, user_message: str,
+                            context_hash: str, session: Optional[ChatSession]) -> Optional[str]:
+        """
+        Answer from the graduate document or the answer cache
         
-        # System prompt to ensure chatbot only answers about the graduate's event
-        system_prompt = f"""Bạn là một trợ lý thông tin về lễ tốt nghiệp của {graduate_info['name']}.
+        Cached answers were given without context, so they are only used for
+        the first question of a session.
+        """
+        if settings.chatbot_local_answers:
+            local = intent_answerer.answer(graduate_info, user_message)
+            if local is not None:
+                return local
         
-Thông tin sự kiện:
-{graduate_context}
-
-Bạn chỉ được trả lời các câu hỏi về lễ tốt nghiệp này. Nếu người dùng hỏi về thứ gì khác, 
-hãy lịch sự từ chối và yêu cầu họ hỏi về lễ tốt nghiệp.
-
-Hãy trả lời bằng tiếng Việt một cách thân thiện và chuyên nghiệp."""
+        if session is None or not session.has_history:
+            return answer_cache.get(str(graduate_info.get("_id")), context_hash, user_message)
+        return None
+    
+    @staticmethod
+    def _fallback(graduate_info: dict, user_message: str, session: Optional[ChatSession]) -> str:
+        """Local answer used instead of the LLM, recorded on the session like any other"""
+        answer = intent_answerer.fallback(graduate_info)
+        if session:
+            session.add_turn(user_message, answer)
+        return answer
+    
+    async def generate_response(self, graduate_info: dict, user_message: str,
+                                session: Optional[ChatSession] = None) -> str:
+        """
+        Generate chatbot response based on graduate info and user message
+        
+        With a session, its history is sent along and the turn and its token
+        usage are recorded on it; the caller saves the session.
+        """
+        context_hash = self.event_hash(graduate_info)
+        answer = self._answer_without_llm(graduate_info, user_message, context_hash, session)
+        if answer is not None:
+            if session:
+                session.add_turn(user_message, answer)
+            return answer
+        
+        graduate_id = str(graduate_info.get("_id"))
+        tier = token_budget.tier_for(graduate_id)
+        if tier == TIER_LOCAL:
+            return self._fallback(graduate_info, user_message, session)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ]
+            response = await self.llm.complete(
+                self._build_messages(graduate_info, user_message, session),
+                graduate_id=graduate_id,
+                model=self._deployment(tier)
             )
             
-            return response.choices[0].message.content
+            answer = response.choices[0].message.content
+        
+        except (LLMUnavailableError, SubsystemNotConfiguredError) as e:
+            print(f"LLM unavailable, answering locally: {e}")
+            return self._fallback(graduate_info, user_message, session)
         
         except Exception as e:
             print(f"Error calling OpenAI API: {e}")
-            return "Xin lỗi, có lỗi xảy ra khi xử lý yêu cầu của bạn."
+            return ERROR_MESSAGE
+        
+        cost = 0.0
+        if response.usage:
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            await self._record_usage(
+                graduate_id, response.usage.prompt_tokens, response.usage.completion_tokens, "usage", session,
+                cached_prompt_tokens=getattr(details, "cached_tokens", None) or 0
+            )
+            cost = completion_cost(response.usage.prompt_tokens, response.usage.completion_tokens)
+        if session is None or not session.has_history:
+            answer_cache.set(graduate_id, context_hash, user_message, answer, cost)
+        if session:
+            session.add_turn(user_message, answer)
+        return answer
     
-    @staticmethod
-    def _prepare_graduate_context(graduate_info: dict) -> str:
-        """Prepare graduate info as context for chatbot"""
+    async def stream_response(self, graduate_info: dict, user_message: str,
+                              session: Optional[ChatSession] = None) -> AsyncIterator[str]:
+        """
+        Stream the chatbot response as text deltas while the model generates it
         
-        venue = graduate_info.get("venue", {})
-        graduation_datetime = graduate_info.get("graduation_datetime", "")
+        Local and cached answers are yielded in one piece, as is the local
+        fallback when the LLM is saturated, not configured or over its token
+        budget. Closing the generator (e.g. when
+        the client disconnects) closes the upstream HTTP response, which
+        cancels the completion; only completed answers are cached.
+        """
+        context_hash = self.event_hash(graduate_info)
+        answer = self._answer_without_llm(graduate_info, user_message, context_hash, session)
+        if answer is not None:
+            if session:
+                session.add_turn(user_message, answer)
+            yield answer
+            return
         
-        context = f"""
-- Người tốt nghiệp: {graduate_info.get('name', 'N/A')}
-- Bằng cấp: {graduate_info.get('degree', 'N/A')}
-- Ngành: {graduate_info.get('department', 'N/A')}
-- Thời gian: {graduation_datetime}
-- Địa điểm: {venue.get('name', 'N/A')}
-- Địa chỉ: {venue.get('address', 'N/A')}
-- Chỗ đậu xe: {venue.get('parking', 'N/A') or 'Chưa cập nhật'}
-- Email liên hệ: {graduate_info.get('contact', {}).get('email', 'N/A')}
-- Điện thoại: {graduate_info.get('contact', {}).get('phone', 'N/A')}
-"""
-        return context
+        graduate_id = str(graduate_info.get("_id"))
+        tier = token_budget.tier_for(graduate_id)
+        if tier == TIER_LOCAL:
+            yield self._fallback(graduate_info, user_message, session)
+            return
+        
+        messages = self._build_messages(graduate_info, user_message, session)
+        deltas = None
+        
+        parts = []
+        try:
+            deltas = self.llm.stream(messages, graduate_id=graduate_id, model=self._deployment(tier))
+            async for delta in deltas:
+                parts.append(delta)
+                yield delta
+        except (LLMUnavailableError, SubsystemNotConfiguredError) as e:
+            # Nothing was sent yet, so the guest can still get a local answer
+            print(f"LLM unavailable, answering locally: {e}")
+            yield self._fallback(graduate_info, user_message, session)
+            return
+        finally:
+            if deltas is not None:
+                await deltas.aclose()
+        
+        # Streamed completions carry no usage; estimate ~4 characters per token
+        answer = "".join(parts)
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        await self._record_usage(graduate_id, prompt_chars // 4, len(answer) // 4, "estimate", session)
+        cost = completion_cost(prompt_chars // 4, len(answer) // 4)
+        if session is None or not session.has_history:
+            answer_cache.set(graduate_id, context_hash, user_message, answer, cost)
+        if session:
+            session.add_turn(user_message, answer)
+    
+    @staticmethod
+    def _deployment(tier: str) -> Optional[str]:
+        """Deployment of a budget tier; None uses the client's default"""
+        return settings.azure_openai_economy_deployment_name if tier == TIER_ECONOMY else None
+    
+    @staticmethod
+    async def _record_usage(graduate_id: str, prompt_tokens: int, completion_tokens: int, source: str,
+                            session: Optional[ChatSession] = None, cached_prompt_tokens: int = 0) -> None:
+        """Add a completion's tokens to the llm_tokens_total metric, the daily budget and the session"""
+        LLM_TOKENS.labels("prompt", source).inc(prompt_tokens)
+        LLM_TOKENS.labels("completion", source).inc(completion_tokens)
+        if cached_prompt_tokens:
+            LLM_TOKENS.labels("cached_prompt", source).inc(cached_prompt_tokens)
+        await token_budget.record(graduate_id, prompt_tokens, completion_tokens, cached_prompt_tokens)
+        if session:
+            session.record_usage(prompt_tokens, completion_tokens)
@@ -0,0 +1,323 @@
+"""
+Background deletion of graduates and everything they own
+
+A cleanup job removes one graduate (delete) or every graduate older than a
+date (season purge), optionally archiving the documents first. For each
+graduate it releases its photos, deletes the `{graduate_id}/` blob prefix
+in concurrent batches, removes its invitations with `delete_many` and
+finally the graduate itself.
+
+Archiving keeps the documents only: photos and derivatives are deleted
+like for any other graduate, and the archived graduate records when its
+media was purged (`media_purged_at`), so its `photo_urls` and
+`photo_derivatives` are known to point at blobs that no longer exist.
+
+Job state lives in the `cleanup_jobs` collection and every step is safe
+to repeat, so an interrupted job resumes where it stopped: graduates
+already finished are skipped and a half-cleaned graduate is simply
+cleaned again.
+"""
+
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from app.config import settings
+from app.database import mongo_db
+from app.services.answer_cache import answer_cache
+from app.services.chat_sessions import chat_sessions
+from app.services.invitation_service import InvitationService
+from app.services.prompt_cache import prompt_cache
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_INTERRUPTED = "interrupted"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+KIND_GRADUATE = "graduate"
+KIND_SEASON = "season"
+
+# Invitations copied to the archive per bulk write
+ARCHIVE_BATCH_SIZE = 1000
+
+
+class JobRunningError(Exception):
+    """Raised when resuming a job this process is already running"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class CleanupService:
+    """Runs graduate delete and season purge jobs in the background"""
+    
+    def __init__(self):
+        self._tasks: dict = {}
+    
+    async def start_graduate_delete(self, graduate_id: str, archive: bool = False) -> dict:
+        """Start a job deleting one graduate"""
+        return await self._create_job(KIND_GRADUATE, [graduate_id], archive)
+    
+    async def start_season_purge(self, before: datetime, archive: bool = True) -> dict:
+        """Start a job removing every graduate with graduation_datetime before `before`"""
+        collection = mongo_db.get_graduates_collection()
+        cursor = collection.find(self.season_filter(before), {"_id": 1})
+        graduate_ids = [str(doc["_id"]) async for doc in cursor]
+        return await self._create_job(KIND_SEASON, graduate_ids, archive, before)
+    
+    @staticmethod
+    def season_filter(before: datetime) -> dict:
+        """Filter of the graduates a season purge removes"""
+        return {"graduation_datetime": {"$lt": before}}
+    
+    async def _create_job(
+        self,
+        kind: str,
+        graduate_ids: list,
+        archive: bool,
+        before: Optional[datetime] = None,
+    ) -> dict:
+        now = _now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "kind": kind,
+            "archive": archive,
+            "before": before,
+            "graduate_ids": graduate_ids,
+            "done_ids": [],
+            "status": JOB_QUEUED,
+            "progress": {
+                "graduates_total": len(graduate_ids),
+                "graduates_done": 0,
+                "photos_released": 0,
+                "blobs_deleted": 0,
+                "invitations_deleted": 0,
+            },
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await mongo_db.get_cleanup_jobs_collection().insert_one(job)
+        self._spawn(job["_id"])
+        return self._public(job)
+    
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """Get job status and progress"""
+        job = await mongo_db.get_cleanup_jobs_collection().find_one(
+            {"_id": job_id}, {"graduate_ids": 0, "done_ids": 0}
+        )
+        return self._public(job) if job else None
+    
+    async def resume(self, job_id: str) -> Optional[dict]:
+        """
+        Restart an unfinished job
+        
+        Also takes over jobs left "running" by a process that crashed.
+        
+        Raises:
+            JobRunningError: If this process is still running the job
+        """
+        if job_id in self._tasks:
+            raise JobRunningError(f"Job {job_id} is already running")
+        
+        job = await mongo_db.get_cleanup_jobs_collection().find_one_and_update(
+            {"_id": job_id, "status": {"$ne": JOB_DONE}},
+            {"$set": {"status": JOB_RUNNING, "updated_at": _now()}},
+            projection={"graduate_ids": 0, "done_ids": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            return await self.get_job(job_id)
+        self._spawn(job_id)
+        return self._public(job)
+    
+    async def resume_pending(self) -> int:
+        """Restart jobs that were queued or interrupted by a shutdown"""
+        collection = mongo_db.get_cleanup_jobs_collection()
+        resumed = 0
+        while True:
+            # Claimed atomically, so each job restarts in only one worker
+            job = await collection.find_one_and_update(
+                self.pending_filter(list(self._tasks)),
+                {"$set": {"status": JOB_RUNNING, "updated_at": _now()}},
+                projection={"_id": 1},
+            )
+            if job is None:
+                return resumed
+            self._spawn(job["_id"])
+            resumed += 1
+    
+    @staticmethod
+    def pending_filter(running: list) -> dict:
+        """Filter of jobs to resume, leaving out those this process runs"""
+        return {"status": {"$in": [JOB_QUEUED, JOB_INTERRUPTED]}, "_id": {"$nin": running}}
+    
+    def _spawn(self, job_id: str) -> None:
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id))
+    
+    async def _run(self, job_id: str) -> None:
+        jobs = mongo_db.get_cleanup_jobs_collection()
+        try:
+            job = await jobs.find_one_and_update(
+                {"_id": job_id},
+                {"$set": {"status": JOB_RUNNING, "error": None, "updated_at": _now()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            done = set(job["done_ids"])
+            pending = [graduate_id for graduate_id in job["graduate_ids"] if graduate_id not in done]
+            semaphore = asyncio.Semaphore(settings.cleanup_concurrency)
+            
+            async def clean(graduate_id: str) -> None:
+                async with semaphore:
+                    counts = await self._cleanup_graduate(graduate_id, job["archive"])
+                    await jobs.update_one(
+                        {"_id": job_id},
+                        {
+                            "$addToSet": {"done_ids": graduate_id},
+                            "$inc": {
+                                "progress.graduates_done": 1,
+                                **{f"progress.{key}": value for key, value in counts.items()},
+                            },
+                            "$set": {"updated_at": _now()},
+                        },
+                    )
+            
+            results = await asyncio.gather(
+                *(clean(graduate_id) for graduate_id in pending), return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                print(f"Cleanup job {job_id} failed for {len(errors)} graduates: {errors[0]}")
+                update = {"status": JOB_FAILED, "error": f"{len(errors)} graduates failed: {errors[0]}"}
+            else:
+                update = {"status": JOB_DONE}
+            update["updated_at"] = _now()
+            await jobs.update_one({"_id": job_id}, {"$set": update})
+        except asyncio.CancelledError:
+            # Shutdown: leave the job to be resumed on the next startup
+            await asyncio.shield(jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": JOB_INTERRUPTED, "updated_at": _now()}},
+            ))
+            raise
+        except Exception as e:
+            print(f"Error running cleanup job {job_id}: {e}")
+            await jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": JOB_FAILED, "error": str(e), "updated_at": _now()}},
+            )
+        finally:
+            self._tasks.pop(job_id, None)
+    
+    async def _cleanup_graduate(self, graduate_id: str, archive: bool) -> dict:
+        """Remove one graduate and what it owns; safe to repeat after a failure"""
+        # Imported here to avoid loading a storage backend at import time
+        from app.services.storage_service import get_storage_service
+        
+        graduates = mongo_db.get_graduates_collection()
+        invitations = mongo_db.get_invitations_collection()
+        query = {"_id": ObjectId(graduate_id)}
+        counts = {"photos_released": 0, "blobs_deleted": 0, "invitations_deleted": 0}
+        
+        try:
+            storage = get_storage_service()
+        except ValueError:
+            # Storage was never configured, so there are no blobs to remove
+            storage = None
+        
+        graduate = await graduates.find_one(query)
+        if graduate is not None:
+            if archive:
+                # First copy wins, so a resumed job keeps the complete record
+                await mongo_db.get_graduates_archive_collection().update_one(
+                    query,
+                    {"$setOnInsert": {**graduate, "archived_at": _now()}},
+                    upsert=True,
+                )
+            
+            if storage is not None:
+                async def release(photo_url: str) -> int:
+                    # Pull before releasing: a resumed job must never drop a
+                    # shared content blob's reference twice
+                    result = await graduates.update_one(
+                        {**query, "photo_urls": photo_url},
+                        {"$pull": {"photo_urls": photo_url}},
+                    )
+                    if result.modified_count and await storage.delete_file(photo_url):
+                        return 1
+                    return 0
+                
+                released = await asyncio.gather(
+                    *(release(url) for url in graduate.get("photo_urls") or [])
+                )
+                counts["photos_released"] = sum(released)
+        
+        if storage is not None:
+            counts["blobs_deleted"] = await storage.delete_prefix(f"{graduate_id}/")
+        
+        if archive:
+            await mongo_db.get_graduates_archive_collection().update_one(
+                query, {"$set": {"media_purged_at": _now()}}
+            )
+            await self._archive_invitations(graduate_id)
+        result = await invitations.delete_many({"graduate_id": graduate_id})
+        counts["invitations_deleted"] = result.deleted_count
+        
+        await graduates.delete_one(query)
+        InvitationService.invalidate_graduate(graduate_id)
+        answer_cache.invalidate_graduate(graduate_id)
+        chat_sessions.invalidate_graduate(graduate_id)
+        prompt_cache.invalidate_graduate(graduate_id)
+        return counts
+    
+    @staticmethod
+    async def _archive_invitations(graduate_id: str) -> None:
+        """Copy a graduate's invitations to the archive in bulk"""
+        archive = mongo_db.get_invitations_archive_collection()
+        archived_at = _now()
+        batch = []
+        async for invitation in mongo_db.get_invitations_collection().find({"graduate_id": graduate_id}):
+            invitation["archived_at"] = archived_at
+            batch.append(UpdateOne({"_id": invitation["_id"]}, {"$setOnInsert": invitation}, upsert=True))
+            if len(batch) == ARCHIVE_BATCH_SIZE:
+                await archive.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await archive.bulk_write(batch, ordered=False)
+    
+    @staticmethod
+    def _public(job: dict) -> dict:
+        result = {key: value for key, value in job.items() if key not in ("_id", "graduate_ids", "done_ids")}
+        return {"job_id": job["_id"], **result}
+    
+    async def close(self) -> None:
+        """Stop running jobs; they are marked interrupted and resume on startup"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Singleton instance
+_cleanup_service: Optional[CleanupService] = None
+
+def get_cleanup_service() -> CleanupService:
+    """Get or create the cleanup service"""
+    global _cleanup_service
+    
+    if _cleanup_service is None:
+        _cleanup_service = CleanupService()
+    
+    return _cleanup_service
+
+async def close_cleanup_service() -> None:
+    """Stop cleanup jobs if the service was created"""
+    global _cleanup_service
+    
+    if _cleanup_service is not None:
+        await _cleanup_service.close()
+        _cleanup_service = None
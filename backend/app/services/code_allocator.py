@@ -0,0 +1,313 @@
+"""
+Collision-free invitation code allocator
+
+Codes are produced by running a persistent counter through a keyed
+permutation of the code space, so every counter value maps to a distinct
+code and no database probe is needed to find a free one. Each code carries
+a short keyed MAC so forged or mistyped codes can be rejected in-process.
+
+Each reservation is also listed in the counter document as in flight until
+the caller releases it after inserting its codes, so readers can tell which
+counter values already have their invitations written.
+"""
+
+import hashlib
+import hmac
+import time
+from typing import Optional
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database import mongo_db
+
+FEISTEL_ROUNDS = 4
+
+# Reservations not released after this long are assumed abandoned (the
+# worker died mid-insert) and no longer hold back the inserted bound
+IN_FLIGHT_TIMEOUT_SECONDS = 600
+
+# Codes issued before the checksummed format: 6 random digits
+LEGACY_CODE_LENGTH = 6
+
+# Results of InvitationCodeAllocator.check
+CODE_VALID = "valid"
+CODE_LEGACY = "legacy"
+CODE_MALFORMED = "malformed"
+CODE_FORGED = "forged"
+
+
+class KeyedPermutation:
+    """
+    Keyed bijection over range(domain_size)
+    
+    A balanced Feistel network with a keyed BLAKE2 round function permutes the
+    smallest even-bit power of two covering the domain; out-of-range outputs
+    are walked through the network again (cycle walking) until they land
+    inside the domain, which keeps the mapping a bijection.
+    """
+    
+    def __init__(self, domain_size: int, key: bytes):
+        if domain_size < 2:
+            raise ValueError("Code space must contain at least two codes")
+        
+        self.domain_size = domain_size
+        self.key = hashlib.sha256(key).digest()
+        
+        bits = max(2, (domain_size - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+    
+    def _round(self, round_index: int, value: int) -> int:
+        message = round_index.to_bytes(1, "big") + value.to_bytes(8, "big")
+        digest = hashlib.blake2b(message, key=self.key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") & self.half_mask
+    
+    def _encrypt(self, value: int) -> int:
+        left = value >> self.half_bits
+        right = value & self.half_mask
+        for round_index in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(round_index, right)
+        return (left << self.half_bits) | right
+    
+    def _decrypt(self, value: int) -> int:
+        left = value >> self.half_bits
+        right = value & self.half_mask
+        for round_index in reversed(range(FEISTEL_ROUNDS)):
+            left, right = right ^ self._round(round_index, left), left
+        return (left << self.half_bits) | right
+    
+    def permute(self, value: int) -> int:
+        """Map value in range(domain_size) to its permuted position"""
+        if not 0 <= value < self.domain_size:
+            raise ValueError("Value outside of code space")
+        
+        value = self._encrypt(value)
+        while value >= self.domain_size:
+            value = self._encrypt(value)
+        return value
+    
+    def invert(self, value: int) -> int:
+        """Map a permuted position back to its value in range(domain_size)"""
+        if not 0 <= value < self.domain_size:
+            raise ValueError("Value outside of code space")
+        
+        value = self._decrypt(value)
+        while value >= self.domain_size:
+            value = self._decrypt(value)
+        return value
+
+
+class InvitationCodeAllocator:
+    """Allocate unique invitation codes from a shared Mongo counter"""
+    
+    def __init__(
+        self,
+        length: int = 6,
+        alphabet: str = "0123456789",
+        secret: str = "",
+        mac_length: int = 2,
+        accept_legacy: bool = True,
+    ):
+        if len(set(alphabet)) != len(alphabet) or len(alphabet) < 2:
+            raise ValueError("Code alphabet must have at least two distinct characters")
+        
+        self.length = length
+        self.alphabet = alphabet
+        self.space_size = len(alphabet) ** length
+        self.permutation = KeyedPermutation(self.space_size, secret.encode())
+        self.mac_length = mac_length
+        self.mac_key = hashlib.sha256(b"invitation-code-mac:" + secret.encode()).digest()
+        self.accept_legacy = accept_legacy
+        # Each length/alphabet combination is a separate code space
+        self.counter_id = f"invitation_code:{len(alphabet)}^{length}"
+        # Highest counter value seen, counter values below which every
+        # reservation was released, and when the counter was last read
+        self._reserved = 0
+        self._inserted = 0
+        self._reserved_read_at: Optional[float] = None
+    
+    def encode(self, index: int, length: Optional[int] = None) -> str:
+        """Turn a permuted index into a fixed-length code"""
+        base = len(self.alphabet)
+        chars = []
+        for _ in range(length or self.length):
+            index, digit = divmod(index, base)
+            chars.append(self.alphabet[digit])
+        return "".join(reversed(chars))
+    
+    def decode(self, code: str) -> int:
+        """Turn a code body back into its permuted index"""
+        base = len(self.alphabet)
+        index = 0
+        for char in code:
+            index = index * base + self.alphabet.index(char)
+        return index
+    
+    def counter_index(self, code: str) -> Optional[int]:
+        """
+        Counter value a code was (or would be) allocated from
+        
+        Returns:
+            The counter value, or None for legacy and invalid codes
+        """
+        if self.check(code) != CODE_VALID:
+            return None
+        return self.permutation.invert(self.decode(code[:self.length]))
+    
+    @property
+    def known_inserted(self) -> int:
+        """Counter values known to have their inserts finished, without a database read"""
+        return self._inserted
+    
+    async def _read_counter(self, max_age: float) -> None:
+        """Read the counter again when the last read is older than max_age seconds"""
+        now = time.monotonic()
+        if self._reserved_read_at is not None and now - self._reserved_read_at < max_age:
+            return
+        collection = mongo_db.get_counters_collection()
+        counter = await collection.find_one({"_id": self.counter_id}) or {}
+        value = counter.get("value", 0)
+        abandoned_before = time.time() - IN_FLIGHT_TIMEOUT_SECONDS
+        in_flight = [
+            entry["start"] for entry in counter.get("in_flight", [])
+            if entry["reserved_at"] >= abandoned_before
+        ]
+        self._reserved = max(self._reserved, value)
+        self._inserted = max(self._inserted, min(in_flight, default=value))
+        self._reserved_read_at = now
+    
+    async def reserved_count(self, max_age: float = 0.0) -> int:
+        """
+        Number of counter values reserved by any worker
+        
+        The counter is read again when the last read is older than max_age
+        seconds; otherwise the last known value is returned.
+        """
+        await self._read_counter(max_age)
+        return self._reserved
+    
+    async def inserted_count(self, max_age: float = 0.0) -> int:
+        """
+        Counter values below which every reservation has been released
+        
+        Codes allocated from these values were inserted (or failed) by the
+        time of the read; later ones may still be in flight.
+        """
+        await self._read_counter(max_age)
+        return self._inserted
+    
+    def _mac(self, body: str) -> str:
+        if not self.mac_length:
+            return ""
+        digest = hashlib.blake2b(body.encode(), key=self.mac_key, digest_size=8).digest()
+        value = int.from_bytes(digest, "big") % (len(self.alphabet) ** self.mac_length)
+        return self.encode(value, self.mac_length)
+    
+    def sign(self, body: str) -> str:
+        """Append the check characters to a code body"""
+        return body + self._mac(body)
+    
+    def check(self, code: str) -> str:
+        """
+        Classify a submitted code without touching the database
+        
+        Returns:
+            CODE_VALID or CODE_LEGACY if the code is worth looking up,
+            CODE_MALFORMED or CODE_FORGED if it can be rejected outright
+        """
+        if len(code) == self.length + self.mac_length and all(
+            char in self.alphabet for char in code
+        ):
+            body = code[:self.length]
+            if hmac.compare_digest(self._mac(body), code[self.length:]):
+                return CODE_VALID
+            if not (self.accept_legacy and len(code) == LEGACY_CODE_LENGTH):
+                return CODE_FORGED
+        
+        if (
+            self.accept_legacy
+            and len(code) == LEGACY_CODE_LENGTH
+            and code.isascii()
+            and code.isdigit()
+        ):
+            return CODE_LEGACY
+        
+        return CODE_MALFORMED
+    
+    async def reserve(self, count: int) -> int:
+        """
+        Atomically reserve `count` counter values and list them as in flight
+        
+        Returns:
+            First reserved counter value, to be passed to release()
+        """
+        collection = mongo_db.get_counters_collection()
+        counter = await collection.find_one_and_update(
+            {"_id": self.counter_id},
+            # One pipeline stage, so both fields see the value before the update
+            [{"$set": {
+                "value": {"$add": [{"$ifNull": ["$value", 0]}, count]},
+                "in_flight": {"$concatArrays": [
+                    {"$ifNull": ["$in_flight", []]},
+                    [{"start": {"$ifNull": ["$value", 0]}, "reserved_at": time.time()}],
+                ]},
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        end = counter["value"]
+        self._reserved = max(self._reserved, end)
+        if end > self.space_size:
+            await self.release(end - count)
+            raise ValueError("Invitation code space exhausted")
+        return end - count
+    
+    async def release(self, start: int) -> None:
+        """Mark the reservation starting at `start` as no longer in flight, dropping abandoned ones"""
+        collection = mongo_db.get_counters_collection()
+        abandoned_before = time.time() - IN_FLIGHT_TIMEOUT_SECONDS
+        await collection.update_one(
+            {"_id": self.counter_id},
+            {"$pull": {"in_flight": {"$or": [
+                {"start": start},
+                {"reserved_at": {"$lt": abandoned_before}},
+            ]}}},
+        )
+    
+    async def release_codes(self, codes: list) -> None:
+        """Release the reservation a batch returned by allocate() came from"""
+        if codes:
+            await self.release(self.counter_index(codes[0]))
+    
+    async def allocate(self, count: int) -> list:
+        """
+        Allocate `count` unique codes with a single counter update
+        
+        The caller releases them with release_codes() once they are inserted.
+        """
+        if count <= 0:
+            return []
+        
+        start = await self.reserve(count)
+        return [
+            self.sign(self.encode(self.permutation.permute(index)))
+            for index in range(start, start + count)
+        ]
+
+
+# Singleton instance
+_code_allocator: Optional[InvitationCodeAllocator] = None
+
+def get_code_allocator() -> InvitationCodeAllocator:
+    """Get or create code allocator instance"""
+    global _code_allocator
+    
+    if _code_allocator is None:
+        _code_allocator = InvitationCodeAllocator(
+            length=settings.invitation_code_length,
+            alphabet=settings.invitation_code_alphabet,
+            secret=settings.invitation_code_secret or settings.secret_key,
+            mac_length=settings.invitation_code_mac_length,
+            accept_legacy=settings.invitation_code_accept_legacy,
+        )
+    
+    return _code_allocator
@@ -1,15 +1,26 @@
 import random
 import string
-from typing import Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
 from bson import ObjectId
 from app.database import mongo_db
 from app.models.schemas import CreateGraduateRequest, GraduateResponse
+from app.services.answer_cache import answer_cache
+from app.services.invitation_service import InvitationService
+from app.services.query import find_page
+
+# Fields managed by the service that clients may not overwrite
+PROTECTED_FIELDS = ("_id", "version", "updated_at")
+
+def _touch() -> dict:
+    """Update operators bumping version and updated_at; every write includes them"""
+    return {"$inc": {"version": 1}, "$currentDate": {"updated_at": True}}
 
 class GraduateService:
     """Service for managing graduates"""
     
     @staticmethod
-    def create_graduate(graduate_data: CreateGraduateRequest) -> str:
+    async def create_graduate(graduate_data: CreateGraduateRequest) -> str:
         """Create a new graduate record with optional photos"""
         collection = mongo_db.get_graduates_collection()
         
@@ -28,19 +39,21 @@ class GraduateService:
                 "email": graduate_data.contact.email,
                 "phone": graduate_data.contact.phone,
             },
-            "photo_urls": graduate_data.photo_urls or []  # Add photo URLs
+            "photo_urls": graduate_data.photo_urls or [],  # Add photo URLs
+            "version": 1,
+            "updated_at": datetime.now(timezone.utc),
         }
         
-        result = collection.insert_one(document)
+        result = await collection.insert_one(document)
         return str(result.inserted_id)
     
     @staticmethod
-    def get_graduate(graduate_id: str) -> Optional[dict]:
+    async def get_graduate(graduate_id: str) -> Optional[dict]:
         """Get graduate by ID"""
         collection = mongo_db.get_graduates_collection()
         
         try:
-            graduate = collection.find_one({"_id": ObjectId(graduate_id)})
+            graduate = await collection.find_one({"_id": ObjectId(graduate_id)})
             if graduate:
                 graduate["_id"] = str(graduate["_id"])
             return graduate
@@ -49,28 +62,107 @@ class GraduateService:
             return None
     
     @staticmethod
-    def get_all_graduates() -> list:
-        """Get all graduates"""
-        collection = mongo_db.get_graduates_collection()
-        graduates = []
+    async def get_graduate_version(graduate_id: str) -> Optional[dict]:
+        """
+        Get only the cache validators of a graduate
         
-        for doc in collection.find():
-            doc["_id"] = str(doc["_id"])
-            graduates.append(doc)
+        Returns:
+            {"version", "updated_at"} (0/None for documents written before
+            versioning), or None if the graduate does not exist
+        """
+        collection = mongo_db.get_graduates_collection()
         
-        return graduates
+        try:
+            graduate = await collection.find_one(
+                {"_id": ObjectId(graduate_id)},
+                {"version": 1, "updated_at": 1}
+            )
+        except Exception as e:
+            print(f"Error getting graduate version: {e}")
+            return None
+        if graduate is None:
+            return None
+        return {"version": graduate.get("version", 0), "updated_at": graduate.get("updated_at")}
+    
+    @staticmethod
+    async def get_all_graduates(
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[list] = None,
+    ) -> list:
+        """Get graduates, optionally one keyset page with a field projection"""
+        collection = mongo_db.get_graduates_collection()
+        return await find_page(collection, {}, after, limit, fields).to_list(length=None)
+    
+    @staticmethod
+    def iter_graduates(
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[list] = None,
+    ) -> AsyncIterator[dict]:
+        """Iterate graduates straight from the cursor without building a list"""
+        collection = mongo_db.get_graduates_collection()
+        return find_page(collection, {}, after, limit, fields)
     
     @staticmethod
-    def update_graduate(graduate_id: str, update_data: dict) -> bool:
+    async def update_graduate(graduate_id: str, update_data: dict) -> bool:
         """Update graduate record"""
         collection = mongo_db.get_graduates_collection()
         
         try:
-            result = collection.update_one(
+            update_data = {
+                key: value for key, value in update_data.items()
+                if key not in PROTECTED_FIELDS
+            }
+            update = _touch()
+            if update_data:
+                update["$set"] = update_data
+            result = await collection.update_one(
                 {"_id": ObjectId(graduate_id)},
-                {"$set": update_data}
+                update
             )
+            InvitationService.invalidate_graduate(graduate_id)
+            answer_cache.invalidate_graduate(graduate_id)
             return result.modified_count > 0 or result.matched_count > 0
         except Exception as e:
             print(f"Error updating graduate: {e}")
             return False
+    
+    @staticmethod
+    async def add_photo_urls(graduate_id: str, photo_urls: list) -> bool:
+        """Append photo URLs to the graduate in a single atomic update"""
+        collection = mongo_db.get_graduates_collection()
+        
+        try:
+            result = await collection.update_one(
+                {"_id": ObjectId(graduate_id)},
+                {"$push": {"photo_urls": {"$each": photo_urls}}, **_touch()}
+            )
+            InvitationService.invalidate_graduate(graduate_id)
+            answer_cache.invalidate_graduate(graduate_id)
+            return result.matched_count > 0
+        except Exception as e:
+            print(f"Error adding photo URLs: {e}")
+            return False
+    
+    @staticmethod
+    async def set_photo_derivatives(graduate_id: str, derivatives: dict) -> bool:
+        """
+        Store (or replace) the derivative URLs for one of the graduate's photos
+        
+        Returns:
+            False if the graduate is gone or no longer has the original photo
+        """
+        collection = mongo_db.get_graduates_collection()
+        query = {"_id": ObjectId(graduate_id), "photo_urls": derivatives["original"]}
+        
+        await collection.update_one(
+            query,
+            {"$pull": {"photo_derivatives": {"original": derivatives["original"]}}}
+        )
+        result = await collection.update_one(
+            query,
+            {"$push": {"photo_derivatives": derivatives}, **_touch()}
+        )
+        InvitationService.invalidate_graduate(graduate_id)
+        return result.matched_count > 0
@@ -0,0 +1,329 @@
+"""
+Background pipeline producing resized photo derivatives
+
+Each uploaded photo is resized to thumbnail, medium and full variants,
+encoded as WebP plus a JPEG fallback with EXIF metadata stripped. Image
+work runs in a process pool fed by a bounded queue, so request handling is
+never blocked; the derivative URLs are stored on the graduate document in
+`photo_derivatives`, next to `photo_urls`. Job state is kept in MongoDB
+so it survives restarts and can be read from any worker.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Optional
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database import mongo_db
+
+# Longest edge in pixels for each variant
+DERIVATIVE_SIZES = {"thumbnail": 320, "medium": 1024, "full": 2048}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_INTERRUPTED = "interrupted"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class PipelineBusyError(Exception):
+    """Raised when the derivative queue is full"""
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def generate_derivatives(data: bytes) -> dict:
+    """
+    Resize an image into every variant and format
+    
+    Runs in a worker process. Orientation from EXIF is applied to the
+    pixels, and no metadata is written to the outputs.
+    
+    Returns:
+        {variant: {"webp": bytes, "jpeg": bytes}}
+    """
+    from PIL import Image, ImageOps
+    
+    with Image.open(BytesIO(data)) as source:
+        source.seek(0)
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    
+    derivatives = {}
+    for variant, edge in DERIVATIVE_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        
+        webp = BytesIO()
+        resized.save(webp, "WEBP", quality=WEBP_QUALITY, method=4)
+        
+        if resized.mode == "RGBA":
+            background = Image.new("RGB", resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.getchannel("A"))
+            resized = background
+        jpeg = BytesIO()
+        resized.save(jpeg, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        
+        derivatives[variant] = {"webp": webp.getvalue(), "jpeg": jpeg.getvalue()}
+    return derivatives
+
+
+class ImagePipeline:
+    """
+    Bounded job queue feeding a process pool of image workers
+    
+    Job records live in the `photo_jobs` collection, so any worker can
+    report a job's status. A job is queued in the process that accepted the
+    upload; on shutdown its unfinished jobs are marked interrupted and the
+    next startup requeues them, as it does for jobs of a process that died
+    without shutting down (queued or processing, not updated for
+    `image_pipeline_stale_job_seconds`).
+    """
+    
+    def __init__(self, workers: int = 2, queue_size: int = 100):
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # job_id -> event set when the job finishes (submit_and_wait)
+        self._waiters: dict = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: list = []
+        self.processing = 0
+        self.done = 0
+        self.failed = 0
+        self.resumed = 0
+    
+    def _start(self) -> None:
+        if self._tasks:
+            return
+        # Forking a process that already runs Motor and to_thread workers can
+        # deadlock the children; forkserver starts them from a clean process
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    async def _new_job(self, graduate_id: str, photo_url: str) -> dict:
+        now = _now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "status": JOB_QUEUED,
+            "graduate_id": graduate_id,
+            "photo_url": photo_url,
+            "derivatives": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await mongo_db.get_photo_jobs_collection().insert_one(job)
+        return job
+    
+    async def submit(self, graduate_id: str, photo_url: str) -> str:
+        """
+        Queue a photo for processing
+        
+        Raises:
+            PipelineBusyError: If the queue is full
+        """
+        self._start()
+        if self.queue.full():
+            raise PipelineBusyError("Image pipeline queue is full")
+        job = await self._new_job(graduate_id, photo_url)
+        self.queue.put_nowait(job)
+        return job["_id"]
+    
+    async def submit_and_wait(self, graduate_id: str, photo_url: str) -> dict:
+        """Queue a photo, waiting for queue space, and return the finished job"""
+        self._start()
+        job = await self._new_job(graduate_id, photo_url)
+        finished = self._waiters[job["_id"]] = asyncio.Event()
+        try:
+            await self.queue.put(job)
+            await finished.wait()
+        finally:
+            self._waiters.pop(job["_id"], None)
+        return await self.get_job(job["_id"])
+    
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """Get job status"""
+        job = await mongo_db.get_photo_jobs_collection().find_one({"_id": job_id})
+        return self._public(job) if job else None
+    
+    @staticmethod
+    def _public(job: dict) -> dict:
+        job = dict(job)
+        job["job_id"] = job.pop("_id")
+        return job
+    
+    @staticmethod
+    def requeue_filter(stale_before: datetime) -> dict:
+        """Filter of interrupted jobs and jobs not updated since stale_before"""
+        return {"$or": [
+            {"status": JOB_INTERRUPTED},
+            {"status": {"$in": [JOB_QUEUED, JOB_PROCESSING]}, "updated_at": {"$lt": stale_before}},
+        ]}
+    
+    async def resume_pending(self) -> int:
+        """Requeue interrupted jobs and jobs abandoned by a process that died"""
+        collection = mongo_db.get_photo_jobs_collection()
+        stale_before = _now() - timedelta(seconds=settings.image_pipeline_stale_job_seconds)
+        resumed = 0
+        while not self.queue.full():
+            # Claimed atomically, so each job is requeued in only one worker
+            job = await collection.find_one_and_update(
+                self.requeue_filter(stale_before),
+                {"$set": {"status": JOB_QUEUED, "updated_at": _now()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                break
+            self._start()
+            self.queue.put_nowait(job)
+            resumed += 1
+        self.resumed += resumed
+        return resumed
+    
+    async def _worker(self) -> None:
+        jobs = mongo_db.get_photo_jobs_collection()
+        while True:
+            job = await self.queue.get()
+            job_id = job["_id"]
+            self.processing += 1
+            try:
+                await jobs.update_one(
+                    {"_id": job_id},
+                    {"$set": {"status": JOB_PROCESSING, "updated_at": _now()}},
+                )
+                derivatives = await self._process(job["graduate_id"], job["photo_url"])
+                await jobs.update_one(
+                    {"_id": job_id},
+                    {"$set": {
+                        "status": JOB_DONE,
+                        "derivatives": derivatives,
+                        "error": None,
+                        "updated_at": _now(),
+                        "finished_at": _now(),
+                    }},
+                )
+                self.done += 1
+            except asyncio.CancelledError:
+                # Shutdown: leave the job to be requeued on the next startup
+                await asyncio.shield(jobs.update_one(
+                    {"_id": job_id},
+                    {"$set": {"status": JOB_INTERRUPTED, "updated_at": _now()}},
+                ))
+                raise
+            except Exception as e:
+                print(f"Error generating derivatives for {job['photo_url']}: {e}")
+                self.failed += 1
+                try:
+                    await jobs.update_one(
+                        {"_id": job_id},
+                        {"$set": {
+                            "status": JOB_FAILED,
+                            "error": str(e),
+                            "updated_at": _now(),
+                            "finished_at": _now(),
+                        }},
+                    )
+                except Exception as save_error:
+                    print(f"Error saving photo job {job_id}: {save_error}")
+            finally:
+                self.processing -= 1
+                self.queue.task_done()
+                finished = self._waiters.get(job_id)
+                if finished is not None:
+                    finished.set()
+    
+    async def _process(self, graduate_id: str, photo_url: str) -> dict:
+        # Imported here to avoid a cycle with the graduate service
+        from app.services.graduate_service import GraduateService
+        from app.services.storage_service import get_storage_service
+        
+        storage = get_storage_service()
+        original = await storage.download_file(photo_url)
+        
+        loop = asyncio.get_running_loop()
+        variants = await loop.run_in_executor(self._executor, generate_derivatives, original)
+        
+        stem = os.path.splitext(storage.blob_name_from_url(photo_url).rsplit("/", 1)[-1])[0]
+        prefix = f"{graduate_id}/derivatives/{stem}/"
+        derivatives = {"original": photo_url}
+        for variant, encoded in variants.items():
+            derivatives[variant] = {}
+            for fmt, data in encoded.items():
+                blob_name = f"{prefix}{variant}.{fmt}"
+                derivatives[variant][fmt] = await storage.upload_bytes(data, blob_name, f"image/{fmt}")
+        
+        if not await GraduateService.set_photo_derivatives(graduate_id, derivatives):
+            # The graduate or the photo was deleted while the job ran
+            await storage.delete_prefix(prefix)
+            raise ValueError("Photo no longer belongs to the graduate")
+        return derivatives
+    
+    async def close(self) -> None:
+        """Stop workers and the process pool, marking unfinished jobs interrupted"""
+        queued = []
+        while not self.queue.empty():
+            queued.append(self.queue.get_nowait()["_id"])
+            self.queue.task_done()
+        if queued:
+            try:
+                await mongo_db.get_photo_jobs_collection().update_many(
+                    {"_id": {"$in": queued}},
+                    {"$set": {"status": JOB_INTERRUPTED, "updated_at": _now()}},
+                )
+            except Exception as e:
+                print(f"Error marking photo jobs interrupted: {e}")
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def stats(self) -> dict:
+        """Get queue depth and the jobs this process finished"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            JOB_PROCESSING: self.processing,
+            JOB_DONE: self.done,
+            JOB_FAILED: self.failed,
+            "resumed": self.resumed,
+        }
+
+
+# Singleton instance
+_image_pipeline: Optional[ImagePipeline] = None
+
+def get_image_pipeline() -> ImagePipeline:
+    """Get or create the image pipeline"""
+    global _image_pipeline
+    
+    if _image_pipeline is None:
+        _image_pipeline = ImagePipeline(
+            workers=settings.image_pipeline_workers,
+            queue_size=settings.image_pipeline_queue_size,
+        )
+    
+    return _image_pipeline
+
+async def close_image_pipeline() -> None:
+    """Stop the image pipeline if it was created"""
+    global _image_pipeline
+    
+    if _image_pipeline is not None:
+        await _image_pipeline.close()
+        _image_pipeline = None
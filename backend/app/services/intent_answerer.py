@@ -0,0 +1,158 @@
+"""
+Deterministic answers for structured event questions
+
+Questions about the ceremony time, venue, address, parking or contact are
+answered straight from the graduate document with a keyword grammar for
+Vietnamese and English, so only open-ended questions reach Azure OpenAI.
+
+Keywords that only name an event detail when the question is about the
+ceremony ("ở đâu", "when", "call") count only next to an event subject or
+another intent, and questions about anything else the guest may need
+(photos, restrooms, taxis, flowers) always go to the LLM, as do questions
+about when the ceremony ends, how long it lasts or what anything costs.
+"""
+
+import re
+from datetime import datetime
+from typing import Optional
+from app.services.answer_cache import normalize_question
+
+# Patterns match the output of normalize_question (lowercase, no diacritics).
+# Keywords that name the event detail on their own
+INTENT_PATTERNS = {
+    "time": re.compile(r"\b(may gio|luc may gio|gio nao|what time)\b"),
+    "venue": re.compile(r"\b(dia diem|to chuc o)\b"),
+    "address": re.compile(r"\b(dia chi(?! (email|mail))|(?<!email )(?<!mail )address)\b"),
+    "parking": re.compile(
+        r"\b(dau xe|do xe|gui xe|bai xe|de xe|cho xe|parking|park)\b"
+    ),
+    "contact": re.compile(
+        r"\b(lien he|lien lac|so dien thoai|dien thoai|sdt|contact|phone number|"
+        r"email address|dia chi email|dia chi mail)\b"
+    ),
+}
+
+# Keywords that only count with an event subject or another intent
+WEAK_INTENT_PATTERNS = {
+    "time": re.compile(
+        r"\b(luc nao|khi nao|bao gio|thoi gian|ngay nao|ngay may|when|date|time)\b"
+    ),
+    "venue": re.compile(r"\b(o dau|cho nao|noi nao|where|venue|location|place)\b"),
+    "address": re.compile(r"\b(duong nao|street)\b"),
+    "contact": re.compile(r"\b(email|mail|phone|call)\b"),
+}
+
+EVENT_SUBJECT_PATTERN = re.compile(
+    r"\b(le|buoi le|tot nghiep|nguoi tot nghiep|su kien|to chuc|dien ra|bat dau|"
+    r"ban ay|ceremony|graduation|graduate|event|start|begin|held)\b"
+)
+
+# Other things a guest asks about with the same keywords; left to the LLM
+OFF_TOPIC_PATTERN = re.compile(
+    r"\b(chup anh|hinh anh|nhan anh|xem anh|gui anh|dang anh|photo|photos|picture|pictures|"
+    r"album|ve sinh|toilet|toilets|restroom|restrooms|wc|taxi|grab|xe om|hoa|flower|flowers|"
+    r"mua|buy|an uong|food|eat|khach san|hotel)\b"
+)
+
+# Questions about when the ceremony ends, how long it lasts or what something
+# costs; the graduate document only has the start time and the parking location
+OPEN_ENDED_PATTERN = re.compile(
+    r"\b(ket thuc|xong|bao lau|keo dai|end|ends|finish|finishes|over|how long|"
+    r"mien phi|chi phi|phi|bao nhieu tien|mat tien|tra tien|gia|free|cost|costs|price|"
+    r"how much|pay|fee)\b"
+)
+
+# Longer questions are treated as open-ended and left to the LLM
+MAX_QUESTION_WORDS = 12
+
+
+class IntentAnswerer:
+    """Keyword intent classifier that answers from graduate fields"""
+    
+    def __init__(self):
+        self.served = 0
+        self.fallbacks = 0
+    
+    def classify(self, question: str) -> list:
+        """
+        Return the structured intents a question asks about
+        
+        An empty list means the question is open-ended and should go to
+        the LLM.
+        """
+        normalized = normalize_question(question)
+        if not normalized or len(normalized.split()) > MAX_QUESTION_WORDS:
+            return []
+        
+        if OFF_TOPIC_PATTERN.search(normalized) or OPEN_ENDED_PATTERN.search(normalized):
+            return []
+        
+        intents = [name for name, pattern in INTENT_PATTERNS.items() if pattern.search(normalized)]
+        if intents or EVENT_SUBJECT_PATTERN.search(normalized):
+            intents += [
+                name for name, pattern in WEAK_INTENT_PATTERNS.items()
+                if name not in intents and pattern.search(normalized)
+            ]
+            intents.sort(key=list(INTENT_PATTERNS).index)
+        # "đậu xe ở đâu" asks about parking, and an address answer already names the venue
+        if "venue" in intents and ("parking" in intents or "address" in intents):
+            intents.remove("venue")
+        return intents
+    
+    def answer(self, graduate_info: dict, question: str) -> Optional[str]:
+        """Answer locally, or return None to fall back to the LLM"""
+        intents = self.classify(question)
+        if not intents:
+            self.fallbacks += 1
+            return None
+        
+        self.served += 1
+        return " ".join(self._render(intent, graduate_info) for intent in intents)
+    
+    def fallback(self, graduate_info: dict) -> str:
+        """Answer used when the LLM is unavailable: apologize and list the key event facts"""
+        self.served += 1
+        facts = " ".join(
+            self._render(intent, graduate_info) for intent in ("time", "address", "contact")
+        )
+        return f"Xin lỗi, hệ thống đang bận nên chưa thể trả lời chi tiết. {facts}"
+    
+    @staticmethod
+    def _render(intent: str, graduate_info: dict) -> str:
+        name = graduate_info.get("name", "")
+        venue = graduate_info.get("venue") or {}
+        contact = graduate_info.get("contact") or {}
+        
+        if intent == "time":
+            when = graduate_info.get("graduation_datetime", "")
+            if isinstance(when, datetime):
+                when = when.strftime("%H:%M ngày %d/%m/%Y")
+            return f"Lễ tốt nghiệp của {name} diễn ra vào {when}."
+        if intent == "venue":
+            return f"Buổi lễ được tổ chức tại {venue.get('name', 'N/A')}."
+        if intent == "address":
+            return (
+                f"Buổi lễ được tổ chức tại {venue.get('name', 'N/A')}, "
+                f"địa chỉ {venue.get('address', 'N/A')}."
+            )
+        if intent == "parking":
+            parking = venue.get("parking")
+            if parking:
+                return f"Chỗ đậu xe: {parking}."
+            return "Thông tin chỗ đậu xe chưa được cập nhật."
+        return (
+            f"Bạn có thể liên hệ {name} qua email {contact.get('email', 'N/A')} "
+            f"hoặc số điện thoại {contact.get('phone', 'N/A')}."
+        )
+    
+    def stats(self) -> dict:
+        """Get counters for locally served and fallback questions"""
+        total = self.served + self.fallbacks
+        return {
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "served_ratio": self.served / total if total else 0.0,
+        }
+
+
+intent_answerer = IntentAnswerer()
@@ -1,94 +1,314 @@
-import random
-import string
-from typing import Optional
+import time
+from collections import Counter
+from typing import AsyncIterator, Optional
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.config import settings
 from app.database import mongo_db
+from app.services.cache import LRUCache
+from app.services.code_allocator import (
+    CODE_FORGED,
+    CODE_MALFORMED,
+    get_code_allocator,
+)
+from app.services.issued_codes import issued_code_filter
+from app.services.query import find_page
+
+# Documents written per insert_many call
+INSERT_CHUNK_SIZE = 1000
+
+# Rounds of re-allocation for guests whose code hit a duplicate key
+MAX_INSERT_ATTEMPTS = 5
+DUPLICATE_KEY_ERROR = 11000
+
+# Verify outcomes by code check result, plus requests rejected before any DB access
+_verify_stats: Counter = Counter()
+
+# Read-through cache of verify results keyed by invitation code, tagged by graduate_id
+_verify_cache = LRUCache(
+    max_entries=settings.verify_cache_max_entries,
+    ttl_seconds=settings.verify_cache_ttl_seconds,
+)
+
+# Well-formed codes the database did not know, so repeats skip the lookup
+_negative_cache = LRUCache(
+    max_entries=settings.verify_negative_cache_max_entries,
+    ttl_seconds=settings.verify_negative_cache_ttl_seconds,
+)
 
 class InvitationService:
     """Service for managing invitations"""
     
     @staticmethod
-    def generate_invitation_codes(count: int = 1) -> list:
-        """Generate unique 6-digit invitation codes"""
-        collection = mongo_db.get_invitations_collection()
-        codes = []
-        
-        for _ in range(count):
-            while True:
-                # Generate 6-digit code
-                code = ''.join(random.choices(string.digits, k=6))
-                
-                # Check if code already exists
-                existing = collection.find_one({"invitation_code": code})
-                if not existing:
-                    codes.append(code)
-                    break
-        
-        return codes
+    async def generate_invitation_codes(count: int = 1) -> list:
+        """Generate unique invitation codes without probing the database"""
+        return await get_code_allocator().allocate(count)
     
     @staticmethod
-    def create_invitations(graduate_id: str, guest_names: list) -> list:
-        """Create invitation records in database with guest names"""
+    async def create_invitations(graduate_id: str, guest_names: list) -> list:
+        """
+        Create invitation records in bulk with guest names
+        
+        Codes are allocated in one batch and written with unordered
+        insert_many in chunks. Guests whose code collides with a legacy
+        randomly generated code get a fresh code and are retried; other
+        write errors are reported per guest. Allocated codes are released
+        once written, so other workers' issued-code filters can count them.
+        
+        Returns:
+            One result per guest, in the same order as guest_names
+        """
         collection = mongo_db.get_invitations_collection()
-        codes = InvitationService.generate_invitation_codes(len(guest_names))
+        codes = await InvitationService.generate_invitation_codes(len(guest_names))
+        allocated = [codes]
         
-        invitations = []
-        for code, guest_name in zip(codes, guest_names):
-            doc = {
+        results = [
+            {
                 "invitation_code": code,
                 "graduate_id": graduate_id,
                 "guest_name": guest_name,
+                "status": "created",
             }
-            collection.insert_one(doc)
-            invitations.append({
-                "invitation_code": code,
-                "graduate_id": graduate_id,
-                "guest_name": guest_name,
-            })
+            for code, guest_name in zip(codes, guest_names)
+        ]
+        
+        pending = list(range(len(results)))
+        for _ in range(MAX_INSERT_ATTEMPTS):
+            if not pending:
+                break
+            
+            duplicates = []
+            for start in range(0, len(pending), INSERT_CHUNK_SIZE):
+                chunk = pending[start:start + INSERT_CHUNK_SIZE]
+                docs = [
+                    {
+                        "invitation_code": results[i]["invitation_code"],
+                        "graduate_id": graduate_id,
+                        "guest_name": results[i]["guest_name"],
+                    }
+                    for i in chunk
+                ]
+                try:
+                    await collection.insert_many(docs, ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details.get("writeErrors", []):
+                        index = chunk[error["index"]]
+                        if error.get("code") == DUPLICATE_KEY_ERROR:
+                            duplicates.append(index)
+                        else:
+                            results[index]["status"] = "failed"
+                            results[index]["error"] = error.get("errmsg", "Write failed")
+            
+            # Hand colliding guests new codes and try them again
+            if duplicates:
+                new_codes = await InvitationService.generate_invitation_codes(len(duplicates))
+                allocated.append(new_codes)
+                for index, code in zip(duplicates, new_codes):
+                    results[index]["invitation_code"] = code
+            pending = duplicates
         
-        return invitations
+        allocator = get_code_allocator()
+        for batch in allocated:
+            await allocator.release_codes(batch)
+        
+        for index in pending:
+            results[index]["status"] = "failed"
+            results[index]["error"] = "Could not allocate a unique invitation code"
+        
+        created = [item["invitation_code"] for item in results if item["status"] == "created"]
+        issued_code_filter.add(created)
+        for code in created:
+            _negative_cache.invalidate(code)
+        
+        return results
     
     @staticmethod
-    def verify_invitation_code(invitation_code: str) -> Optional[dict]:
+    async def verify_invitation_code(invitation_code: str) -> Optional[dict]:
         """Verify invitation code and return graduate_id and guest_name"""
+        if await InvitationService._reject_code(invitation_code):
+            return None
+        
         collection = mongo_db.get_invitations_collection()
         
-        invitation = collection.find_one({"invitation_code": invitation_code})
+        invitation = await collection.find_one({"invitation_code": invitation_code})
         if invitation:
             return {
                 "graduate_id": invitation["graduate_id"],
                 "guest_name": invitation.get("guest_name", "Guest")
             }
         
+        InvitationService._remember_miss(invitation_code)
         return None
     
     @staticmethod
-    def get_invitation_by_code(invitation_code: str) -> Optional[dict]:
+    def _remember_miss(invitation_code: str) -> None:
+        """
+        Negative-cache a code the database did not know
+        
+        Checksummed codes whose counter value is not known to be inserted
+        yet are not cached: another worker may be writing them right now.
+        """
+        allocator = get_code_allocator()
+        index = allocator.counter_index(invitation_code)
+        if index is None or index < allocator.known_inserted:
+            _negative_cache.set(invitation_code, True)
+    
+    @staticmethod
+    async def _reject_code(invitation_code: str) -> bool:
+        """
+        Reject codes in-process so they never reach the database
+        
+        Malformed and forged codes fail the format check; well-formed codes
+        are rejected if a recent lookup missed (negative cache) or the
+        issued-code Bloom filter has never seen them and the shared code
+        counter shows they were not reserved since it last caught up.
+        """
+        check = get_code_allocator().check(invitation_code)
+        _verify_stats[check] += 1
+        if check in (CODE_MALFORMED, CODE_FORGED):
+            reason = check
+        elif _negative_cache.get(invitation_code) is not None:
+            reason = "negative_cache"
+        elif not await issued_code_filter.might_exist(invitation_code):
+            reason = "not_issued"
+        else:
+            return False
+        _verify_stats["rejected_before_db"] += 1
+        _verify_stats[f"rejected_{reason}"] += 1
+        return True
+    
+    @staticmethod
+    def verify_pipeline(invitation_code: str) -> list:
+        """Aggregation joining an invitation to its graduate by code"""
+        return [
+            {"$match": {"invitation_code": invitation_code}},
+            {"$limit": 1},
+            {"$lookup": {
+                "from": "graduates",
+                "let": {"graduate_oid": {"$convert": {
+                    "input": "$graduate_id",
+                    "to": "objectId",
+                    "onError": None,
+                    "onNull": None,
+                }}},
+                "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$graduate_oid"]}}}],
+                "as": "graduate",
+            }},
+        ]
+    
+    @staticmethod
+    async def verify_with_graduate(invitation_code: str) -> Optional[dict]:
+        """
+        Verify invitation code and load its graduate in one round trip
+        
+        Results are served from a bounded read-through cache keyed by
+        invitation code; the database is hit with a single aggregation that
+        joins the invitation to its graduate with $lookup.
+        
+        Returns:
+            graduate_id, guest_name and graduate_info (None if the graduate
+            no longer exists), or None if the code is invalid
+        """
+        if await InvitationService._reject_code(invitation_code):
+            return None
+        
+        started = time.perf_counter()
+        cached = _verify_cache.get(invitation_code)
+        if cached is not None:
+            _verify_stats["cache_lookup_seconds"] += time.perf_counter() - started
+            return cached
+        
+        collection = mongo_db.get_invitations_collection()
+        pipeline = InvitationService.verify_pipeline(invitation_code)
+        
+        result = None
+        async for invitation in collection.aggregate(pipeline):
+            graduate = invitation["graduate"][0] if invitation["graduate"] else None
+            result = {
+                "graduate_id": invitation["graduate_id"],
+                "guest_name": invitation.get("guest_name", "Guest"),
+                "graduate_info": graduate,
+            }
+        
+        _verify_stats["db_lookups"] += 1
+        _verify_stats["db_lookup_seconds"] += time.perf_counter() - started
+        
+        if result is None:
+            InvitationService._remember_miss(invitation_code)
+        elif result["graduate_info"]:
+            _verify_cache.set(invitation_code, result, tag=result["graduate_id"])
+        return result
+    
+    @staticmethod
+    def invalidate_graduate(graduate_id: str) -> None:
+        """Drop cached verify results for a graduate after it changes"""
+        _verify_cache.invalidate_tag(graduate_id)
+    
+    @staticmethod
+    def get_verify_stats() -> dict:
+        """Get counters for verify requests since process start"""
+        cache_stats = _verify_cache.stats()
+        db_lookups = _verify_stats["db_lookups"]
+        cache_hits = cache_stats["hits"]
+        return {
+            "valid": _verify_stats["valid"],
+            "legacy": _verify_stats["legacy"],
+            "malformed": _verify_stats["malformed"],
+            "forged": _verify_stats["forged"],
+            "rejected_before_db": _verify_stats["rejected_before_db"],
+            "short_circuited": {
+                reason: _verify_stats[f"rejected_{reason}"]
+                for reason in (CODE_MALFORMED, CODE_FORGED, "negative_cache", "not_issued")
+            },
+            "cache": cache_stats,
+            "negative_cache": _negative_cache.stats(),
+            "bloom": issued_code_filter.stats(),
+            "db_lookups": db_lookups,
+            "avg_db_lookup_ms": (
+                _verify_stats["db_lookup_seconds"] / db_lookups * 1000 if db_lookups else 0.0
+            ),
+            "avg_cache_hit_ms": (
+                _verify_stats["cache_lookup_seconds"] / cache_hits * 1000 if cache_hits else 0.0
+            ),
+        }
+    
+    @staticmethod
+    async def get_invitation_by_code(invitation_code: str) -> Optional[dict]:
         """Get invitation record by code"""
         collection = mongo_db.get_invitations_collection()
-        invitation = collection.find_one({"invitation_code": invitation_code})
+        invitation = await collection.find_one({"invitation_code": invitation_code})
         return invitation
     
     @staticmethod
-    def get_all_invitations() -> list:
-        """Get all invitations"""
+    async def get_all_invitations(
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[list] = None,
+    ) -> list:
+        """Get invitations, optionally one keyset page with a field projection"""
         collection = mongo_db.get_invitations_collection()
-        invitations = []
-        
-        for doc in collection.find():
-            doc["_id"] = str(doc["_id"])
-            invitations.append(doc)
-        
-        return invitations
+        return await find_page(collection, {}, after, limit, fields).to_list(length=None)
     
     @staticmethod
-    def get_invitations_by_graduate(graduate_id: str) -> list:
+    async def get_invitations_by_graduate(
+        graduate_id: str,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[list] = None,
+    ) -> list:
         """Get all invitations for a specific graduate"""
         collection = mongo_db.get_invitations_collection()
-        invitations = []
-        
-        for doc in collection.find({"graduate_id": graduate_id}):
-            doc["_id"] = str(doc["_id"])
-            invitations.append(doc)
-        
-        return invitations
+        query = {"graduate_id": graduate_id}
+        return await find_page(collection, query, after, limit, fields).to_list(length=None)
+    
+    @staticmethod
+    def iter_invitations(
+        graduate_id: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        fields: Optional[list] = None,
+    ) -> AsyncIterator[dict]:
+        """Iterate invitations straight from the cursor without building a list"""
+        collection = mongo_db.get_invitations_collection()
+        query = {"graduate_id": graduate_id} if graduate_id else {}
+        return find_page(collection, query, after, limit, fields)
@@ -0,0 +1,204 @@
+"""
+Bloom filter of issued invitation codes
+
+Lets verify reject codes that were never issued without a database round
+trip. The filter is built from the invitations collection in the
+background at startup and refreshed periodically with invitations created
+since the last refresh; codes created by this process are added
+immediately. Until the first build finishes, or while refreshes keep
+failing, nothing is rejected.
+
+Codes issued by other workers reach the filter only at its next refresh,
+so a miss is final only for checksummed codes whose counter value had its
+inserts finished (its reservation released) when the last refresh started;
+for later counter values, if the shared counter shows them reserved,
+verify falls back to the indexed lookup.
+
+Deleted invitations stay in the filter until the next full rebuild, which
+only costs them a database lookup.
+"""
+
+import asyncio
+import hashlib
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+from bson import ObjectId
+from app.config import settings
+from app.database import mongo_db
+from app.services.code_allocator import get_code_allocator
+
+# Invitations inserted slightly out of _id order (clock skew between
+# workers) are still picked up by a refresh
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# Unique index on invitation_code; a rebuild reads only its entries
+CODE_INDEX = "invitation_code_unique"
+
+# How often a filter miss may re-read the shared code counter
+COUNTER_RECHECK_SECONDS = 1.0
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one BLAKE2b digest"""
+    
+    def __init__(self, capacity: int, false_positive_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+    
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class IssuedCodeFilter:
+    """Keeps a Bloom filter of issued codes in sync with the invitations collection"""
+    
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        self._refreshed_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        # Codes allocated from counter values below this are in the filter:
+        # the inserted bound read at the start of the last refresh
+        self._issued_before = 0
+        self.rejections = 0
+        self.recent_lookups = 0
+        self.builds = 0
+    
+    @property
+    def fresh(self) -> bool:
+        """Whether the filter is built and has been refreshed recently"""
+        if self._filter is None:
+            return False
+        max_age = timedelta(seconds=settings.verify_bloom_refresh_seconds * 3)
+        return datetime.now(timezone.utc) - self._refreshed_at <= max_age
+    
+    async def might_exist(self, invitation_code: str) -> bool:
+        """
+        False only if the code was certainly never issued; a filter that
+        failed to refresh rejects nothing
+        """
+        if not self.fresh or invitation_code in self._filter:
+            return True
+        
+        allocator = get_code_allocator()
+        index = allocator.counter_index(invitation_code)
+        if index is not None and index >= self._issued_before:
+            # Possibly issued by another worker since the filter caught up
+            try:
+                reserved = await allocator.reserved_count(max_age=COUNTER_RECHECK_SECONDS)
+            except Exception as e:
+                print(f"Error reading invitation code counter: {e}")
+                return True
+            if index < reserved:
+                self.recent_lookups += 1
+                return True
+        
+        self.rejections += 1
+        return False
+    
+    def add(self, codes: Iterable[str]) -> None:
+        """Record codes issued by this process"""
+        if self._filter is not None:
+            for code in codes:
+                self._filter.add(code)
+    
+    async def rebuild(self) -> None:
+        """Build a new filter from every invitation code"""
+        collection = mongo_db.get_invitations_collection()
+        inserted = await get_code_allocator().inserted_count()
+        started = datetime.now(timezone.utc)
+        total = await collection.estimated_document_count()
+        bloom = BloomFilter(
+            max(total * 2, settings.verify_bloom_min_capacity),
+            settings.verify_bloom_false_positive_rate,
+        )
+        # Covered by the unique code index, so only index entries are read
+        cursor = collection.find({}, {"invitation_code": 1, "_id": 0}).hint(CODE_INDEX)
+        async for invitation in cursor:
+            bloom.add(invitation["invitation_code"])
+        
+        # Codes issued while the scan was running
+        await self._add_since(bloom, started)
+        self._filter = bloom
+        self._refreshed_at = started
+        self._issued_before = max(self._issued_before, inserted)
+        self.builds += 1
+    
+    async def refresh(self) -> None:
+        """Add invitations created since the last refresh; rebuild when the filter is full"""
+        if self._filter is None or self._filter.count > self._filter.capacity:
+            await self.rebuild()
+            return
+        # Read before the scan: every code below the bound is already written
+        inserted = await get_code_allocator().inserted_count()
+        started = datetime.now(timezone.utc)
+        await self._add_since(self._filter, self._refreshed_at)
+        self._refreshed_at = started
+        self._issued_before = max(self._issued_before, inserted)
+    
+    @staticmethod
+    def since_filter(since: datetime) -> dict:
+        """Filter of invitations created since a refresh started, with overlap"""
+        return {"_id": {"$gte": ObjectId.from_datetime(since - REFRESH_OVERLAP)}}
+    
+    @staticmethod
+    async def _add_since(bloom: BloomFilter, since: datetime) -> None:
+        collection = mongo_db.get_invitations_collection()
+        cursor = collection.find(
+            IssuedCodeFilter.since_filter(since),
+            {"invitation_code": 1, "_id": 0},
+        )
+        async for invitation in cursor:
+            bloom.add(invitation["invitation_code"])
+    
+    def start(self) -> None:
+        """Build the filter and keep refreshing it in the background"""
+        if settings.verify_bloom_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error refreshing issued code filter: {e}")
+            await asyncio.sleep(settings.verify_bloom_refresh_seconds)
+    
+    async def close(self) -> None:
+        """Stop the refresh task"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    def stats(self) -> dict:
+        """Get filter size and how many codes it rejected"""
+        return {
+            "fresh": self.fresh,
+            "codes": self._filter.count if self._filter else 0,
+            "capacity": self._filter.capacity if self._filter else 0,
+            "bytes": len(self._filter.bits) if self._filter else 0,
+            "rejections": self.rejections,
+            "recent_lookups": self.recent_lookups,
+            "issued_before": self._issued_before,
+            "builds": self.builds,
+        }
+
+
+# Singleton instance
+issued_code_filter = IssuedCodeFilter()
@@ -0,0 +1,249 @@
+"""
+Concurrency-limited async client for Azure OpenAI chat completions
+
+All chatbot calls share one pooled HTTP client. Requests wait for a global
+and a per-graduate slot in a bounded queue with a deadline, and 429/5xx
+responses are retried with jittered exponential backoff that honours
+Retry-After. When the queue is full, the deadline passes or retries run
+out, LLMUnavailableError is raised so callers can degrade to a local answer.
+
+The openai SDK (and httpx) are imported when the client is first created,
+so replicas that never chat do not pay for the import.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+from app.config import settings
+from app.metrics import LLM_QUEUE_WAIT, LLM_REQUEST_DURATION, LLM_TIME_TO_FIRST_TOKEN, observe_duration
+
+
+class LLMUnavailableError(Exception):
+    """Raised when a completion cannot be served in time"""
+
+
+class LLMSaturatedError(LLMUnavailableError):
+    """Raised when the request queue is full or its deadline passed"""
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+    
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or retry-after-ms) from an error response"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class LLMClient:
+    """Pooled Azure OpenAI client with admission control and retries"""
+    
+    def __init__(self):
+        import httpx
+        from openai import AsyncAzureOpenAI
+        
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_connections,
+            ),
+            timeout=httpx.Timeout(settings.llm_request_timeout_seconds, connect=5.0),
+        )
+        self.client = AsyncAzureOpenAI(
+            api_key=settings.azure_openai_api_key,
+            api_version=settings.azure_openai_api_version,
+            azure_endpoint=settings.azure_openai_endpoint,
+            http_client=self.http_client,
+            max_retries=0
+        )
+        self.model = settings.azure_openai_deployment_name
+        
+        self._global_slots = asyncio.Semaphore(settings.llm_max_concurrency)
+        # graduate_id -> [semaphore, number of requests holding or waiting for it]
+        self._graduate_slots: dict = {}
+        
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.retries = 0
+        self.saturated = 0
+        self.failures = 0
+    
+    @asynccontextmanager
+    async def _slot(self, graduate_id: Optional[str]):
+        """Wait for a global and per-graduate slot, bounded by queue size and deadline"""
+        if self.waiting >= settings.llm_max_queue:
+            self.saturated += 1
+            raise LLMSaturatedError("LLM request queue is full")
+        
+        entry = self._graduate_slots.get(graduate_id)
+        if entry is None:
+            entry = [asyncio.Semaphore(settings.llm_max_concurrency_per_graduate), 0]
+            self._graduate_slots[graduate_id] = entry
+        entry[1] += 1
+        
+        acquired = []
+        queued = time.monotonic()
+        deadline = queued + settings.llm_queue_timeout_seconds
+        self.waiting += 1
+        try:
+            try:
+                for semaphore in (entry[0], self._global_slots):
+                    remaining = max(0.0, deadline - time.monotonic())
+                    await asyncio.wait_for(semaphore.acquire(), timeout=remaining)
+                    acquired.append(semaphore)
+            except asyncio.TimeoutError:
+                self.saturated += 1
+                raise LLMSaturatedError("Timed out waiting for an LLM slot")
+            finally:
+                self.waiting -= 1
+                LLM_QUEUE_WAIT.observe(time.monotonic() - queued)
+            
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+        finally:
+            for semaphore in acquired:
+                semaphore.release()
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._graduate_slots.pop(graduate_id, None)
+    
+    async def _with_retries(self, call):
+        """Run call(), retrying 429/5xx/timeouts with jittered exponential backoff"""
+        for attempt in range(settings.llm_max_retries + 1):
+            try:
+                return await call()
+            except Exception as e:
+                if not _is_retryable(e):
+                    raise
+                if attempt == settings.llm_max_retries:
+                    self.failures += 1
+                    raise LLMUnavailableError(f"LLM request failed after retries: {e}") from e
+                
+                delay = _retry_after_seconds(e)
+                if delay is None:
+                    backoff = settings.llm_backoff_base_seconds * (2 ** attempt)
+                    delay = random.uniform(0, min(settings.llm_backoff_max_seconds, backoff))
+                elif delay > settings.llm_backoff_max_seconds:
+                    # Waiting that long would stall the guest; degrade instead
+                    self.failures += 1
+                    raise LLMUnavailableError(f"LLM asked to retry after {delay:.1f}s") from e
+                
+                self.retries += 1
+                await asyncio.sleep(delay)
+    
+    async def complete(self, messages: list, graduate_id: Optional[str] = None,
+                       model: Optional[str] = None):
+        """Create a chat completion"""
+        async with self._slot(graduate_id):
+            with observe_duration(LLM_REQUEST_DURATION, operation="complete"):
+                response = await self._with_retries(
+                    lambda: self.client.chat.completions.create(
+                        model=model or self.model,
+                        messages=messages
+                    )
+                )
+            self.completed += 1
+            return response
+    
+    async def stream(self, messages: list, graduate_id: Optional[str] = None,
+                     model: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as text deltas
+        
+        Only opening the stream is retried. Closing the generator closes the
+        upstream response and frees the slot.
+        """
+        async with self._slot(graduate_id):
+            with observe_duration(LLM_REQUEST_DURATION, operation="stream"):
+                opened = time.monotonic()
+                stream = await self._with_retries(
+                    lambda: self.client.chat.completions.create(
+                        model=model or self.model,
+                        messages=messages,
+                        stream=True
+                    )
+                )
+                first = True
+                try:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first:
+                                LLM_TIME_TO_FIRST_TOKEN.observe(time.monotonic() - opened)
+                                first = False
+                            yield delta
+                    self.completed += 1
+                finally:
+                    await stream.response.aclose()
+    
+    async def aclose(self) -> None:
+        """Close the shared HTTP connection pool"""
+        await self.http_client.aclose()
+    
+    def stats(self) -> dict:
+        """Get queue and retry counters"""
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "retries": self.retries,
+            "saturated": self.saturated,
+            "failures": self.failures,
+        }
+
+
+# Singleton instance
+_llm_client: Optional[LLMClient] = None
+
+def get_llm_client() -> LLMClient:
+    """
+    Get or create the shared LLM client
+    
+    Raises:
+        SubsystemNotConfiguredError: If the Azure OpenAI settings are missing
+    """
+    global _llm_client
+    
+    if _llm_client is None:
+        settings.require("chatbot")
+        _llm_client = LLMClient()
+    
+    return _llm_client
+
+async def close_llm_client() -> None:
+    """Close the shared LLM client if it was created"""
+    global _llm_client
+    
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
@@ -0,0 +1,98 @@
+"""
+System prompts compiled once per graduate version
+
+The system prompt starts with instructions that are identical for every
+graduate, followed by the graduate's event details, and nothing in it
+changes between questions. Every request for a graduate therefore shares
+the same prefix (system prompt, then the session history), which lets the
+provider's prompt caching reuse it; questions go last.
+
+Compiled prompts are keyed by graduate id and document version, which
+every graduate write bumps, so an edited graduate is recompiled on its
+next question. Event lines whose field is empty are left out.
+"""
+
+from typing import Optional
+from app.config import settings
+from app.services.answer_cache import event_hash
+from app.services.cache import LRUCache
+
+# Shared by every graduate; keep it first and unchanged so the prefix is stable
+SYSTEM_INSTRUCTIONS = """Bạn là trợ lý thông tin về một lễ tốt nghiệp.
+
+Bạn chỉ được trả lời các câu hỏi về lễ tốt nghiệp được mô tả bên dưới. Nếu người dùng hỏi về thứ gì khác,
+hãy lịch sự từ chối và yêu cầu họ hỏi về lễ tốt nghiệp.
+
+Hãy trả lời bằng tiếng Việt một cách thân thiện và chuyên nghiệp."""
+
+
+class CompiledPrompt:
+    """System prompt of one graduate version and the hash of its event details"""
+    
+    __slots__ = ("system_prompt", "context_hash")
+    
+    def __init__(self, system_prompt: str, context_hash: str):
+        self.system_prompt = system_prompt
+        self.context_hash = context_hash
+
+
+def render_graduate_context(graduate_info: dict) -> str:
+    """Event details of a graduate, one line per known field"""
+    venue = graduate_info.get("venue") or {}
+    contact = graduate_info.get("contact") or {}
+
+    lines = [
+        ("Người tốt nghiệp", graduate_info.get("name")),
+        ("Bằng cấp", graduate_info.get("degree")),
+        ("Ngành", graduate_info.get("department")),
+        ("Thời gian", graduate_info.get("graduation_datetime")),
+        ("Địa điểm", venue.get("name")),
+        ("Địa chỉ", venue.get("address")),
+        ("Chỗ đậu xe", venue.get("parking") or "Chưa cập nhật"),
+        ("Email liên hệ", contact.get("email")),
+        ("Điện thoại", contact.get("phone")),
+    ]
+    return "\n".join(f"- {label}: {value}" for label, value in lines if value)
+
+
+def compile_prompt(graduate_info: dict) -> CompiledPrompt:
+    """Build the system prompt of a graduate"""
+    context = render_graduate_context(graduate_info)
+    system_prompt = f"{SYSTEM_INSTRUCTIONS}\n\nThông tin sự kiện:\n{context}"
+    return CompiledPrompt(system_prompt, event_hash(context))
+
+
+class PromptCache:
+    """Per-process LRU of compiled system prompts, keyed by graduate version"""
+    
+    def __init__(self):
+        self._prompts = LRUCache(
+            max_entries=settings.chatbot_prompt_cache_max_entries,
+            ttl_seconds=settings.chatbot_prompt_cache_ttl_seconds,
+        )
+        self.compiled = 0
+    
+    def get(self, graduate_info: dict) -> CompiledPrompt:
+        """Get the graduate's compiled prompt, compiling it on first use"""
+        graduate_id = str(graduate_info.get("_id"))
+        key = (graduate_id, graduate_info.get("version", 0))
+        compiled: Optional[CompiledPrompt] = self._prompts.get(key)
+        if compiled is None:
+            # Older versions of this graduate will not be asked for again
+            self._prompts.invalidate_tag(graduate_id)
+            compiled = compile_prompt(graduate_info)
+            self._prompts.set(key, compiled, tag=graduate_id)
+            self.compiled += 1
+        return compiled
+    
+    def invalidate_graduate(self, graduate_id: str) -> int:
+        """Drop the compiled prompts of a graduate"""
+        return self._prompts.invalidate_tag(graduate_id)
+    
+    def stats(self) -> dict:
+        """Get prompt cache counters"""
+        return {**self._prompts.stats(), "compiled": self.compiled}
+
+
+# Singleton instance
+prompt_cache = PromptCache()
@@ -0,0 +1,104 @@
+"""
+Helpers for paginated, projected and streamed list queries
+"""
+
+import re
+from typing import Any, AsyncIterator, Optional
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import Response
+from pydantic import TypeAdapter, ValidationError
+
+# Largest page a list endpoint will return in one response
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Plain (optionally dotted) field paths; no operators or empty segments
+FIELD_NAME = re.compile(r"[A-Za-z_]\w*(\.[A-Za-z_]\w*)*")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[list]:
+    """
+    Parse a comma-separated `fields=` query value
+    
+    Raises:
+        ValueError: If a field is not a plain (dotted) field name
+    """
+    if not fields:
+        return None
+    names = [field.strip() for field in fields.split(",") if field.strip()]
+    for name in names:
+        if not FIELD_NAME.fullmatch(name):
+            raise ValueError(f"Invalid field name: {name}")
+    return names
+
+
+def build_projection(fields: Optional[list]) -> Optional[dict]:
+    """Build a Mongo projection that returns only the given fields (plus _id)"""
+    if not fields:
+        return None
+    return {field: 1 for field in fields}
+
+
+def keyset_filter(query: dict, after: Optional[str]) -> dict:
+    """
+    Restrict a query to documents after the given _id cursor
+    
+    Raises:
+        ValueError: If the cursor is not a valid ObjectId
+    """
+    if not after:
+        return query
+    try:
+        return {**query, "_id": {"$gt": ObjectId(after)}}
+    except (InvalidId, TypeError):
+        raise ValueError("Invalid pagination cursor")
+
+
+def find_page(collection, query: dict, after: Optional[str] = None,
+              limit: Optional[int] = None, fields: Optional[list] = None):
+    """Open a cursor over one keyset page ordered by _id"""
+    cursor = collection.find(
+        keyset_filter(query, after),
+        build_projection(fields)
+    ).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+
+def _json_default(value):
+    # orjson encodes datetimes itself; ObjectIds (and anything else) become strings
+    return str(value)
+
+
+async def to_ndjson(documents: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Encode documents as newline-delimited JSON, one line per document"""
+    async for doc in documents:
+        yield orjson.dumps(doc, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def model_response(adapter: TypeAdapter, documents: Any, headers: Optional[dict] = None) -> Response:
+    """
+    Encode raw documents (a list or a single document) through a typed response model
+    
+    Validation (including ObjectId to str) and JSON encoding both run in
+    pydantic-core, skipping FastAPI's per-value Python walk over the
+    response. Fields missing from projected documents are left out.
+    
+    Documents that do not fit the model (e.g. written by an untyped update)
+    are returned as stored rather than failing the whole response.
+    """
+    try:
+        content = adapter.dump_json(
+            adapter.validate_python(documents),
+            by_alias=True,
+            exclude_unset=True,
+        )
+    except ValidationError as e:
+        print(f"Response model validation failed, returning documents as stored: {e}")
+        content = orjson.dumps(documents, default=_json_default)
+    return Response(content=content, media_type="application/json", headers=headers)
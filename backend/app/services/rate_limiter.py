@@ -0,0 +1,162 @@
+"""
+In-process admission control with token buckets
+
+Each limiter has one bucket per client (bounded LRU of client keys) plus a
+global bucket. A request needs a token from both; otherwise it is
+throttled with the time until a token is available.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException, Request, status
+from app.config import settings
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`"""
+    
+    __slots__ = ("rate", "burst", "tokens", "updated")
+    
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+    
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+    
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """Per-client and global token buckets for one group of routes"""
+    
+    def __init__(
+        self,
+        name: str,
+        client_rate: float,
+        client_burst: float,
+        global_rate: float,
+        global_burst: float,
+        max_clients: int = 100000,
+    ):
+        self.name = name
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.clients: OrderedDict = OrderedDict()
+        self.global_bucket = TokenBucket(global_rate, global_burst, time.monotonic())
+        self.allowed = 0
+        self.throttled_client = 0
+        self.throttled_global = 0
+    
+    def acquire(self, client: str) -> Optional[float]:
+        """
+        Take a token for a client
+        
+        Returns:
+            None if admitted, otherwise seconds the client should wait
+        """
+        now = time.monotonic()
+        bucket = self.clients.get(client)
+        if bucket is None:
+            bucket = TokenBucket(self.client_rate, self.client_burst, now)
+            self.clients[client] = bucket
+            if len(self.clients) > self.max_clients:
+                # A full bucket is the default, so forgetting idle clients is safe
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(client)
+        
+        client_wait = bucket.wait_time(now)
+        if client_wait > 0:
+            self.throttled_client += 1
+            return client_wait
+        
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            self.throttled_global += 1
+            return global_wait
+        
+        bucket.take()
+        self.global_bucket.take()
+        self.allowed += 1
+        return None
+    
+    def stats(self) -> dict:
+        """Get admitted/throttled counters since process start"""
+        return {
+            "allowed": self.allowed,
+            "throttled_client": self.throttled_client,
+            "throttled_global": self.throttled_global,
+            "tracked_clients": len(self.clients),
+        }
+
+
+def client_key(request: Request) -> str:
+    """
+    Client address, from X-Forwarded-For when running behind trusted proxies
+    
+    Each proxy appends the address it received the request from, so only
+    the last `rate_limit_trusted_proxy_hops` entries are trusted; anything
+    left of them was written by the client.
+    """
+    if settings.rate_limit_trust_forwarded_for:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            entries = [entry.strip() for entry in forwarded.split(",")]
+            hops = max(1, settings.rate_limit_trusted_proxy_hops)
+            return entries[-min(hops, len(entries))]
+    return request.client.host if request.client else "unknown"
+
+
+verify_limiter = RateLimiter(
+    "verify",
+    client_rate=settings.verify_rate_per_client,
+    client_burst=settings.verify_burst_per_client,
+    global_rate=settings.verify_rate_global,
+    global_burst=settings.verify_burst_global,
+    max_clients=settings.rate_limit_max_clients,
+)
+
+chat_limiter = RateLimiter(
+    "chat",
+    client_rate=settings.chat_rate_per_client,
+    client_burst=settings.chat_burst_per_client,
+    global_rate=settings.chat_rate_global,
+    global_burst=settings.chat_burst_global,
+    max_clients=settings.rate_limit_max_clients,
+)
+
+
+def rate_limit(limiter: RateLimiter):
+    """
+    Route dependency admitting requests through a limiter
+    
+    Raises:
+        HTTPException: 429 with Retry-After when the client or the route
+            group is over its rate
+    """
+    async def dependency(request: Request) -> None:
+        if not settings.rate_limit_enabled:
+            return
+        wait = limiter.acquire(client_key(request))
+        if wait is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(min(wait, 3600))))},
+            )
+    return dependency
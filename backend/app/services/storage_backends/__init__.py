@@ -0,0 +1,74 @@
+"""
+Pluggable storage engines for photo blobs
+
+StorageService keeps the upload policy (size limits, deduplication,
+reference counting) and delegates the bytes to a StorageBackend chosen by
+`settings.storage_backend`. Engines are imported only when selected, so a
+local-disk deployment never loads the Azure SDK.
+"""
+
+import asyncio
+from typing import AsyncIterator
+from app.config import settings
+
+
+class StorageBackend:
+    """Interface every storage engine implements"""
+    
+    async def write(self, name: str, chunks: AsyncIterator[bytes], content_type: str = None) -> None:
+        """Store a stream of chunks under name, replacing any existing blob"""
+        raise NotImplementedError
+    
+    async def write_bytes(self, name: str, data: bytes, content_type: str = None) -> None:
+        """Store bytes under name, replacing any existing blob"""
+        async def single_chunk():
+            yield data
+        
+        await self.write(name, single_chunk(), content_type)
+    
+    async def read(self, name: str) -> bytes:
+        """Read a whole blob"""
+        raise NotImplementedError
+    
+    async def delete(self, name: str) -> None:
+        """Delete a blob; raises if it does not exist"""
+        raise NotImplementedError
+    
+    async def delete_many(self, names: list) -> int:
+        """Delete blobs, ignoring ones already gone; returns how many were deleted"""
+        results = await asyncio.gather(
+            *(self.delete(name) for name in names), return_exceptions=True
+        )
+        return sum(1 for result in results if not isinstance(result, Exception))
+    
+    def list_names(self, prefix: str = "") -> AsyncIterator[str]:
+        """Iterate blob names starting with prefix"""
+        raise NotImplementedError
+    
+    def url_for(self, name: str) -> str:
+        """Public URL of a blob"""
+        raise NotImplementedError
+    
+    def name_from_url(self, url: str) -> str:
+        """Blob name of a public URL produced by url_for"""
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        """Release network or file handles"""
+
+
+def create_storage_backend() -> StorageBackend:
+    """
+    Build the engine selected in settings
+    
+    Raises:
+        SubsystemNotConfiguredError: If the engine's settings are missing
+    """
+    settings.require("storage")
+    if settings.storage_backend == "azure":
+        from app.services.storage_backends.azure_blob import AzureBlobBackend
+        return AzureBlobBackend()
+    if settings.storage_backend == "local":
+        from app.services.storage_backends.local import LocalStorageBackend
+        return LocalStorageBackend()
+    raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
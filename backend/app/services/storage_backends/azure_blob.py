@@ -0,0 +1,129 @@
+"""
+Azure Blob Storage engine
+"""
+
+import asyncio
+import base64
+from typing import AsyncIterator
+from urllib.parse import unquote
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient, BlobClient
+from app.config import settings
+from app.services.storage_backends import StorageBackend
+
+# Most sub-requests a single blob batch may carry
+AZURE_BATCH_LIMIT = 256
+
+
+class AzureBlobBackend(StorageBackend):
+    """Stores blobs in an Azure Storage container with the async SDK"""
+    
+    def __init__(self):
+        """Initialize Azure Storage connection"""
+        self.container_name = settings.azure_storage_container_name
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            settings.azure_storage_connection_string
+        )
+        
+        # Container existence is checked once per process
+        self._container_ready = False
+        self._container_lock = asyncio.Lock()
+    
+    async def _ensure_container(self) -> None:
+        """Create the container on first use and remember that it exists"""
+        if self._container_ready:
+            return
+        
+        async with self._container_lock:
+            if self._container_ready:
+                return
+            container_client = self.blob_service_client.get_container_client(
+                self.container_name
+            )
+            try:
+                await container_client.create_container(public_access="blob")
+            except ResourceExistsError:
+                pass
+            self._container_ready = True
+    
+    async def write(self, name: str, chunks: AsyncIterator[bytes], content_type: str = None) -> None:
+        """Stage chunks as blocks of the configured size and commit them"""
+        await self._ensure_container()
+        blob_client = self.get_blob_client(name)
+        
+        block_size = settings.azure_storage_block_size
+        block_ids = []
+        buffer = bytearray()
+        
+        async def stage(data: bytes) -> None:
+            block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+            await blob_client.stage_block(block_id, data)
+            block_ids.append(block_id)
+        
+        # An exception from chunks (e.g. size limit) leaves the blocks
+        # uncommitted; the service garbage-collects them
+        async for chunk in chunks:
+            buffer.extend(chunk)
+            while len(buffer) >= block_size:
+                await stage(bytes(buffer[:block_size]))
+                del buffer[:block_size]
+        
+        if buffer or not block_ids:
+            await stage(bytes(buffer))
+        
+        await blob_client.commit_block_list(
+            block_ids,
+            content_settings=ContentSettings(content_type=content_type)
+        )
+    
+    async def write_bytes(self, name: str, data: bytes, content_type: str = None) -> None:
+        """Upload bytes in a single request"""
+        await self._ensure_container()
+        await self.get_blob_client(name).upload_blob(
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type=content_type)
+        )
+    
+    async def read(self, name: str) -> bytes:
+        downloader = await self.get_blob_client(name).download_blob()
+        return await downloader.readall()
+    
+    async def delete(self, name: str) -> None:
+        await self.get_blob_client(name).delete_blob()
+    
+    async def delete_many(self, names: list) -> int:
+        """Delete up to 256 blobs per round trip with a blob batch request"""
+        container_client = self.blob_service_client.get_container_client(self.container_name)
+        deleted = 0
+        for start in range(0, len(names), AZURE_BATCH_LIMIT):
+            responses = await container_client.delete_blobs(
+                *names[start:start + AZURE_BATCH_LIMIT], raise_on_any_failure=False
+            )
+            async for response in responses:
+                if response.status_code == 202:
+                    deleted += 1
+        return deleted
+    
+    async def list_names(self, prefix: str = "") -> AsyncIterator[str]:
+        container_client = self.blob_service_client.get_container_client(self.container_name)
+        async for blob in container_client.list_blobs(name_starts_with=prefix):
+            yield blob.name
+    
+    def url_for(self, name: str) -> str:
+        return self.get_blob_client(name).url
+    
+    def name_from_url(self, url: str) -> str:
+        return unquote(url.split(f"{self.container_name}/", 1)[1])
+    
+    def get_blob_client(self, blob_name: str) -> BlobClient:
+        """Get blob client for specific blob"""
+        return self.blob_service_client.get_blob_client(
+            container=self.container_name,
+            blob=blob_name
+        )
+    
+    async def close(self) -> None:
+        """Close the underlying HTTP session"""
+        await self.blob_service_client.close()
@@ -0,0 +1,104 @@
+"""
+Local filesystem engine
+
+Blobs are files under `settings.local_storage_path`, written to a
+temporary file and renamed into place so readers never see partial
+content. They are served by the /files route (app/routes/files.py).
+"""
+
+import asyncio
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+from urllib.parse import quote, unquote
+from app.config import settings
+from app.services.storage_backends import StorageBackend
+
+
+class LocalStorageBackend(StorageBackend):
+    """Stores blobs as files on local disk"""
+    
+    def __init__(self):
+        self.root = Path(settings.local_storage_path).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.base_url = settings.local_storage_base_url.rstrip("/")
+    
+    def path_for(self, name: str) -> Path:
+        """
+        Resolve a blob name to a path inside the storage root
+        
+        Raises:
+            ValueError: If the name escapes the storage root
+        """
+        path = (self.root / name).resolve()
+        if path == self.root or self.root not in path.parents:
+            raise ValueError(f"Invalid blob name: {name}")
+        return path
+    
+    async def write(self, name: str, chunks: AsyncIterator[bytes], content_type: str = None) -> None:
+        path = self.path_for(name)
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        handle = await asyncio.to_thread(open, temp_path, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(handle.write, chunk)
+            await asyncio.to_thread(handle.close)
+            await asyncio.to_thread(os.replace, temp_path, path)
+        except BaseException:
+            handle.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+    
+    async def read(self, name: str) -> bytes:
+        return await asyncio.to_thread(self.path_for(name).read_bytes)
+    
+    async def delete(self, name: str) -> None:
+        await asyncio.to_thread(self.path_for(name).unlink)
+    
+    async def delete_many(self, names: list) -> int:
+        paths = [self.path_for(name) for name in names]
+        
+        def unlink_all() -> int:
+            deleted = 0
+            for path in paths:
+                try:
+                    path.unlink()
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+            return deleted
+        
+        return await asyncio.to_thread(unlink_all)
+    
+    async def list_names(self, prefix: str = "") -> AsyncIterator[str]:
+        def walk() -> list:
+            # Only the directory the prefix points into is walked
+            start = (self.root / prefix).resolve()
+            if prefix and not prefix.endswith("/"):
+                start = start.parent
+            if start != self.root and self.root not in start.parents or not start.is_dir():
+                return []
+            
+            names = []
+            for directory, _, files in os.walk(start):
+                for file_name in files:
+                    if file_name.endswith(".tmp"):
+                        continue
+                    name = Path(directory, file_name).relative_to(self.root).as_posix()
+                    if name.startswith(prefix):
+                        names.append(name)
+            return sorted(names)
+        
+        for name in await asyncio.to_thread(walk):
+            yield name
+    
+    def url_for(self, name: str) -> str:
+        return f"{self.base_url}/{quote(name)}"
+    
+    def name_from_url(self, url: str) -> str:
+        if not url.startswith(self.base_url + "/"):
+            raise ValueError(f"URL is not served by local storage: {url}")
+        return unquote(url[len(self.base_url) + 1:])
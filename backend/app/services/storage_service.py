@@ -1,76 +1,266 @@
 """
-Azure Storage Service for managing photo uploads
+Storage Service for managing photo uploads
 """
 
+import asyncio
+import hashlib
 import os
+import tempfile
 import uuid
-from typing import Optional
-from io import BytesIO
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from pymongo import ReturnDocument
 from app.config import settings
+from app.database import mongo_db
+from app.metrics import STORAGE_DEDUPLICATED_BYTES, STORAGE_UPLOAD_BYTES, STORAGE_UPLOAD_DURATION, observe_duration
+from app.services.storage_backends import StorageBackend, create_storage_backend
+
+# Content-addressed blobs live under this prefix, named by SHA-256
+CONTENT_PREFIX = "content/"
+
+# Totals over content-addressed blobs that are still referenced
+DEDUP_REPORT_PIPELINE = [
+    {"$match": {"ref_count": {"$gt": 0}}},
+    {"$group": {
+        "_id": None,
+        "blobs": {"$sum": 1},
+        "references": {"$sum": "$ref_count"},
+        "stored_bytes": {"$sum": "$size"},
+        "referenced_bytes": {"$sum": {"$multiply": ["$size", "$ref_count"]}},
+    }},
+]
+
+
+class FileTooLargeError(ValueError):
+    """Raised when an upload exceeds the size limit while streaming"""
+
+
+async def iter_upload_file(file, chunk_size: int) -> AsyncIterator[bytes]:
+    """Read an UploadFile in chunks instead of all at once"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
 
 class StorageService:
-    """Service for Azure Blob Storage operations"""
-    
-    def __init__(self):
-        """Initialize Azure Storage connection"""
-        if not settings.azure_storage_connection_string:
-            raise ValueError(
-                "Azure Storage not configured. "
-                "Please set AZURE_STORAGE_CONNECTION_STRING in .env"
-            )
-        
-        self.connection_string = settings.azure_storage_connection_string
-        self.container_name = settings.azure_storage_container_name
-        self.blob_service_client = BlobServiceClient.from_connection_string(
-            self.connection_string
-        )
+    """Service for photo storage operations on the configured backend"""
     
-    def upload_file(self, file_content: bytes, file_name: str, graduate_id: str) -> str:
+    def __init__(self, backend: Optional[StorageBackend] = None):
+        """Initialize the storage backend selected in settings"""
+        self.backend = backend or create_storage_backend()
+        # Metric label; injected backends are named after their class
+        self.backend_name = settings.storage_backend if backend is None else type(backend).__name__
+    
+    @staticmethod
+    async def _limit_size(chunks: AsyncIterator[bytes], max_size: Optional[int]) -> AsyncIterator[bytes]:
+        """Pass chunks through, failing as soon as more than max_size bytes arrived"""
+        total = 0
+        async for chunk in chunks:
+            total += len(chunk)
+            if max_size is not None and total > max_size:
+                raise FileTooLargeError(f"File exceeds {max_size} bytes")
+            yield chunk
+    
+    async def upload_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        file_name: str,
+        graduate_id: str,
+        max_size: Optional[int] = None,
+        content_type: Optional[str] = None,
+        blob_name: Optional[str] = None,
+    ) -> str:
         """
-        Upload file to Azure Storage and return URL
+        Stream file chunks to storage and return URL
+        
+        With deduplication on (and no explicit blob_name), the blob is named
+        after the SHA-256 of its content, computed while the chunks arrive.
+        Chunks are gathered into blocks that are hashed and spooled to a
+        temporary file (memory up to one block, then disk) in a worker
+        thread, so disk I/O never blocks the event loop; content that is
+        already stored only gains a reference and is not transferred again.
+        The upload is abandoned as soon as more than max_size bytes have
+        arrived.
         
         Args:
-            file_content: File bytes
+            chunks: Async iterator of file bytes
             file_name: Original filename
             graduate_id: Graduate ID for organizing storage
+            max_size: Optional size limit in bytes
+            content_type: Optional MIME type stored on the blob
+            blob_name: Optional blob name (skips deduplication)
         
         Returns:
             Public URL of uploaded file
+        
+        Raises:
+            FileTooLargeError: If the file exceeds max_size
         """
+        file_ext = os.path.splitext(file_name)[1].lower()
+        
+        if blob_name is not None or not settings.azure_storage_deduplicate:
+            # Generate unique blob name
+            if blob_name is None:
+                blob_name = f"{graduate_id}/{uuid.uuid4()}{file_ext}"
+            await self._write(blob_name, self._limit_size(chunks, max_size), content_type)
+            return self.backend.url_for(blob_name)
+        
+        spool = tempfile.SpooledTemporaryFile(max_size=settings.azure_storage_block_size)
         try:
-            # Create container if not exists
-            container_client = self.blob_service_client.get_container_client(
-                self.container_name
-            )
+            digest = hashlib.sha256()
+            size = 0
+            block = []
+            block_size = 0
+            async for chunk in self._limit_size(chunks, max_size):
+                size += len(chunk)
+                block.append(chunk)
+                block_size += len(chunk)
+                if block_size >= settings.azure_storage_block_size:
+                    await asyncio.to_thread(self._spool_block, spool, digest, block)
+                    block = []
+                    block_size = 0
+            if block:
+                await asyncio.to_thread(self._spool_block, spool, digest, block)
             
-            try:
-                container_client.get_container_properties()
-            except:
-                container_client.create_container(public_access="blob")
+            blob_name = f"{CONTENT_PREFIX}{digest.hexdigest()}{file_ext}"
+            if not await self._add_reference(blob_name, size):
+                STORAGE_DEDUPLICATED_BYTES.labels(self.backend_name).inc(size)
+                return self.backend.url_for(blob_name)
             
-            # Generate unique blob name
-            file_ext = os.path.splitext(file_name)[1]
-            blob_name = f"{graduate_id}/{uuid.uuid4()}{file_ext}"
+            await asyncio.to_thread(spool.seek, 0)
+            try:
+                await self._write(blob_name, self._read_spool(spool), content_type)
+            except Exception:
+                await self._release_reference(blob_name)
+                raise
             
-            # Upload file
-            blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name,
-                blob=blob_name
+            await mongo_db.get_blob_refs_collection().update_one(
+                {"_id": blob_name},
+                {"$set": {"uploaded": True}}
             )
-            blob_client.upload_blob(file_content, overwrite=True)
-            
-            # Return public URL
-            blob_url = blob_client.url
-            return blob_url
-            
+            return self.backend.url_for(blob_name)
+        finally:
+            spool.close()
+    
+    async def _write(self, blob_name: str, chunks: AsyncIterator[bytes], content_type: Optional[str]) -> None:
+        written = 0
+        
+        async def counted() -> AsyncIterator[bytes]:
+            nonlocal written
+            async for chunk in chunks:
+                written += len(chunk)
+                yield chunk
+        
+        try:
+            with observe_duration(STORAGE_UPLOAD_DURATION, backend=self.backend_name):
+                await self.backend.write(blob_name, counted(), content_type)
+        except FileTooLargeError:
+            raise
         except Exception as e:
-            print(f"Error uploading file to Azure Storage: {e}")
+            print(f"Error uploading file to storage: {e}")
             raise
+        finally:
+            STORAGE_UPLOAD_BYTES.labels(self.backend_name).inc(written)
+    
+    @staticmethod
+    def _spool_block(spool, digest, block: list) -> None:
+        """Hash and spool one block of chunks (runs in a worker thread)"""
+        for chunk in block:
+            digest.update(chunk)
+            spool.write(chunk)
+    
+    async def _read_spool(self, spool) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await asyncio.to_thread(spool.read, settings.azure_storage_block_size)
+            if not chunk:
+                break
+            yield chunk
+    
+    async def _add_reference(self, blob_name: str, size: int) -> bool:
+        """
+        Count one more use of a content-addressed blob
+        
+        Returns:
+            True if the content still has to be uploaded
+        """
+        collection = mongo_db.get_blob_refs_collection()
+        before = await collection.find_one_and_update(
+            {"_id": blob_name},
+            {
+                "$inc": {"ref_count": 1},
+                "$setOnInsert": {
+                    "size": size,
+                    "uploaded": False,
+                    "created_at": datetime.now(timezone.utc),
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        # A concurrent first upload may still be in flight; writing the same
+        # content again is harmless
+        return before is None or not before.get("uploaded")
+    
+    async def _release_reference(self, blob_name: str) -> bool:
+        """
+        Drop one use of a content-addressed blob
+        
+        Returns:
+            True if nothing references the blob any more
+        """
+        collection = mongo_db.get_blob_refs_collection()
+        after = await collection.find_one_and_update(
+            {"_id": blob_name},
+            {"$inc": {"ref_count": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if after is None:
+            # Untracked blob, nothing else can be using it
+            return True
+        if after["ref_count"] > 0:
+            return False
+        
+        # Only remove the record if no upload took a new reference meanwhile
+        result = await collection.delete_one({"_id": blob_name, "ref_count": {"$lte": 0}})
+        return result.deleted_count > 0
     
-    def delete_file(self, blob_url: str) -> bool:
+    async def upload_file(self, file_content: bytes, file_name: str, graduate_id: str) -> str:
         """
-        Delete file from Azure Storage by URL
+        Upload file to storage and return URL
+        
+        Args:
+            file_content: File bytes
+            file_name: Original filename
+            graduate_id: Graduate ID for organizing storage
+        
+        Returns:
+            Public URL of uploaded file
+        """
+        async def single_chunk():
+            yield file_content
+        
+        return await self.upload_stream(single_chunk(), file_name, graduate_id)
+    
+    async def upload_bytes(self, data: bytes, blob_name: str, content_type: str) -> str:
+        """Upload generated content under a fixed blob name and return URL"""
+        with observe_duration(STORAGE_UPLOAD_DURATION, backend=self.backend_name):
+            await self.backend.write_bytes(blob_name, data, content_type)
+        STORAGE_UPLOAD_BYTES.labels(self.backend_name).inc(len(data))
+        return self.backend.url_for(blob_name)
+    
+    def blob_name_from_url(self, blob_url: str) -> str:
+        """Extract the blob name from a URL produced by this storage"""
+        return self.backend.name_from_url(blob_url)
+    
+    async def download_file(self, blob_url: str) -> bytes:
+        """Download a blob by URL"""
+        return await self.backend.read(self.blob_name_from_url(blob_url))
+    
+    async def delete_file(self, blob_url: str) -> bool:
+        """
+        Delete file from storage by URL
         
         Args:
             blob_url: Full URL of the blob
@@ -80,25 +270,65 @@ class StorageService:
         """
         try:
             # Extract blob name from URL
-            blob_name = blob_url.split(f"{self.container_name}/")[1]
+            blob_name = self.blob_name_from_url(blob_url)
             
-            blob_client = self.blob_service_client.get_blob_client(
-                container=self.container_name,
-                blob=blob_name
-            )
-            blob_client.delete_blob()
+            # Shared content is only removed with its last reference
+            if blob_name.startswith(CONTENT_PREFIX):
+                if not await self._release_reference(blob_name):
+                    return True
+            
+            await self.backend.delete(blob_name)
             return True
             
         except Exception as e:
-            print(f"Error deleting file from Azure Storage: {e}")
+            print(f"Error deleting file from storage: {e}")
             return False
     
-    def get_blob_client(self, blob_name: str) -> BlobClient:
-        """Get blob client for specific blob"""
-        return self.blob_service_client.get_blob_client(
-            container=self.container_name,
-            blob=blob_name
-        )
+    async def delete_prefix(self, prefix: str, batch_size: int = 256) -> int:
+        """
+        Delete every blob whose name starts with prefix
+        
+        Names are deleted in batches while the listing continues, with at
+        most `settings.cleanup_blob_concurrency` batches in flight.
+        Content-addressed blobs are shared and never match a graduate
+        prefix; release them with delete_file instead.
+        
+        Returns:
+            Number of blobs deleted
+        """
+        if not prefix or prefix.startswith(CONTENT_PREFIX):
+            raise ValueError(f"Refusing to delete blob prefix: {prefix!r}")
+        
+        semaphore = asyncio.Semaphore(settings.cleanup_blob_concurrency)
+        
+        async def delete_batch(names: list) -> int:
+            async with semaphore:
+                return await self.backend.delete_many(names)
+        
+        tasks = []
+        batch = []
+        async for name in self.backend.list_names(prefix):
+            batch.append(name)
+            if len(batch) == batch_size:
+                tasks.append(asyncio.create_task(delete_batch(batch)))
+                batch = []
+        if batch:
+            tasks.append(asyncio.create_task(delete_batch(batch)))
+        
+        return sum(await asyncio.gather(*tasks))
+    
+    async def get_dedup_report(self) -> dict:
+        """Report stored vs. referenced bytes for content-addressed blobs"""
+        collection = mongo_db.get_blob_refs_collection()
+        report = {"blobs": 0, "references": 0, "stored_bytes": 0, "referenced_bytes": 0}
+        async for row in collection.aggregate(DEDUP_REPORT_PIPELINE):
+            report.update({key: value for key, value in row.items() if key != "_id"})
+        report["bytes_saved"] = report["referenced_bytes"] - report["stored_bytes"]
+        return report
+    
+    async def close(self) -> None:
+        """Close the storage backend"""
+        await self.backend.close()
 
 
 # Singleton instance
@@ -112,3 +342,11 @@ def get_storage_service() -> StorageService:
         _storage_service = StorageService()
     
     return _storage_service
+
+async def close_storage_service() -> None:
+    """Close the storage service if it was created"""
+    global _storage_service
+    
+    if _storage_service is not None:
+        await _storage_service.close()
+        _storage_service = None
@@ -0,0 +1,167 @@
+"""
+Daily LLM token accounting and budgets, per graduate and in total
+
+Every completion's tokens are added to today's (UTC) usage of its graduate
+and to the global usage. Before a completion, `tier_for` picks where it
+goes:
+
+- under both daily budgets: the primary deployment
+- over a budget: the economy deployment, if one is configured, until usage
+  reaches `chatbot_budget_hard_limit_factor` times the budget
+- otherwise: the question is answered locally
+
+A budget of 0 is unlimited. Usage is counted per process; with
+`token_usage_persist` it is also added to the `token_usage` collection
+(one document per graduate and day, plus a global one), and each write
+returns the totals of all workers, so budgets hold across replicas to
+within the requests already in flight.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import ReturnDocument
+from app.config import settings
+from app.database import mongo_db
+
+GLOBAL_KEY = "*"
+TIER_PRIMARY = "primary"
+TIER_ECONOMY = "economy"
+TIER_LOCAL = "local"
+USAGE_FIELDS = ("requests", "prompt_tokens", "completion_tokens", "cached_prompt_tokens")
+
+
+def _today() -> datetime:
+    now = datetime.now(timezone.utc)
+    return datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+
+
+def _empty_usage() -> dict:
+    return dict.fromkeys(USAGE_FIELDS, 0)
+
+
+def usage_id(day: datetime, key: str) -> str:
+    """_id of the token_usage document of a graduate (or GLOBAL_KEY) and day"""
+    return f"{day.date().isoformat()}:{key}"
+
+
+def _total(usage: dict) -> int:
+    return usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+class TokenBudget:
+    """Today's token usage and the deployment decision derived from it"""
+    
+    def __init__(self):
+        self._day: Optional[datetime] = None
+        # graduate_id (or GLOBAL_KEY) -> usage counters for self._day
+        self._usage: dict = {}
+        self.routed = dict.fromkeys((TIER_PRIMARY, TIER_ECONOMY, TIER_LOCAL), 0)
+    
+    def _roll(self) -> datetime:
+        """Start new counters when the UTC day changes"""
+        day = _today()
+        if day != self._day:
+            self._day = day
+            self._usage = {}
+        return day
+    
+    def _usage_of(self, key: str) -> dict:
+        usage = self._usage.get(key)
+        if usage is None:
+            usage = self._usage[key] = _empty_usage()
+        return usage
+    
+    def _budget_ratio(self, graduate_id: str) -> float:
+        """Largest fraction of a daily budget used (0 when unlimited)"""
+        ratio = 0.0
+        for key, budget in (
+            (graduate_id, settings.chatbot_daily_token_budget_per_graduate),
+            (GLOBAL_KEY, settings.chatbot_daily_token_budget_global),
+        ):
+            if budget > 0:
+                ratio = max(ratio, _total(self._usage_of(key)) / budget)
+        return ratio
+    
+    def tier_for(self, graduate_id: str) -> str:
+        """Where the graduate's next question goes: TIER_PRIMARY, TIER_ECONOMY or TIER_LOCAL"""
+        self._roll()
+        ratio = self._budget_ratio(graduate_id)
+        if ratio < 1:
+            tier = TIER_PRIMARY
+        elif settings.azure_openai_economy_deployment_name and ratio < settings.chatbot_budget_hard_limit_factor:
+            tier = TIER_ECONOMY
+        else:
+            tier = TIER_LOCAL
+        self.routed[tier] += 1
+        return tier
+    
+    async def record(self, graduate_id: str, prompt_tokens: int, completion_tokens: int,
+                     cached_prompt_tokens: int = 0) -> None:
+        """Add one completion's tokens to today's graduate and global usage"""
+        day = self._roll()
+        increments = {
+            "requests": 1,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_prompt_tokens": cached_prompt_tokens,
+        }
+        for key in (graduate_id, GLOBAL_KEY):
+            usage = self._usage_of(key)
+            for field, value in increments.items():
+                usage[field] += value
+        
+        if settings.token_usage_persist:
+            await self._persist(day, graduate_id, increments)
+    
+    async def _persist(self, day: datetime, graduate_id: str, increments: dict) -> None:
+        """Add the increments in MongoDB and adopt the totals of all workers"""
+        collection = mongo_db.get_token_usage_collection()
+        try:
+            documents = await asyncio.gather(*(
+                collection.find_one_and_update(
+                    {"_id": usage_id(day, key)},
+                    {
+                        "$inc": increments,
+                        "$setOnInsert": {"day": day, "graduate_id": None if key == GLOBAL_KEY else key},
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                for key in (graduate_id, GLOBAL_KEY)
+            ))
+        except Exception as e:
+            print(f"Error saving token usage: {e}")
+            return
+        
+        if day != self._day:
+            return
+        for key, document in zip((graduate_id, GLOBAL_KEY), documents):
+            usage = self._usage_of(key)
+            for field in USAGE_FIELDS:
+                usage[field] = max(usage[field], document.get(field, 0))
+    
+    def usage(self, graduate_id: str) -> dict:
+        """Today's usage of a graduate and its daily budget (0 = unlimited)"""
+        self._roll()
+        return {
+            "day": self._day.date().isoformat(),
+            **self._usage.get(graduate_id, _empty_usage()),
+            "budget": settings.chatbot_daily_token_budget_per_graduate,
+        }
+    
+    def stats(self) -> dict:
+        """Get today's global usage and routing counters"""
+        self._roll()
+        return {
+            "day": self._day.date().isoformat(),
+            **self._usage.get(GLOBAL_KEY, _empty_usage()),
+            "budget": settings.chatbot_daily_token_budget_global,
+            "graduates": len([key for key in self._usage if key != GLOBAL_KEY]),
+            "routed": dict(self.routed),
+            "persisted": settings.token_usage_persist,
+        }
+
+
+# Singleton instance
+token_budget = TokenBudget()
@@ -0,0 +1,70 @@
+"""
+Benchmark bulk invitation creation against a local mongod
+
+Creates invitations for growing guest lists in a scratch database and
+prints how the total time scales with the number of guests:
+
+    python -m benchmarks.bulk_invitations --mongo mongodb://localhost:27017 \
+        --sizes 10000,100000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+
+async def run(sizes: list) -> list:
+    """Time InvitationService.create_invitations for each guest list size"""
+    from app.database import mongo_db
+    from app.services.invitation_service import InvitationService
+
+    await mongo_db.connect()
+    collection = mongo_db.get_invitations_collection()
+    rows = []
+    try:
+        for size in sizes:
+            await collection.drop()
+            await mongo_db.ensure_indexes()
+            guest_names = [f"Guest {i}" for i in range(size)]
+
+            started = time.perf_counter()
+            results = await InvitationService.create_invitations("bench-graduate", guest_names)
+            elapsed = time.perf_counter() - started
+
+            created = sum(1 for item in results if item["status"] == "created")
+            rows.append({
+                "guests": size,
+                "created": created,
+                "seconds": elapsed,
+                "us_per_guest": elapsed / size * 1_000_000,
+            })
+        await collection.drop()
+    finally:
+        mongo_db.disconnect()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="invitation_benchmark")
+    parser.add_argument("--sizes", default="10000,100000")
+    args = parser.parse_args()
+
+    os.environ["MONGODB_CONNECTION_STRING"] = args.mongo
+    os.environ["MONGODB_DATABASE_NAME"] = args.database
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    rows = asyncio.run(run(sizes))
+
+    print(f"{'guests':>10} {'created':>10} {'seconds':>10} {'us/guest':>10}")
+    for row in rows:
+        print(
+            f"{row['guests']:>10} {row['created']:>10} "
+            f"{row['seconds']:>10.2f} {row['us_per_guest']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
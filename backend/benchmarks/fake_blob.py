@@ -0,0 +1,192 @@
+"""
+Local in-memory stand-in for Azure Blob Storage (Azurite-style)
+
+Implements the subset of the Blob REST API the app uses: create/get
+container, put blob, put block / block list, get/head/delete blob and list
+blobs. Requests are not authenticated. Start it and point the app at it:
+
+    python -m benchmarks.fake_blob --port 10100
+
+    AZURE_STORAGE_CONNECTION_STRING="DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey=ZmFrZQ==;BlobEndpoint=http://127.0.0.1:10100/devstoreaccount1;"
+"""
+
+import argparse
+import hashlib
+import re
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from fastapi import FastAPI, Request, Response
+
+app = FastAPI(title="Fake Azure Blob Storage")
+
+# container -> blob name -> {"data", "content_type", "etag", "last_modified"}
+containers: dict = {}
+# (container, blob name) -> block id -> bytes
+staged_blocks: dict = {}
+
+stats = {"requests": 0, "bytes_received": 0}
+
+
+def _headers(etag: str = None, last_modified: datetime = None) -> dict:
+    headers = {
+        "x-ms-request-id": str(uuid.uuid4()),
+        "x-ms-version": "2023-11-03",
+        "Date": format_datetime(datetime.now(timezone.utc), usegmt=True),
+    }
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def _error(status_code: int, code: str) -> Response:
+    body = f'<?xml version="1.0" encoding="utf-8"?><Error><Code>{code}</Code><Message>{code}</Message></Error>'
+    headers = _headers()
+    headers["x-ms-error-code"] = code
+    return Response(body, status_code=status_code, headers=headers, media_type="application/xml")
+
+
+def _store(container: str, blob: str, data: bytes, content_type: str) -> Response:
+    now = datetime.now(timezone.utc)
+    etag = f'"0x{hashlib.md5(data).hexdigest()[:16].upper()}"'
+    containers[container][blob] = {
+        "data": data,
+        "content_type": content_type or "application/octet-stream",
+        "etag": etag,
+        "last_modified": now,
+    }
+    headers = _headers(etag, now)
+    headers["x-ms-request-server-encrypted"] = "false"
+    return Response(status_code=201, headers=headers)
+
+
+def _blob_headers(entry: dict) -> dict:
+    headers = _headers(entry["etag"], entry["last_modified"])
+    headers.update({
+        "x-ms-blob-type": "BlockBlob",
+        "Content-Type": entry["content_type"],
+        "Accept-Ranges": "bytes",
+    })
+    return headers
+
+
+@app.api_route("/{account}/{container}", methods=["GET", "HEAD", "PUT", "DELETE"])
+async def container_operation(account: str, container: str, request: Request):
+    stats["requests"] += 1
+    params = request.query_params
+    if params.get("restype") != "container":
+        return _error(400, "InvalidQueryParameterValue")
+
+    if request.method == "PUT":
+        if container in containers:
+            return _error(409, "ContainerAlreadyExists")
+        containers[container] = {}
+        now = datetime.now(timezone.utc)
+        return Response(status_code=201, headers=_headers(f'"0x{uuid.uuid4().hex[:16].upper()}"', now))
+
+    if container not in containers:
+        return _error(404, "ContainerNotFound")
+
+    if request.method == "DELETE":
+        del containers[container]
+        return Response(status_code=202, headers=_headers())
+
+    if params.get("comp") == "list":
+        prefix = params.get("prefix", "")
+        items = []
+        for name, entry in sorted(containers[container].items()):
+            if not name.startswith(prefix):
+                continue
+            items.append(
+                f"<Blob><Name>{escape(name)}</Name><Properties>"
+                f"<Last-Modified>{format_datetime(entry['last_modified'], usegmt=True)}</Last-Modified>"
+                f"<Etag>{entry['etag']}</Etag>"
+                f"<Content-Length>{len(entry['data'])}</Content-Length>"
+                f"<Content-Type>{escape(entry['content_type'])}</Content-Type>"
+                f"<BlobType>BlockBlob</BlobType></Properties></Blob>"
+            )
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>'
+            f'<EnumerationResults ServiceEndpoint="{escape(str(request.base_url))}" ContainerName="{escape(container)}">'
+            f"<Prefix>{escape(prefix)}</Prefix><Blobs>{''.join(items)}</Blobs><NextMarker /></EnumerationResults>"
+        )
+        return Response(body, headers=_headers(), media_type="application/xml")
+
+    return Response(status_code=200, headers=_headers('"0x0"', datetime.now(timezone.utc)))
+
+
+@app.api_route("/{account}/{container}/{blob:path}", methods=["GET", "HEAD", "PUT", "DELETE"])
+async def blob_operation(account: str, container: str, blob: str, request: Request):
+    stats["requests"] += 1
+    params = request.query_params
+    if container not in containers:
+        return _error(404, "ContainerNotFound")
+    blobs = containers[container]
+
+    if request.method == "PUT":
+        body = await request.body()
+        stats["bytes_received"] += len(body)
+        comp = params.get("comp")
+        if comp == "block":
+            staged_blocks.setdefault((container, blob), {})[params["blockid"]] = body
+            return Response(status_code=201, headers=_headers())
+        if comp == "blocklist":
+            blocks = staged_blocks.pop((container, blob), {})
+            ids = [element.text for element in ElementTree.fromstring(body)]
+            if any(block_id not in blocks for block_id in ids):
+                return _error(400, "InvalidBlockList")
+            content_type = request.headers.get("x-ms-blob-content-type")
+            return _store(container, blob, b"".join(blocks[block_id] for block_id in ids), content_type)
+        return _store(container, blob, body, request.headers.get("x-ms-blob-content-type"))
+
+    entry = blobs.get(blob)
+    if entry is None:
+        return _error(404, "BlobNotFound")
+
+    if request.method == "DELETE":
+        del blobs[blob]
+        return Response(status_code=202, headers=_headers())
+
+    headers = _blob_headers(entry)
+    data = entry["data"]
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(len(data))
+        return Response(status_code=200, headers=headers)
+
+    range_header = request.headers.get("x-ms-range") or request.headers.get("range")
+    match = re.match(r"bytes=(\d+)-(\d*)", range_header or "")
+    if match and data:
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(data) - 1, len(data) - 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(data[start:end + 1], status_code=206, headers=headers)
+    return Response(data, status_code=200, headers=headers)
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        **stats,
+        "containers": len(containers),
+        "blobs": sum(len(blobs) for blobs in containers.values()),
+        "bytes_stored": sum(len(e["data"]) for blobs in containers.values() for e in blobs.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10100)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
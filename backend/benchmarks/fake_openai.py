@@ -0,0 +1,152 @@
+"""
+Local stand-in for the Azure OpenAI chat completions API
+
+Serves /openai/deployments/{deployment}/chat/completions with configurable
+latency and injected 429/5xx errors, with and without streaming, so the
+chatbot can be exercised offline:
+
+    python -m benchmarks.fake_openai --port 9100 --latency 0.8 --rate-limit 0.1
+
+then run the API with AZURE_OPENAI_ENDPOINT=http://localhost:9100.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake Azure OpenAI")
+
+# Overridden from the command line (or by callers embedding the app)
+config = {
+    "latency": 0.5,
+    "token_delay": 0.02,
+    "rate_limit": 0.0,
+    "server_error": 0.0,
+    "retry_after": 1.0,
+    "answer": "Lễ tốt nghiệp sẽ diễn ra đúng giờ như trong thiệp mời. Hẹn gặp bạn tại buổi lễ!",
+}
+
+stats = {"requests": 0, "rate_limited": 0, "server_errors": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+def _completion_id() -> str:
+    return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+
+def _prompt_tokens(messages: list) -> int:
+    return sum(len(message.get("content") or "") for message in messages) // 4
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    roll = random.random()
+    if roll < config["rate_limit"]:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"code": "429", "message": "Rate limit exceeded"}},
+            status_code=429,
+            headers={"Retry-After": str(config["retry_after"])}
+        )
+    if roll < config["rate_limit"] + config["server_error"]:
+        stats["server_errors"] += 1
+        return JSONResponse({"error": {"code": "500", "message": "Internal error"}}, status_code=500)
+
+    completion_id = _completion_id()
+    created = int(time.time())
+    words = config["answer"].split(" ")
+    prompt_tokens = _prompt_tokens(body.get("messages", []))
+
+    if body.get("stream"):
+        async def events():
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                await asyncio.sleep(config["latency"])
+                for index, word in enumerate(words):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": deployment,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": word if index == 0 else " " + word},
+                            "finish_reason": None,
+                        }],
+                    }
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                    await asyncio.sleep(config["token_delay"])
+                yield "data: [DONE]\n\n"
+            finally:
+                stats["in_flight"] -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep(config["latency"] + config["token_delay"] * len(words))
+    finally:
+        stats["in_flight"] -= 1
+
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": deployment,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": config["answer"]},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        },
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=config["latency"],
+                        help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=config["token_delay"],
+                        help="Seconds between streamed tokens")
+    parser.add_argument("--rate-limit", type=float, default=config["rate_limit"],
+                        help="Fraction of requests answered with 429")
+    parser.add_argument("--server-error", type=float, default=config["server_error"],
+                        help="Fraction of requests answered with 500")
+    parser.add_argument("--retry-after", type=float, default=config["retry_after"])
+    args = parser.parse_args()
+
+    config.update(
+        latency=args.latency,
+        token_delay=args.token_delay,
+        rate_limit=args.rate_limit,
+        server_error=args.server_error,
+        retry_after=args.retry_after,
+    )
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Evaluate and benchmark the local chatbot intent answerer
+
+Scores the keyword classifier against the labeled questions in
+data/intent_eval.jsonl and times local answers. With --url and
+--graduate-id it also times POST /api/graduates/{id}/chat on a running
+server, split by whether the question was served locally or by the LLM:
+
+    python -m benchmarks.intent_answerer
+    python -m benchmarks.intent_answerer --url http://localhost:8000 --graduate-id <id>
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+EVAL_SET = Path(__file__).parent / "data" / "intent_eval.jsonl"
+
+SAMPLE_GRADUATE = {
+    "_id": "benchmark",
+    "name": "Thái Quang",
+    "graduation_datetime": datetime(2025, 12, 20, 10, 0),
+    "venue": {"name": "University Auditorium", "address": "123 Main St", "parking": "Lot B"},
+    "contact": {"email": "thai@example.com", "phone": "+84912345678"},
+}
+
+
+def load_eval_set() -> list:
+    with open(EVAL_SET, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(answerer, rows: list, repeat: int) -> dict:
+    """Score classification and time local answers"""
+    correct = 0
+    served = 0
+    false_local = 0
+    for row in rows:
+        predicted = answerer.classify(row["question"])
+        correct += sorted(predicted) == sorted(row["intents"])
+        served += bool(predicted)
+        false_local += bool(predicted) and not row["intents"]
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for row in rows:
+            answerer.answer(SAMPLE_GRADUATE, row["question"])
+    per_question_us = (time.perf_counter() - started) / (repeat * len(rows)) * 1_000_000
+
+    return {
+        "questions": len(rows),
+        "accuracy": correct / len(rows),
+        "served_locally": served,
+        "served_ratio": served / len(rows),
+        "open_ended_answered_locally": false_local,
+        "local_answer_us": per_question_us,
+    }
+
+
+def time_endpoint(answerer, rows: list, url: str, graduate_id: str) -> dict:
+    """Time the chat endpoint for locally served vs. LLM-served questions"""
+    import httpx
+
+    timings = {"local": [], "llm": []}
+    with httpx.Client(base_url=url, timeout=60.0) as client:
+        for row in rows:
+            source = "local" if answerer.classify(row["question"]) else "llm"
+            started = time.perf_counter()
+            client.post(f"/api/graduates/{graduate_id}/chat", json={"message": row["question"]})
+            timings[source].append((time.perf_counter() - started) * 1000)
+
+    return {
+        f"{source}_mean_ms": statistics.fmean(samples) if samples else 0.0
+        for source, samples in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--url")
+    parser.add_argument("--graduate-id")
+    args = parser.parse_args()
+
+    # Settings requires a database URL even though none is used here
+    os.environ.setdefault("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017")
+    from app.services.intent_answerer import IntentAnswerer
+
+    answerer = IntentAnswerer()
+    rows = load_eval_set()
+    result = evaluate(answerer, rows, args.repeat)
+    if args.url and args.graduate_id:
+        result.update(time_endpoint(answerer, rows, args.url, args.graduate_id))
+
+    for key, value in result.items():
+        print(f"{key:>28}: {value:.3f}" if isinstance(value, float) else f"{key:>28}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+Offline load test of the API against local stand-ins for its services
+
+Starts, on one machine:
+
+- MongoDB: a throwaway mongod on a temporary data directory (or an
+  existing server given with --mongo; a scratch database is used and
+  dropped afterwards)
+- benchmarks.fake_openai with the configured completion latency
+- benchmarks.fake_blob as Azure Blob Storage
+- the API itself (uvicorn app.main:app) pointed at all three
+
+then seeds graduates and invitations through the API and drives these
+workloads, first one at a time and then all together:
+
+- verify: a guest-opening surge on POST /api/invitations/verify (mostly
+  issued codes, some mistyped)
+- chat: bursts of chat and chat/stream questions
+- invitations: bulk invitation creation
+- admin_list: paged graduate and invitation list refreshes
+- upload: photo uploads
+
+Throughput and latency percentiles are printed and written as JSON, and a
+previous result file can be passed to --compare:
+
+    python -m benchmarks.load_test --output before.json
+    python -m benchmarks.load_test --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from benchmarks.verify_latency import percentile
+
+QUESTIONS = [
+    # Answered from the graduate document when local answers are on
+    "Lễ tốt nghiệp diễn ra lúc mấy giờ?",
+    "Địa điểm tổ chức ở đâu?",
+    "Có chỗ đậu xe không?",
+    # Always reach the model
+    "Tôi nên mặc trang phục gì khi đến dự lễ?",
+    "Tôi có thể mang hoa vào hội trường không?",
+    "Buổi lễ kéo dài bao lâu?",
+    "Sau buổi lễ có tiệc không?",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=0.5)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start")
+
+
+def wait_for_mongo(url: str, timeout: float = 30.0) -> None:
+    from pymongo import MongoClient
+
+    client = MongoClient(url, serverSelectionTimeoutMS=int(timeout * 1000))
+    try:
+        client.admin.command("ping")
+    finally:
+        client.close()
+
+
+def sample_jpeg(size: int = 256) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (random.randrange(256), 120, 200)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Recorder:
+    """Latencies and status codes of one workload"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.transport_errors = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        total = len(latencies)
+        errors = self.transport_errors + sum(
+            count for code, count in self.statuses.items() if code >= 500
+        )
+        return {
+            "requests": total,
+            "errors": errors,
+            "statuses": {str(code): count for code, count in sorted(self.statuses.items())},
+            "throughput_rps": total / self.elapsed if self.elapsed else 0.0,
+            "mean_ms": sum(latencies) / total if total else 0.0,
+            "p50_ms": percentile(latencies, 50),
+            "p90_ms": percentile(latencies, 90),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+        }
+
+
+class Workloads:
+    """Request generators for each workload, over the seeded data"""
+
+    def __init__(self, graduate_ids: list, codes: list, bulk_size: int, photo: bytes):
+        self.graduate_ids = graduate_ids
+        self.codes = codes
+        self.bulk_size = bulk_size
+        self.photo = photo
+
+    async def verify(self, client: httpx.AsyncClient) -> httpx.Response:
+        if random.random() < 0.9:
+            code = random.choice(self.codes)
+        else:
+            code = "".join(random.choice("0123456789") for _ in range(len(self.codes[0])))
+        return await client.post("/api/invitations/verify", json={"invitation_code": code})
+
+    async def chat(self, client: httpx.AsyncClient) -> httpx.Response:
+        graduate_id = random.choice(self.graduate_ids)
+        body = {"message": random.choice(QUESTIONS)}
+        if random.random() < 0.5:
+            return await client.post(f"/api/graduates/{graduate_id}/chat", json=body)
+        # A stream only counts as done once the last event arrived
+        async with client.stream("POST", f"/api/graduates/{graduate_id}/chat/stream", json=body) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        return response
+
+    async def invitations(self, client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post("/api/invitations", json={
+            "graduate_id": random.choice(self.graduate_ids),
+            "guest_names": [f"Khách {uuid.uuid4().hex[:8]}" for _ in range(self.bulk_size)],
+        })
+
+    async def admin_list(self, client: httpx.AsyncClient) -> httpx.Response:
+        if random.random() < 0.5:
+            return await client.get("/api/graduates", params={"limit": 50})
+        return await client.get("/api/invitations", params={
+            "graduate_id": random.choice(self.graduate_ids),
+            "limit": 100,
+        })
+
+    async def upload(self, client: httpx.AsyncClient) -> httpx.Response:
+        graduate_id = random.choice(self.graduate_ids)
+        return await client.post(
+            f"/api/graduates/{graduate_id}/photos",
+            files={"file": ("photo.jpg", self.photo, "image/jpeg")},
+        )
+
+
+async def drive(client: httpx.AsyncClient, request, total: int, concurrency: int) -> Recorder:
+    """Send `total` requests with at most `concurrency` in flight"""
+    recorder = Recorder()
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await request(client)
+                recorder.statuses[response.status_code] += 1
+            except httpx.HTTPError:
+                recorder.transport_errors += 1
+            recorder.latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    recorder.elapsed = time.perf_counter() - started
+    return recorder
+
+
+async def seed(client: httpx.AsyncClient, graduates: int, guests: int) -> tuple:
+    """Create graduates and their invitations; returns (graduate ids, codes)"""
+    start = datetime.now(timezone.utc) + timedelta(days=30)
+
+    async def create_graduate(index: int) -> str:
+        response = await client.post("/api/graduates", json={
+            "name": f"Nguyễn Văn {index}",
+            "degree": "Bachelor of Science",
+            "department": "Computer Science",
+            "graduation_datetime": (start + timedelta(minutes=index)).isoformat(),
+            "venue": {"name": "Hội trường A", "address": "123 Main St", "parking": "Lot B"},
+            "contact": {"email": f"graduate{index}@example.com", "phone": "+84912345678"},
+        })
+        response.raise_for_status()
+        return response.json()["graduate_id"]
+
+    graduate_ids = await asyncio.gather(*(create_graduate(index) for index in range(graduates)))
+
+    async def create_invitations(graduate_id: str) -> list:
+        response = await client.post("/api/invitations", json={
+            "graduate_id": graduate_id,
+            "guest_names": [f"Khách mời {index}" for index in range(guests)],
+        })
+        response.raise_for_status()
+        return [item["invitation_code"] for item in response.json()["invitations"]]
+
+    code_lists = await asyncio.gather(*(create_invitations(graduate_id) for graduate_id in graduate_ids))
+    return list(graduate_ids), [code for codes in code_lists for code in codes]
+
+
+async def run(api_url: str, args, openai_url: str) -> dict:
+    plan = {
+        "verify": (args.verify_requests, args.verify_concurrency),
+        "chat": (args.chat_requests, args.chat_concurrency),
+        "invitations": (args.invitation_requests, args.invitation_concurrency),
+        "admin_list": (args.list_requests, args.list_concurrency),
+        "upload": (args.upload_requests, args.upload_concurrency),
+    }
+    connections = sum(concurrency for _, concurrency in plan.values())
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=60.0) as client:
+        graduate_ids, codes = await seed(client, args.graduates, args.guests)
+        workloads = Workloads(graduate_ids, codes, args.bulk_size, sample_jpeg())
+
+        isolated = {}
+        for name, (total, concurrency) in plan.items():
+            if total > 0:
+                recorder = await drive(client, getattr(workloads, name), total, concurrency)
+                isolated[name] = recorder.summary()
+
+        names = [name for name, (total, _) in plan.items() if total > 0]
+        started = time.perf_counter()
+        recorders = await asyncio.gather(*(
+            drive(client, getattr(workloads, name), *plan[name]) for name in names
+        ))
+        mixed = {name: recorder.summary() for name, recorder in zip(names, recorders)}
+        mixed_elapsed = time.perf_counter() - started
+
+        server = {}
+        for key, path in (("verify", "/api/invitations/verify/stats"), ("chat", "/api/graduates/chat/stats")):
+            response = await client.get(path)
+            if response.status_code == 200:
+                server[key] = response.json()
+
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        server["fake_openai"] = (await client.get(f"{openai_url}/stats")).json()
+
+    return {
+        "seed": {"graduates": len(graduate_ids), "invitations": len(codes)},
+        "isolated": isolated,
+        "mixed": mixed,
+        "mixed_seconds": mixed_elapsed,
+        "server": server,
+    }
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    header = f"{'phase':>8} {'workload':>12} {'req':>6} {'err':>5} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'Δ req/s':>9} {'Δ p99':>9}"
+    print(header)
+    for phase in ("isolated", "mixed"):
+        for name, row in results[phase].items():
+            line = (
+                f"{phase:>8} {name:>12} {row['requests']:>6} {row['errors']:>5} "
+                f"{row['throughput_rps']:>9.1f} {row['p50_ms']:>9.1f} {row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+            )
+            previous = (baseline or {}).get(phase, {}).get(name)
+            if previous:
+                line += f" {change(previous['throughput_rps'], row['throughput_rps']):>9} {change(previous['p99_ms'], row['p99_ms']):>9}"
+            print(line)
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mongo", help="Use this MongoDB server instead of starting mongod")
+    parser.add_argument("--mongod", default="mongod", help="mongod binary to start")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--graduates", type=int, default=50)
+    parser.add_argument("--guests", type=int, default=200, help="Seeded invitations per graduate")
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-token-delay", type=float, default=0.02)
+    parser.add_argument("--verify-requests", type=int, default=5000)
+    parser.add_argument("--verify-concurrency", type=int, default=200)
+    parser.add_argument("--chat-requests", type=int, default=300)
+    parser.add_argument("--chat-concurrency", type=int, default=50)
+    parser.add_argument("--invitation-requests", type=int, default=50)
+    parser.add_argument("--invitation-concurrency", type=int, default=5)
+    parser.add_argument("--bulk-size", type=int, default=500, help="Guests per bulk invitation request")
+    parser.add_argument("--list-requests", type=int, default=500)
+    parser.add_argument("--list-concurrency", type=int, default=10)
+    parser.add_argument("--upload-requests", type=int, default=100)
+    parser.add_argument("--upload-concurrency", type=int, default=10)
+    parser.add_argument("--rate-limit", action="store_true",
+                        help="Keep rate limiting on (all load comes from one address)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=f"load-test-{datetime.now():%Y%m%d-%H%M%S}.json")
+    parser.add_argument("--compare", help="Previous result file to compare against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    started_at = datetime.now(timezone.utc)
+    processes = []
+    scratch = []
+    database = f"loadtest_{uuid.uuid4().hex[:8]}"
+    try:
+        mongo_url = args.mongo
+        if mongo_url is None:
+            data_dir = tempfile.mkdtemp(prefix="load-test-mongo-")
+            scratch.append(data_dir)
+            mongo_port = free_port()
+            processes.append(subprocess.Popen(
+                [args.mongod, "--dbpath", data_dir, "--port", str(mongo_port), "--bind_ip", "127.0.0.1", "--quiet"],
+                stdout=subprocess.DEVNULL,
+            ))
+            mongo_url = f"mongodb://127.0.0.1:{mongo_port}"
+        wait_for_mongo(mongo_url)
+
+        openai_url = f"http://127.0.0.1:{free_port()}"
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", openai_url.rsplit(":", 1)[1],
+            "--latency", str(args.openai_latency),
+            "--token-delay", str(args.openai_token_delay),
+        ]))
+        blob_url = f"http://127.0.0.1:{free_port()}"
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.fake_blob", "--port", blob_url.rsplit(":", 1)[1],
+        ]))
+        wait_until_ready(f"{openai_url}/stats")
+        wait_until_ready(f"{blob_url}/stats")
+
+        api_port = free_port()
+        env = dict(
+            os.environ,
+            MONGODB_CONNECTION_STRING=mongo_url,
+            MONGODB_DATABASE_NAME=database,
+            AZURE_OPENAI_ENDPOINT=openai_url,
+            AZURE_OPENAI_API_KEY="load-test",
+            AZURE_OPENAI_DEPLOYMENT_NAME="load-test",
+            AZURE_STORAGE_CONNECTION_STRING=(
+                "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey=ZmFrZQ==;"
+                f"BlobEndpoint={blob_url}/devstoreaccount1;"
+            ),
+            STORAGE_BACKEND="azure",
+            RATE_LIMIT_ENABLED="true" if args.rate_limit else "false",
+        )
+        processes.append(subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(api_port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ],
+            env=env,
+        ))
+        api_url = f"http://127.0.0.1:{api_port}"
+        wait_until_ready(f"{api_url}/health")
+
+        results = asyncio.run(run(api_url, args, openai_url))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        if args.mongo:
+            from pymongo import MongoClient
+
+            client = MongoClient(args.mongo)
+            client.drop_database(database)
+            client.close()
+        for path in scratch:
+            shutil.rmtree(path, ignore_errors=True)
+
+    results = {
+        "started_at": started_at.isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "config": vars(args),
+        **results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Measure the per-request cost of the metrics instrumentation
+
+Times, in-process and without network or database:
+
+- middleware: MetricsMiddleware around a no-op ASGI app, routed against the
+  real API's route table (path template lookup + histogram + gauge),
+  minus the same app called bare
+- request: GET /health through the full API with and without metrics
+- mongo: one started/succeeded pair through MongoCommandListener
+- observe: one observe_duration block (LLM and storage timings)
+
+    python -m benchmarks.metrics_overhead --requests 20000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+
+def http_scope(app, path: str, method: str = "GET") -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+        "app": app,
+    }
+
+
+async def receive() -> dict:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message) -> None:
+    pass
+
+
+async def noop_app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def time_asgi(asgi_app, scopes: list, requests: int) -> float:
+    """Microseconds per request, cycling through scopes"""
+    started = time.perf_counter()
+    for index in range(requests):
+        # Routing mutates the scope, so every call gets a fresh copy
+        await asgi_app(dict(scopes[index % len(scopes)]), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def time_listener(events: int) -> float:
+    from app.metrics import MongoCommandListener
+
+    listener = MongoCommandListener()
+    batch = [{"_id": index} for index in range(20)]
+    started = time.perf_counter()
+    for index in range(events):
+        listener.started(SimpleNamespace(
+            command_name="find",
+            command={"find": "invitations", "filter": {}},
+            connection_id=("localhost", 27017),
+            request_id=index,
+        ))
+        listener.succeeded(SimpleNamespace(
+            command_name="find",
+            reply={"cursor": {"firstBatch": batch, "id": 0}, "ok": 1},
+            connection_id=("localhost", 27017),
+            request_id=index,
+            duration_micros=800,
+        ))
+    return (time.perf_counter() - started) / events * 1e6
+
+
+def time_observe(blocks: int) -> float:
+    from app.metrics import LLM_REQUEST_DURATION, observe_duration
+
+    started = time.perf_counter()
+    for _ in range(blocks):
+        with observe_duration(LLM_REQUEST_DURATION, operation="complete"):
+            pass
+    return (time.perf_counter() - started) / blocks * 1e6
+
+
+async def run(requests: int) -> list:
+    from app.main import app
+    from app.middleware import MetricsMiddleware
+
+    # An early and a late route, plus a 404, so the template lookup is not
+    # measured only in its best case
+    paths = ["/api/graduates", "/health", "/no-such-route"]
+    scopes = [http_scope(app, path) for path in paths]
+
+    bare = await time_asgi(noop_app, scopes, requests)
+    wrapped = await time_asgi(MetricsMiddleware(noop_app), scopes, requests)
+
+    health = [http_scope(app, "/health")]
+    instrumented = await time_asgi(app, health, requests)
+    app.user_middleware = [item for item in app.user_middleware if item.cls is not MetricsMiddleware]
+    app.middleware_stack = app.build_middleware_stack()
+    uninstrumented = await time_asgi(app, health, requests)
+
+    return [
+        ("middleware", wrapped - bare),
+        ("request (GET /health)", instrumented - uninstrumented),
+        ("  baseline request", uninstrumented),
+        ("mongo command", time_listener(requests)),
+        ("observe_duration", time_observe(requests)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ["METRICS_ENABLED"] = "true"
+    # Settings requires a database URL even though none is used here
+    os.environ.setdefault("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017")
+
+    rows = asyncio.run(run(args.requests))
+    print(f"{'measurement':>24} {'µs/op':>8}")
+    for label, micros in rows:
+        print(f"{label:>24} {micros:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark concurrent photo uploads against the local blob stand-in
+
+Starts benchmarks.fake_blob in a subprocess, then pushes N concurrent
+uploads through StorageService twice: buffered (the whole file read into
+memory first, as the upload route used to do) and streamed (chunks fed as
+they arrive). Reports throughput and peak Python heap for each mode:
+
+    python -m benchmarks.photo_upload --uploads 50 --size-mb 4
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+READ_CHUNK = 64 * 1024
+
+
+async def run_mode(storage, payload: bytes, uploads: int, streamed: bool) -> float:
+    """Run `uploads` concurrent uploads and return elapsed seconds"""
+
+    async def chunks(data):
+        view = memoryview(data)
+        for start in range(0, len(view), READ_CHUNK):
+            await asyncio.sleep(0)
+            yield bytes(view[start:start + READ_CHUNK])
+
+    async def upload(index: int):
+        if streamed:
+            source = chunks(payload)
+        else:
+            # Old route: `await file.read()` materialized the whole file
+            buffered = b"".join([chunk async for chunk in chunks(payload)])
+
+            async def single():
+                yield buffered
+            source = single()
+        await storage.upload_stream(source, f"photo-{index}.jpg", "benchmark")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(upload(index) for index in range(uploads)))
+    return time.perf_counter() - started
+
+
+async def run(uploads: int, size: int) -> list:
+    from app.services.storage_service import StorageService
+
+    payload = os.urandom(size)
+    rows = []
+    for streamed in (False, True):
+        storage = StorageService()
+        try:
+            elapsed = await run_mode(storage, payload, uploads, streamed)
+
+            tracemalloc.start()
+            await run_mode(storage, payload, uploads, streamed)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            await storage.close()
+
+        rows.append({
+            "mode": "streamed" if streamed else "buffered",
+            "uploads_per_s": uploads / elapsed,
+            "mb_per_s": uploads * size / elapsed / 1024 / 1024,
+            "peak_heap_mb": peak / 1024 / 1024,
+        })
+    return rows
+
+
+def wait_until_ready(url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/stats", timeout=0.5)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("Blob stand-in did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--port", type=int, default=10100)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    os.environ["AZURE_STORAGE_CONNECTION_STRING"] = (
+        "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey=ZmFrZQ==;"
+        f"BlobEndpoint={url}/devstoreaccount1;"
+    )
+    # Every upload sends the same payload; measure transfers, not deduplication
+    os.environ["AZURE_STORAGE_DEDUPLICATE"] = "false"
+    # Settings requires a database URL even though deduplication is off
+    os.environ.setdefault("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017")
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_blob", "--port", str(args.port)]
+    )
+    try:
+        wait_until_ready(url)
+        rows = asyncio.run(run(args.uploads, int(args.size_mb * 1024 * 1024)))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'mode':>10} {'uploads/s':>10} {'MB/s':>10} {'peak heap MB':>13}")
+    for row in rows:
+        print(
+            f"{row['mode']:>10} {row['uploads_per_s']:>10.1f} "
+            f"{row['mb_per_s']:>10.1f} {row['peak_heap_mb']:>13.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
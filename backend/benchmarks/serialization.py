@@ -0,0 +1,127 @@
+"""
+Micro-benchmark JSON serialization of list responses
+
+Builds raw Mongo documents (ObjectId `_id`, datetimes) for 10k graduates
+and 100k invitations and times three encodings of each list:
+
+- legacy: `doc["_id"] = str(...)` loop + jsonable_encoder + json.dumps,
+  the path list routes took with `response_model=list`
+- typed: the typed response model through query.model_response
+- ndjson: the streaming encoder, one orjson line per document
+
+    python -m benchmarks.serialization --graduates 10000 --invitations 100000
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+
+def make_graduates(count: int) -> list:
+    start = datetime(2025, 12, 20, 8, 0)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"Nguyễn Văn {index}",
+            "degree": "Bachelor of Science",
+            "department": "Computer Science",
+            "graduation_datetime": start + timedelta(minutes=index),
+            "venue": {"name": "Hội trường A", "address": "123 Main St", "parking": "Lot B"},
+            "invitation_template": None,
+            "contact": {"email": f"graduate{index}@example.com", "phone": "+84912345678"},
+            "photo_urls": [f"https://example.com/content/{index:064x}.jpg"],
+        }
+        for index in range(count)
+    ]
+
+
+def make_invitations(count: int, graduate_ids: list) -> list:
+    return [
+        {
+            "_id": ObjectId(),
+            "invitation_code": f"{index:08d}",
+            "graduate_id": str(graduate_ids[index % len(graduate_ids)]),
+            "guest_name": f"Khách mời {index}",
+        }
+        for index in range(count)
+    ]
+
+
+def encode_legacy(documents: list) -> bytes:
+    from fastapi.encoders import jsonable_encoder
+
+    converted = []
+    for doc in documents:
+        doc = dict(doc)
+        doc["_id"] = str(doc["_id"])
+        converted.append(doc)
+    return json.dumps(jsonable_encoder(converted), ensure_ascii=False).encode()
+
+
+def encode_typed(adapter):
+    from app.services.query import model_response
+
+    def encode(documents: list) -> bytes:
+        return model_response(adapter, documents).body
+    return encode
+
+
+def encode_ndjson(documents: list) -> bytes:
+    import orjson
+    from app.services.query import _json_default
+
+    return b"".join(
+        orjson.dumps(doc, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+        for doc in documents
+    )
+
+
+def time_encoder(encode, documents: list, repeat: int) -> tuple:
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(encode(documents))
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--graduates", type=int, default=10000)
+    parser.add_argument("--invitations", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from pydantic import TypeAdapter
+    from app.models.schemas import GraduateResponse, InvitationResponse
+
+    graduates = make_graduates(args.graduates)
+    invitations = make_invitations(args.invitations, [doc["_id"] for doc in graduates])
+    datasets = [
+        ("graduates", graduates, TypeAdapter(list[GraduateResponse])),
+        ("invitations", invitations, TypeAdapter(list[InvitationResponse])),
+    ]
+
+    print(f"{'dataset':>12} {'encoder':>8} {'ms':>9} {'MB':>7} {'speedup':>8}")
+    for label, documents, adapter in datasets:
+        baseline = None
+        for name, encode in (
+            ("legacy", encode_legacy),
+            ("typed", encode_typed(adapter)),
+            ("ndjson", encode_ndjson),
+        ):
+            seconds, size = time_encoder(encode, documents, args.repeat)
+            baseline = baseline or seconds
+            print(
+                f"{label:>12} {name:>8} {seconds * 1000:>9.1f} "
+                f"{size / 1024 / 1024:>7.1f} {baseline / seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Measure cold-start cost of the API for different feature sets
+
+For each ENABLED_FEATURES profile, in fresh interpreters:
+
+- import: seconds to `import app.main`, and which heavy SDKs that pulled in
+- ready: seconds from spawning uvicorn to the first 200 from /health
+  (startup connects to --mongo and checks its indexes)
+
+    python -m benchmarks.startup_time --mongo mongodb://localhost:27017
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+PROFILES = {
+    "all": "graduates,invitations,chatbot,files",
+    "guest": "invitations,chatbot",
+    "verify": "invitations",
+    "admin": "graduates,invitations,files",
+}
+
+# SDKs the lazy loading keeps out of replicas that do not need them
+HEAVY_MODULES = ("openai", "httpx", "azure.storage.blob", "PIL", "pymongo", "prometheus_client")
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def profile_env(features: str, mongo: str) -> dict:
+    return dict(os.environ, ENABLED_FEATURES=features, MONGODB_CONNECTION_STRING=mongo)
+
+
+def time_import(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def time_ready(env: dict, timeout: float = 60.0) -> float:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"API did not become ready within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--profiles", default=",".join(PROFILES),
+                        help=f"Comma-separated subset of: {', '.join(PROFILES)}")
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'import s':>9} {'ready s':>8}  modules")
+    for name in args.profiles.split(","):
+        env = profile_env(PROFILES[name], args.mongo)
+        imports = [time_import(env) for _ in range(args.repeat)]
+        ready = [time_ready(env) for _ in range(args.repeat)]
+        print(
+            f"{name:>8} {statistics.median(row['seconds'] for row in imports):>9.3f} "
+            f"{statistics.median(ready):>8.3f}  {', '.join(imports[-1]['modules'])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
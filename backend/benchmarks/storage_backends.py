@@ -0,0 +1,202 @@
+"""
+Conformance checks and timings shared by every storage backend
+
+Runs the same write/read/list/delete round-trips against the Azure engine
+(pointed at benchmarks.fake_blob) and the local-disk engine (a temporary
+directory), then times concurrent writes and reads of identical payloads.
+For the local engine it also fetches blobs through the /files route to
+check ETag revalidation and byte ranges:
+
+    python -m benchmarks.storage_backends --blobs 50 --size-mb 2
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.photo_upload import wait_until_ready
+
+READ_CHUNK = 64 * 1024
+
+
+def check(condition: bool, message: str) -> None:
+    if not condition:
+        raise AssertionError(message)
+
+
+async def chunks(data: bytes):
+    view = memoryview(data)
+    for start in range(0, len(view), READ_CHUNK):
+        yield bytes(view[start:start + READ_CHUNK])
+
+
+async def conformance(backend, prefix: str) -> None:
+    """Behaviour every engine must share"""
+    payload = os.urandom(3 * READ_CHUNK + 17)
+    name = f"{prefix}/conformance/photo one.jpg"
+
+    await backend.write(name, chunks(payload), "image/jpeg")
+    check(await backend.read(name) == payload, "streamed write does not round-trip")
+
+    await backend.write_bytes(name, b"replaced", "image/jpeg")
+    check(await backend.read(name) == b"replaced", "write does not replace")
+
+    url = backend.url_for(name)
+    check(backend.name_from_url(url) == name, "url_for/name_from_url disagree")
+
+    await backend.write_bytes(f"{prefix}/conformance/other.jpg", b"x")
+    names = [listed async for listed in backend.list_names(f"{prefix}/conformance/")]
+    check(names == sorted(names), "list_names is not sorted")
+    check(set(names) == {name, f"{prefix}/conformance/other.jpg"}, f"unexpected listing {names}")
+
+    for listed in names:
+        await backend.delete(listed)
+    try:
+        await backend.read(name)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("read after delete succeeded")
+    try:
+        await backend.delete(name)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("deleting a missing blob succeeded")
+
+
+async def timing(backend, prefix: str, blobs: int, size: int) -> dict:
+    payload = os.urandom(size)
+    names = [f"{prefix}/timing/{index}.jpg" for index in range(blobs)]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(backend.write(name, chunks(payload), "image/jpeg") for name in names))
+    write_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(backend.read(name) for name in names))
+    read_elapsed = time.perf_counter() - started
+    check(all(result == payload for result in results), "timed reads returned wrong bytes")
+
+    await asyncio.gather(*(backend.delete(name) for name in names))
+    megabytes = blobs * size / 1024 / 1024
+    return {"write_mb_per_s": megabytes / write_elapsed, "read_mb_per_s": megabytes / read_elapsed}
+
+
+async def serving(backend, size: int) -> dict:
+    """Fetch a local blob through the /files route"""
+    from fastapi import FastAPI
+    from app.routes import files
+
+    app = FastAPI()
+    app.include_router(files.router)
+
+    name = "content/serving.jpg"
+    payload = os.urandom(size)
+    await backend.write_bytes(name, payload, "image/jpeg")
+    url = backend.url_for(name)
+    path = url[url.index("/files/"):]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        full = await client.get(path)
+        check(full.status_code == 200 and full.content == payload, "full GET failed")
+        check(full.headers["content-type"] == "image/jpeg", "wrong content type")
+        check("immutable" in full.headers["cache-control"], "content blobs should be immutable")
+
+        etag = full.headers["etag"]
+        revalidated = await client.get(path, headers={"If-None-Match": etag})
+        check(revalidated.status_code == 304 and not revalidated.content, "If-None-Match did not 304")
+
+        partial = await client.get(path, headers={"Range": "bytes=10-19"})
+        check(partial.status_code == 206 and partial.content == payload[10:20], "range GET failed")
+        check(partial.headers["content-range"] == f"bytes 10-19/{size}", "wrong Content-Range")
+
+        suffix = await client.get(path, headers={"Range": "bytes=-5"})
+        check(suffix.content == payload[-5:], "suffix range failed")
+
+        unsatisfiable = await client.get(path, headers={"Range": f"bytes={size}-"})
+        check(unsatisfiable.status_code == 416, "out-of-range request did not 416")
+
+        stale = await client.get(path, headers={"Range": "bytes=0-0", "If-Range": '"stale"'})
+        check(stale.status_code == 200, "If-Range mismatch should return the whole file")
+
+        escape = await client.get("/files/..%2F..%2Fetc%2Fpasswd")
+        check(escape.status_code == 404, "path traversal was served")
+
+        requests = 200
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(path, headers={"Range": "bytes=0-65535"})
+        elapsed = time.perf_counter() - started
+
+    await backend.delete(name)
+    return {"range_requests_per_s": requests / elapsed}
+
+
+async def run(blobs: int, size: int) -> list:
+    from app.services.storage_backends.azure_blob import AzureBlobBackend
+    from app.services.storage_service import get_storage_service
+
+    rows = []
+    local = get_storage_service().backend
+    for label, backend in (("azure", AzureBlobBackend()), ("local", local)):
+        try:
+            await conformance(backend, "benchmark")
+            row = {"backend": label}
+            row.update(await timing(backend, "benchmark", blobs, size))
+            if backend is local:
+                row.update(await serving(backend, size))
+            rows.append(row)
+        finally:
+            await backend.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--blobs", type=int, default=50)
+    parser.add_argument("--size-mb", type=float, default=2)
+    parser.add_argument("--port", type=int, default=10100)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}"
+    os.environ["AZURE_STORAGE_CONNECTION_STRING"] = (
+        "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;AccountKey=ZmFrZQ==;"
+        f"BlobEndpoint={url}/devstoreaccount1;"
+    )
+    storage_root = tempfile.mkdtemp(prefix="storage-benchmark-")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["LOCAL_STORAGE_PATH"] = storage_root
+    os.environ["LOCAL_STORAGE_BASE_URL"] = "http://test/files"
+    # Settings requires a database URL even though none is used here
+    os.environ.setdefault("MONGODB_CONNECTION_STRING", "mongodb://localhost:27017")
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_blob", "--port", str(args.port)]
+    )
+    try:
+        wait_until_ready(url)
+        rows = asyncio.run(run(args.blobs, int(args.size_mb * 1024 * 1024)))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{'backend':>8} {'write MB/s':>11} {'read MB/s':>10} {'range req/s':>12}")
+    for row in rows:
+        range_rate = row.get("range_requests_per_s")
+        print(
+            f"{row['backend']:>8} {row['write_mb_per_s']:>11.1f} {row['read_mb_per_s']:>10.1f} "
+            f"{(f'{range_rate:.0f}' if range_rate else '-'):>12}"
+        )
+    print("conformance: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Latency benchmark for POST /api/invitations/verify under concurrent load
+
+Run it against a running API (e.g. before and after a change) and compare
+the reported percentiles:
+
+    python -m benchmarks.verify_latency --url http://localhost:8000 \
+        --codes 123456,234567 --concurrency 200 --requests 5000
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Return the pct-th percentile (0-100) of sorted samples"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+async def run(url: str, codes: list, concurrency: int, total: int) -> dict:
+    """Fire `total` verify requests with at most `concurrency` in flight"""
+    latencies = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(random.choice(codes))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+
+        async def worker():
+            nonlocal errors
+            while True:
+                try:
+                    code = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        "/api/invitations/verify",
+                        json={"invitation_code": code}
+                    )
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--codes", required=True, help="Comma-separated invitation codes")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    codes = [code.strip() for code in args.codes.split(",") if code.strip()]
+    result = asyncio.run(run(args.url, codes, args.concurrency, args.requests))
+    for key, value in result.items():
+        print(f"{key:>16}: {value:.2f}" if isinstance(value, float) else f"{key:>16}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Generate photo derivatives for photos uploaded before the image pipeline
+
+Walks every graduate and queues each photo in `photo_urls` that has no
+entry in `photo_derivatives` yet:
+
+    python -m scripts.backfill_derivatives [--graduate-id ID] [--force]
+"""
+
+import argparse
+import asyncio
+
+from app.database import mongo_db
+from app.services.graduate_service import GraduateService
+from app.services.image_pipeline import JOB_DONE, close_image_pipeline, get_image_pipeline
+from app.services.storage_service import close_storage_service
+
+
+async def backfill(graduate_id: str = None, force: bool = False) -> None:
+    await mongo_db.connect()
+    pipeline = get_image_pipeline()
+    fields = ["photo_urls", "photo_derivatives"]
+    pending = []
+
+    try:
+        if graduate_id:
+            graduate = await GraduateService.get_graduate(graduate_id)
+            graduates = [graduate] if graduate else []
+        else:
+            graduates = [doc async for doc in GraduateService.iter_graduates(fields=fields)]
+
+        for graduate in graduates:
+            done = {item["original"] for item in graduate.get("photo_derivatives") or []}
+            for photo_url in graduate.get("photo_urls") or []:
+                if force or photo_url not in done:
+                    pending.append((str(graduate["_id"]), photo_url))
+
+        print(f"Queueing {len(pending)} photo(s)")
+        jobs = await asyncio.gather(*(
+            pipeline.submit_and_wait(gid, photo_url) for gid, photo_url in pending
+        ))
+
+        failed = [job for job in jobs if job["status"] != JOB_DONE]
+        for job in failed:
+            print(f"Failed: {job['photo_url']}: {job['error']}")
+        print(f"Done: {len(jobs) - len(failed)} succeeded, {len(failed)} failed")
+    finally:
+        await close_image_pipeline()
+        await close_storage_service()
+        mongo_db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--graduate-id", help="Only backfill this graduate")
+    parser.add_argument("--force", action="store_true", help="Regenerate existing derivatives")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.graduate_id, args.force))
+
+
+if __name__ == "__main__":
+    main()
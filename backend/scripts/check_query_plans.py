@@ -0,0 +1,171 @@
+"""
+Fail if any service query would scan a whole collection
+
+Ensures the indexes declared in app/database.py, then runs explain() on
+the query shape behind every service method and exits non-zero if a plan
+contains a COLLSCAN or a query cannot be planned at all (for example a
+hint naming an index that failed to build). Run it against a scratch database in CI or before
+deploying a new query:
+
+    python -m scripts.check_query_plans [--database graduation_plans_check]
+
+Add an entry to build_queries() for every new collection access, built
+from the service's own filter helpers rather than a copied literal.
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+SAMPLE_CODE = "00000000"
+SAMPLE_GRADUATE_ID = str(ObjectId())
+
+
+def _find(collection: str, query: dict, sort: str = None, limit: int = 0, projection: dict = None,
+          hint: str = None):
+    async def explain(db):
+        cursor = db[collection].find(query, projection)
+        if hint:
+            cursor = cursor.hint(hint)
+        if sort:
+            cursor = cursor.sort(sort, 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.explain()
+    return explain
+
+
+def _command(collection: str, command: str, **fields):
+    async def explain(db):
+        return await db.command({
+            "explain": {command: collection, **fields},
+            "verbosity": "executionStats",
+        })
+    return explain
+
+
+def _aggregate(collection: str, pipeline: list):
+    return _command(collection, "aggregate", pipeline=pipeline, cursor={})
+
+
+def _update(collection: str, query: dict, multi: bool = False):
+    return _command(collection, "update", updates=[{"q": query, "u": {"$set": {"checked": True}}, "multi": multi}])
+
+
+def _delete(collection: str, query: dict, many: bool = False):
+    return _command(collection, "delete", deletes=[{"q": query, "limit": 0 if many else 1}])
+
+
+def build_queries() -> list:
+    """(description, explain coroutine factory) for every service query"""
+    from app.services.cleanup_service import CleanupService
+    from app.services.code_allocator import get_code_allocator
+    from app.services.image_pipeline import ImagePipeline
+    from app.services.invitation_service import InvitationService
+    from app.services.issued_codes import CODE_INDEX, IssuedCodeFilter
+    from app.services.query import keyset_filter
+    from app.services.storage_service import CONTENT_PREFIX, DEDUP_REPORT_PIPELINE
+    from app.services.token_budget import usage_id
+
+    graduate_oid = ObjectId(SAMPLE_GRADUATE_ID)
+    after = str(ObjectId())
+    by_graduate = {"graduate_id": SAMPLE_GRADUATE_ID}
+    now = datetime.now(timezone.utc)
+
+    return [
+        # InvitationService
+        ("invitations by code", _find("invitations", {"invitation_code": SAMPLE_CODE}, limit=1)),
+        ("verify $lookup", _aggregate("invitations", InvitationService.verify_pipeline(SAMPLE_CODE))),
+        ("invitations page", _find("invitations", keyset_filter({}, after), sort="_id", limit=100)),
+        ("invitations by graduate page", _find("invitations", keyset_filter(by_graduate, after), sort="_id", limit=100)),
+        # GraduateService
+        ("graduate by id", _find("graduates", {"_id": graduate_oid}, limit=1)),
+        ("graduates page", _find("graduates", keyset_filter({}, after), sort="_id", limit=100)),
+        ("graduate update", _update("graduates", {"_id": graduate_oid})),
+        ("graduate photo pull", _update("graduates", {"_id": graduate_oid, "photo_urls": "https://example.com/a.jpg"})),
+        # IssuedCodeFilter
+        ("issued codes rebuild", _find("invitations", {}, projection={"invitation_code": 1, "_id": 0}, hint=CODE_INDEX)),
+        ("issued codes refresh", _find("invitations", IssuedCodeFilter.since_filter(now), projection={"invitation_code": 1, "_id": 0})),
+        # Code allocator
+        ("counter reserve", _update("counters", {"_id": get_code_allocator().counter_id})),
+        # StorageService
+        ("blob reference", _update("blob_refs", {"_id": f"{CONTENT_PREFIX}abc"})),
+        ("dedup report", _aggregate("blob_refs", DEDUP_REPORT_PIPELINE)),
+        # CleanupService
+        ("season purge", _find("graduates", CleanupService.season_filter(now), projection={"_id": 1})),
+        ("invitations delete", _delete("invitations", by_graduate, many=True)),
+        ("invitations archive read", _find("invitations", by_graduate)),
+        ("graduate delete", _delete("graduates", {"_id": graduate_oid})),
+        ("pending cleanup jobs", _update("cleanup_jobs", CleanupService.pending_filter([]))),
+        ("cleanup job", _update("cleanup_jobs", {"_id": "job"})),
+        # ImagePipeline
+        ("photo job", _find("photo_jobs", {"_id": "job"}, limit=1)),
+        ("photo job update", _update("photo_jobs", {"_id": "job"})),
+        ("photo jobs to requeue", _update("photo_jobs", ImagePipeline.requeue_filter(now))),
+        # ChatSessionStore
+        ("chat session", _find("chat_sessions", {"_id": SAMPLE_CODE}, limit=1)),
+        ("chat session save", _update("chat_sessions", {"_id": SAMPLE_CODE})),
+        # TokenBudget
+        ("token usage", _update("token_usage", {"_id": usage_id(now, SAMPLE_GRADUATE_ID)})),
+    ]
+
+
+def find_collection_scans(plan) -> list:
+    """Collect every COLLSCAN stage (or $lookup collection scan) in an explain document"""
+    found = []
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            found.append(plan.get("filter") or {})
+        if plan.get("collectionScans"):
+            found.append({"collectionScans": plan["collectionScans"]})
+        for value in plan.values():
+            found.extend(find_collection_scans(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            found.extend(find_collection_scans(value))
+    return found
+
+
+async def check(database: str = None) -> int:
+    from app.database import mongo_db
+    from app.config import settings
+
+    if database:
+        settings.mongodb_database_name = database
+    await mongo_db.connect()
+    db = mongo_db.get_database()
+
+    queries = build_queries()
+    failures = 0
+    try:
+        for description, explain in queries:
+            try:
+                scans = find_collection_scans(await explain(db))
+            except Exception as e:
+                failures += 1
+                print(f"ERROR     {description}: {e}")
+                continue
+            if scans:
+                failures += 1
+                print(f"COLLSCAN  {description}: {scans[0]}")
+            else:
+                print(f"ok        {description}")
+    finally:
+        mongo_db.disconnect()
+
+    print(f"{failures} of {len(queries)} queries scan a collection or failed to plan")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database", help="Database to check instead of MONGODB_DATABASE_NAME")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(check(args.database)) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -49,8 +49,9 @@ export default function InvitationCodeForm({ onVerified }: Props) {
     setError('');
     const normalizedCode = code.trim().toUpperCase();
 
-    if (normalizedCode.length !== 6 || !/^\d+$/.test(normalizedCode)) {
-      setError('Vui lòng nhập đủ 6 chữ số.');
+    // 8-digit checksummed codes, or legacy 6-digit codes
+    if (!/^(\d{6}|\d{8})$/.test(normalizedCode)) {
+      setError('Vui lòng nhập đủ 6 hoặc 8 chữ số.');
       return;
     }
     try {
@@ -215,11 +216,11 @@ export default function InvitationCodeForm({ onVerified }: Props) {
                   onFocus={() => setIsFocused(true)}
                   onBlur={() => setIsFocused(false)}
                   onChange={(e) => {
-                    const val = e.target.value.replace(/\D/g, '').slice(0, 6);
+                    const val = e.target.value.replace(/\D/g, '').slice(0, 8);
                     setCode(val);
                   }}
-                  maxLength={6}
-                  placeholder="000 000"
+                  maxLength={8}
+                  placeholder="0000 0000"
                   className="h-16 w-full rounded-lg border border-white/10 bg-white/5 text-center font-mono text-3xl tracking-[0.3em] text-white transition-all placeholder:text-white/10 focus:border-white/50 focus:bg-white/10 focus:ring-0"
                   inputMode="numeric"
                 />
@@ -249,7 +250,7 @@ export default function InvitationCodeForm({ onVerified }: Props) {
               </AnimatePresence>
               <Button
                 type="submit"
-                disabled={loading || code.length !== 6}
+                disabled={loading || (code.length !== 6 && code.length !== 8)}
                 className="h-14 w-full rounded-lg bg-white text-sm font-bold tracking-[0.1em] text-black uppercase shadow-lg shadow-white/5 transition-all hover:-translate-y-0.5 hover:bg-gray-200 hover:shadow-white/10"
               >
                 {loading ? <Loader2 className="animate-spin" /> : 'Mở Thiệp Ngay'}
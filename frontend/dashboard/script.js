@@ -151,49 +151,51 @@ function addPhotoInput() {
     window.photoContainer.appendChild(photoDiv);
 }
 
-// Upload photos to Azure Storage
+// Upload all selected photos in one request; the backend adds them to the graduate
 async function uploadPhotos(graduateId) {
-    const photoUrls = [];
+    const formData = new FormData();
     const photoFiles = Array.from(document.querySelectorAll('.photo-file'));
     
     for (const fileInput of photoFiles) {
-        if (!fileInput.files || fileInput.files.length === 0) {
-            continue;
+        if (fileInput.files && fileInput.files.length > 0) {
+            formData.append('files', fileInput.files[0]);
         }
+    }
+    
+    if (!formData.has('files')) {
+        return [];
+    }
+    
+    try {
+        // Show progress
+        document.getElementById('uploadProgress').style.display = 'block';
+        document.getElementById('uploadStatus').textContent = `Đang tải lên ${formData.getAll('files').length} ảnh...`;
         
-        const file = fileInput.files[0];
+        const response = await fetch(`${API_URL}/graduates/${graduateId}/photos/batch`, {
+            method: 'POST',
+            body: formData
+        });
         
-        try {
-            // Show progress
-            document.getElementById('uploadProgress').style.display = 'block';
-            document.getElementById('uploadStatus').textContent = `Đang tải lên: ${file.name}`;
-            
-            // Create FormData
-            const formData = new FormData();
-            formData.append('file', file);
-            
-            // Upload to backend
-            const response = await fetch(`${API_URL}/graduates/${graduateId}/photos`, {
-                method: 'POST',
-                body: formData
-            });
-            
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || 'Lỗi tải lên ảnh');
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Lỗi tải lên ảnh');
+        }
+        
+        const result = await response.json();
+        for (const item of result.results) {
+            if (item.status === 'failed') {
+                alert(`❌ Lỗi tải lên ${item.file_name}: ${item.error}`);
             }
-            
-            const result = await response.json();
-            photoUrls.push(result.photo_url);
-            
-        } catch (error) {
-            console.error('Upload error:', error);
-            alert(`❌ Lỗi tải lên ${file.name}: ${error.message}`);
         }
+        return result.photo_urls;
+        
+    } catch (error) {
+        console.error('Upload error:', error);
+        alert(`❌ Lỗi tải lên ảnh: ${error.message}`);
+        return [];
+    } finally {
+        document.getElementById('uploadProgress').style.display = 'none';
     }
-    
-    document.getElementById('uploadProgress').style.display = 'none';
-    return photoUrls;
 }
 
 // ==================== Guest Management ====================
@@ -262,16 +264,8 @@ async function handleCreateGraduate(e) {
         messageDiv.textContent = `⏳ Đang tải lên ảnh...`;
         messageDiv.classList.add('success');
         
-        const photoUrls = await uploadPhotos(graduateId);
-        
-        // Update graduate with photo URLs if any
-        if (photoUrls.length > 0) {
-            await fetch(`${API_URL}/graduates/${graduateId}`, {
-                method: 'PUT',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ photo_urls: photoUrls })
-            });
-        }
+        // The batch upload also saves the URLs on the graduate
+        await uploadPhotos(graduateId);
         
         messageDiv.textContent = `✅ Tạo thành công! ID: ${graduateId}`;
         messageDiv.classList.add('success');
@@ -294,7 +288,7 @@ async function handleCreateGraduate(e) {
 
 async function loadGraduates() {
     try {
-        const response = await fetch(`${API_URL}/graduates`);
+        const response = await fetch(`${API_URL}/graduates?fields=name,degree,department,contact,photo_urls,photo_derivatives`);
         if (!response.ok) throw new Error('Lỗi tải danh sách');
 
         graduates = await response.json();
@@ -322,7 +316,7 @@ function displayGraduates() {
             ${grad.photo_urls && grad.photo_urls.length > 0 ? `
                 <div class="photos">
                     ${grad.photo_urls.slice(0, 3).map(url => `
-                        <img src="${url}" class="photo-thumb" alt="Photo" onclick="previewPhoto('${url}')">
+                        <img src="${thumbnailUrl(grad, url)}" class="photo-thumb" alt="Photo" onclick="previewPhoto('${url}')">
                     `).join('')}
                 </div>
             ` : ''}
@@ -330,10 +324,16 @@ function displayGraduates() {
     `).join('');
 }
 
+// Use the generated thumbnail when the photo has one
+function thumbnailUrl(grad, url) {
+    const derivative = (grad.photo_derivatives || []).find(item => item.original === url);
+    return derivative ? derivative.thumbnail.webp : url;
+}
+
 // ==================== Invitations ====================
 async function loadGraduateSelect() {
     try {
-        const response = await fetch(`${API_URL}/graduates`);
+        const response = await fetch(`${API_URL}/graduates?fields=name,department`);
         if (!response.ok) throw new Error('Lỗi tải danh sách');
 
         graduates = await response.json();
@@ -16,6 +16,7 @@ const chatMessages = document.getElementById('chatMessages');
 
 let currentGraduateId = null;
 let currentGuestName = null;
+let currentInvitationCode = null;
 
 // Event Listeners
 codeForm.addEventListener('submit', handleCodeSubmit);
@@ -28,32 +29,47 @@ async function handleCodeSubmit(e) {
     
     const code = invitationCode.value.trim();
     
-    if (code.length !== 6 || !/^\d+$/.test(code)) {
-        errorMessage.textContent = 'Vui lòng nhập mã 6 số hợp lệ';
+    // 8-digit checksummed codes, or legacy 6-digit codes
+    if (!/^(\d{6}|\d{8})$/.test(code)) {
+        errorMessage.textContent = 'Vui lòng nhập mã mời hợp lệ';
         return;
     }
     
     try {
         codeForm.classList.add('loading');
         
+        // Revalidate a previously loaded invitation instead of downloading it again
+        const cacheKey = `invitation:${code}`;
+        const cached = JSON.parse(sessionStorage.getItem(cacheKey) || 'null');
+        const headers = { 'Content-Type': 'application/json' };
+        if (cached) {
+            headers['If-None-Match'] = cached.etag;
+        }
+        
         const response = await fetch(`${API_URL}/invitations/verify`, {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
+            headers: headers,
             body: JSON.stringify({
                 invitation_code: code
             })
         });
         
-        if (!response.ok) {
+        let data;
+        if (response.status === 304 && cached) {
+            data = cached.data;
+        } else if (!response.ok) {
             const error = await response.json();
             throw new Error(error.detail || 'Mã không hợp lệ');
+        } else {
+            data = await response.json();
+            const etag = response.headers.get('ETag');
+            if (etag) {
+                sessionStorage.setItem(cacheKey, JSON.stringify({ etag: etag, data: data }));
+            }
         }
-        
-        const data = await response.json();
         currentGraduateId = data.graduate_id;
         currentGuestName = data.guest_name;
+        currentInvitationCode = code;
         displayInvitation(data.graduate_info, data.guest_name);
         
         // Switch pages
@@ -97,6 +113,7 @@ function handleBack() {
     codePage.classList.remove('hidden');
     currentGraduateId = null;
     currentGuestName = null;
+    currentInvitationCode = null;
     chatMessages.innerHTML = '';
     chatInput.value = '';
 }
@@ -114,22 +131,50 @@ async function handleChatSubmit(e) {
     try {
         chatForm.classList.add('loading');
         
-        const response = await fetch(`${API_URL}/graduates/${currentGraduateId}/chat`, {
+        const response = await fetch(`${API_URL}/graduates/${currentGraduateId}/chat/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
+            // The invitation code keys the server-side conversation history
             body: JSON.stringify({
-                message: message
+                message: message,
+                invitation_code: currentInvitationCode
             })
         });
         
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
             throw new Error('Lỗi khi gửi tin nhắn');
         }
         
-        const data = await response.json();
-        addChatMessage(data.response, 'bot');
+        // Render tokens into one bubble as Server-Sent Events arrive
+        const bubble = addChatMessage('', 'bot');
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            
+            for (const event of events) {
+                const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+                if (!dataLine) continue;
+                const data = JSON.parse(dataLine.slice(6));
+                
+                if (event.startsWith('event: error')) {
+                    throw new Error(data.detail);
+                }
+                if (data.delta) {
+                    bubble.textContent += data.delta;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            }
+        }
         
     } catch (error) {
         console.error('Error:', error);
@@ -152,4 +197,6 @@ function addChatMessage(message, sender) {
     
     // Auto scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return bubble;
 }